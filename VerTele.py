@@ -3,9 +3,12 @@
 """
 VerTele - Visor de Canales
 Punto de entrada principal
+
+Sin argumentos abre la interfaz grafica; con un subcomando (list, search,
+play, import, epg, probe) trabaja sin cargar GTK.
 """
 
-from app import main
+from cli import main
 import sys
 
 if __name__ == "__main__":
@@ -5,139 +5,296 @@ Main application - Coordina todos los componentes
 """
 
 import sys
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Dict, Optional
+
 import gi
 
 gi.require_version("Gtk", "3.0")
 from gi.repository import Gtk, GLib
 
-from database import ChannelDatabase
+import instrument
+from instrument import get_logger, span, traced
+from ipc import HANDLER_TIMEOUT, InstanceRunningError, InstanceServer
 from player import StreamPlayer, ChannelNotFoundException
+from services import AppServices
 from ui import ChannelWindow
+from zap import zap_channel
+
+log = get_logger("app")
 
 
-class VerTeleApp:
+class VerTeleApp(AppServices):
     """Aplicación principal de VerTele"""
 
-    def __init__(self):
-        self.db = ChannelDatabase()
+    REAP_INTERVAL_SECONDS = 2
+    GUIDE_REFRESH_SECONDS = 60
+    # Espera maxima de un lanzamiento reenviado por el socket de instancia
+    REMOTE_LOOKUP_TIMEOUT = HANDLER_TIMEOUT
+
+    def __init__(self, db_path: Optional[str] = None):
+        super().__init__(db_path, dispatch=GLib.idle_add)
         self.player = None
+        self.player_error = None
         self.window = None
+        self.instance_server = None
         self._init_player()
 
     def _init_player(self):
-        """Inicializa el reproductor con manejo de errores"""
-        try:
-            self.player = StreamPlayer()
-        except RuntimeError as e:
-            # Mostrar advertencia pero permitir continuar
-            dialog = Gtk.MessageDialog(
-                parent=None,
-                flags=0,
-                type=Gtk.MessageType.WARNING,
-                buttons=Gtk.ButtonsType.OK,
-                text="Reproductor no detectado",
-                secondary_text=str(e)
-                + "\n\nLa aplicación funcionará pero no podrás reproducir canales.",
-            )
-            dialog.set_title("Advertencia")
-            dialog.run()
-            dialog.destroy()
+        """Detecta el reproductor en segundo plano, fuera del arranque"""
+        self.tasks.submit(
+            self._create_player,
+            on_done=self._on_player_ready,
+            on_error=self._on_player_failed,
+        )
+
+    @traced("startup.player")
+    def _create_player(self) -> StreamPlayer:
+        """Crea el reproductor (hilo del pool: puede lanzar subprocesos)"""
+        preferred = self.db.get_setting(self.PLAYER_BACKEND_SETTING)
+        return StreamPlayer(
+            preferred_backend=preferred, resolver=self.resolver, proxy=self.proxy
+        )
+
+    def _on_player_ready(self, player: StreamPlayer) -> None:
+        """Registra el reproductor detectado (hilo principal)"""
+        self.player = player
+
+    def _on_player_failed(self, e: Exception) -> None:
+        """Muestra la advertencia de reproductor no detectado (hilo principal)"""
+        self.player_error = e
+        # Mostrar advertencia pero permitir continuar
+        self._show_message(
+            Gtk.MessageType.WARNING,
+            "Advertencia",
+            "Reproductor no detectado",
+            str(e) + "\n\nLa aplicación funcionará pero no podrás reproducir canales.",
+        )
 
     def run(self) -> int:
         """Inicia la aplicación"""
         try:
             self._setup_ui()
+            self._start_instance_server()
             Gtk.main()
             return 0
         except Exception as e:
-            self._show_error("Error fatal", str(e))
+            self._show_error("Error fatal", str(e), modal=True)
             return 1
 
     def _setup_ui(self) -> None:
         """Configura la interfaz de usuario"""
-        self.window = ChannelWindow(self._on_channel_selected)
-        self.window.connect("delete-event", self._on_delete_event)
+        # Las listas leen de la base de datos solo las filas visibles
+        with span("startup.ui_build"):
+            self.window = ChannelWindow(
+                self._on_channel_selected,
+                self.db.search,
+                self._on_channel_highlighted,
+                channel_source=self.db,
+                task_runner=self.tasks,
+                logo_loader=self.logos,
+                on_rows_loaded=self._on_rows_loaded,
+            )
+            self.window.connect("delete-event", self._on_delete_event)
+            self.window.show_all()
+
+        # Las categorías y el estado de los streams llegan sin bloquear la ventana
+        self.tasks.submit(self._load_catalogue, on_done=self._on_catalogue_loaded)
+        GLib.timeout_add_seconds(self.REAP_INTERVAL_SECONDS, self._reap_players)
+        self._refresh_guide()
+        GLib.timeout_add_seconds(self.GUIDE_REFRESH_SECONDS, self._refresh_guide)
+
+    def _start_instance_server(self) -> None:
+        """Atiende los lanzamientos posteriores en lugar de abrir otra ventana"""
+        try:
+            self.instance_server = InstanceServer(self._on_remote_request).start()
+        except (InstanceRunningError, OSError) as e:
+            log.warning("Sin socket de instancia única: %s", e)
 
-        channels = self.db.get_all_channels()
-        for channel in channels:
-            title, instance, page_url, stream_url = channel
-            self.window.add_channel(title, instance, page_url, stream_url)
+    def _on_remote_request(self, request: Dict) -> Dict:
+        """Atiende una petición de otro lanzamiento (hilo de la conexión)"""
+        command = request.get("command")
+        if command == "show":
+            GLib.idle_add(self.window.present)
+            return {"ok": True}
+        if command == "play":
+            instance = request.get("instance")
+            # La consulta va al pool como el resto del trabajo con la base de
+            # datos: el hilo de la conexion solo espera la respuesta
+            lookup = Future()
+            self.tasks.submit(
+                self.db.get_channel_by_instance,
+                instance,
+                on_done=lookup.set_result,
+                on_error=lookup.set_exception,
+            )
+            try:
+                channel = lookup.result(timeout=self.REMOTE_LOOKUP_TIMEOUT)
+            except FutureTimeoutError:
+                return {"ok": False, "error": "VerTele no respondió a tiempo"}
+            if channel is None:
+                return {"ok": False, "error": f"Canal no encontrado: {instance}"}
+            title, page_url, stream_url = channel
+            GLib.idle_add(
+                self._on_channel_selected, title, instance, page_url, stream_url
+            )
+            return {"ok": True}
+        return {"ok": False, "error": f"Comando desconocido: {command}"}
 
-        self.window.select_default_channel()
-        self.window.show_all()
+    @traced("startup.catalogue")
+    def _load_catalogue(self):
+        """Cuenta los canales de cada categoría y lee los caídos (hilo del pool)"""
+        return self.db.count_channels_by_category(), self.db.get_dead_instances()
+
+    def _on_catalogue_loaded(self, catalogue) -> None:
+        """Crea las pestañas de categoría (hilo principal)"""
+        counts, dead_instances = catalogue
+        for category in counts:
+            self.window.add_category(category)
+        self.window.set_dead_channels(dead_instances)
+        # Los recuentos incluyen los caídos: si ya se ocultan, se cuentan de nuevo
+        self.window.select_default_channel(None if self.window.hide_dead else counts)
+
+    def _refresh_guide(self) -> bool:
+        """
+        Consulta en segundo plano el programa en emisión de las filas leídas
+
+        Solo interesan los canales que la ventana ya tiene en memoria: el resto
+        se consulta al leer su bloque (ver _on_rows_loaded).
+        """
+        instances = self.window.loaded_instances()
+        # Se actualizan solo esos canales: un bloque leído mientras tanto
+        # conserva su programa
+        self.tasks.submit(
+            self._load_guide,
+            instances,
+            key="guide",
+            on_done=lambda guide: self.window.set_now_playing(guide, instances),
+        )
+        return True
+
+    def _on_rows_loaded(self, instances) -> None:
+        """Consulta el programa en emisión de las filas recién leídas"""
+        self.tasks.submit(
+            self._load_guide,
+            instances,
+            on_done=lambda guide: self.window.set_now_playing(guide, instances),
+        )
+
+    def _load_guide(self, instances):
+        """Lee el programa actual y el siguiente de esos canales (hilo del pool)"""
+        return self.db.get_now_next(time.time(), instances)
+
+    def _reap_players(self) -> bool:
+        """Recoge periódicamente los reproductores que ya terminaron"""
+        if self.player is not None:
+            self.player.reap()
+        return True
+
+    def _on_channel_highlighted(self, instance: str, stream_url: str) -> None:
+        """Pre-resuelve en segundo plano el stream del canal resaltado"""
+        self.resolver.prefetch_latest(stream_url)
 
     def _on_channel_selected(
         self, title: str, instance: str, page_url: str, stream_url: str
     ) -> None:
         """Maneja la selección de un canal"""
-        print(f"[DEBUG] _on_channel_selected llamado:")
-        print(f"[DEBUG]   Title: {title}")
-        print(f"[DEBUG]   Instance: {instance}")
-        print(f"[DEBUG]   Page URL: {page_url}")
-        print(f"[DEBUG]   Stream URL: {stream_url}")
+        log.debug("Canal seleccionado: %s (%s) %s", title, instance, stream_url)
 
-        if self.player is None:
-            dialog = Gtk.MessageDialog(
-                parent=None,
-                flags=0,
-                type=Gtk.MessageType.ERROR,
-                buttons=Gtk.ButtonsType.OK,
-                text="No se puede reproducir",
-                secondary_text="VLC no está instalado.\n\nPor favor instala VLC para reproducir canales.",
+        if self.player is None and self.player_error is None:
+            self._show_error(
+                "No se puede reproducir",
+                "Todavía se está detectando el reproductor. Inténtalo en unos segundos.",
             )
-            dialog.set_title("Error")
-            dialog.run()
-            dialog.destroy()
             return
 
-        try:
-            print("[DEBUG] Buscando canal en base de datos...")
-            channel = self.db.get_channel_by_instance(instance)
-            print(f"[DEBUG] Canal encontrado: {channel}")
+        if self.player is None:
+            self._show_error(
+                "No se puede reproducir",
+                "No hay ningún reproductor compatible instalado.\n\n"
+                "Por favor instala mpv o VLC para reproducir canales.",
+            )
+            return
 
-            if channel is None:
-                raise ChannelNotFoundException(f"No se encontró el canal: {instance}")
+        # Un cambio de canal nuevo sustituye al que estuviera esperando turno
+        self.tasks.submit(
+            self._zap,
+            title,
+            instance,
+            stream_url,
+            key="zap",
+            on_error=self._on_zap_failed,
+        )
 
-            print(f"[DEBUG] Reproduciendo stream...")
-            success = self.player.play_channel(title, stream_url)
-            print(f"[DEBUG] Resultado reproducción: {success}")
+    def _zap(self, title: str, instance: str, stream_url: Optional[str]) -> None:
+        """Busca el canal y lo reproduce (hilo del pool)"""
+        zap_channel(self.db, self.mirrors, self.player, title, instance, stream_url)
 
-            if not success:
-                raise Exception("No se pudo iniciar la reproducción")
-        except ChannelNotFoundException as e:
-            print(f"[DEBUG] Canal no encontrado: {e}")
-            self._show_error("Error al reproducir", str(e))
-        except Exception as e:
-            print(f"[DEBUG] Error en reproducción: {e}")
-            import traceback
-
-            traceback.print_exc()
-            self._show_error("Error al reproducir", str(e))
+    def _on_zap_failed(self, e: Exception) -> None:
+        """Muestra el error de reproducción (hilo principal)"""
+        if isinstance(e, ChannelNotFoundException):
+            log.warning("Error en reproducción: %s", e)
+        else:
+            log.error(
+                "Error en reproducción: %s", e, exc_info=(type(e), e, e.__traceback__)
+            )
+        self._show_error("Error al reproducir", str(e))
 
-    def _show_error(self, primary_text: str, secondary_text: str) -> None:
-        """Muestra un diálogo de error"""
+    def _show_message(
+        self,
+        message_type: Gtk.MessageType,
+        title: str,
+        primary_text: str,
+        secondary_text: str,
+        modal: bool = False,
+    ) -> None:
+        """Muestra un diálogo; sin modal no bloquea el bucle principal"""
         dialog = Gtk.MessageDialog(
-            parent=None,
+            parent=self.window,
             flags=0,
-            type=Gtk.MessageType.ERROR,
+            type=message_type,
             buttons=Gtk.ButtonsType.OK,
             text=primary_text,
             secondary_text=secondary_text,
         )
-        dialog.set_title("Error")
-        dialog.run()
-        dialog.destroy()
+        dialog.set_title(title)
+        if modal:
+            dialog.run()
+            dialog.destroy()
+            return
+        dialog.connect("response", lambda d, _response: d.destroy())
+        dialog.show()
+
+    def _show_error(
+        self, primary_text: str, secondary_text: str, modal: bool = False
+    ) -> None:
+        """Muestra un diálogo de error"""
+        self._show_message(
+            Gtk.MessageType.ERROR, "Error", primary_text, secondary_text, modal
+        )
+
+    def close(self) -> None:
+        """Detiene el socket de instancia, el reproductor y los servicios"""
+        if self.instance_server is not None:
+            self.instance_server.close()
+        # Sin tareas en curso nadie vuelve a lanzar el reproductor
+        self.tasks.shutdown()
+        if self.player is not None:
+            self.player.close()
+        super().close()
 
     def _on_delete_event(self, widget, event):
         """Maneja el cierre de la ventana"""
+        self.close()
         Gtk.main_quit()
         return False
 
 
-def main() -> int:
-    """Punto de entrada principal"""
+def main(db_path: Optional[str] = None) -> int:
+    """Punto de entrada principal de la interfaz grafica"""
     try:
-        app = VerTeleApp()
+        app = VerTeleApp(db_path)
         return app.run()
     except Exception as e:
         print(f"Error al iniciar la aplicación: {e}", file=sys.stderr)
@@ -145,4 +302,5 @@ def main() -> int:
 
 
 if __name__ == "__main__":
+    instrument.configure_from_env()
     sys.exit(main())
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark de la guia de programacion - Importacion XMLTV y consulta now/next
+
+Genera una guia XMLTV sintetica, la importa en una base de datos temporal y
+mide:
+
+    ingest    programas por segundo (y MB/s del XML) al importar
+    now_next  p50/p95/p99 de ChannelDatabase.get_now_next para todos los canales
+
+Uso:
+    python benchmarks/epg_benchmark.py --channels 2000 --programmes 300
+    python benchmarks/epg_benchmark.py --memory   # pico de memoria (mas lento)
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, Optional
+from xml.sax.saxutils import escape
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.zap_benchmark import PERCENTILES, percentile  # noqa: E402
+from database import ChannelDatabase  # noqa: E402
+from epg import import_xmltv  # noqa: E402
+
+SLOT_SECONDS = 1800
+DESCRIPTION = "Descripcion del programa con algo de texto de relleno. " * 4
+
+
+def _xmltv_time(stamp: float) -> str:
+    return time.strftime("%Y%m%d%H%M%S +0000", time.gmtime(stamp))
+
+
+def write_guide(path: str, channels: int, programmes: int, now: float) -> None:
+    """
+    Escribe una guia XMLTV con programas de media hora por canal
+
+    La guia empieza a mitad de su duracion antes de now, de modo que cada
+    canal tiene un programa en emision.
+    """
+    first = int(now) - (programmes // 2) * SLOT_SECONDS
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<tv>\n')
+        for channel in range(channels):
+            f.write(
+                f'<channel id="bench{channel}">'
+                f"<display-name>Bench {channel}</display-name></channel>\n"
+            )
+        for slot in range(programmes):
+            start = _xmltv_time(first + slot * SLOT_SECONDS)
+            stop = _xmltv_time(first + (slot + 1) * SLOT_SECONDS)
+            for channel in range(channels):
+                f.write(
+                    f'<programme start="{start}" stop="{stop}" channel="bench{channel}">'
+                    f"<title>{escape(f'Programa {slot} de Bench {channel}')}</title>"
+                    f"<desc>{DESCRIPTION}</desc></programme>\n"
+                )
+        f.write("</tv>\n")
+
+
+def run_benchmark(
+    channels: int = 500,
+    programmes: int = 200,
+    queries: int = 20,
+    memory: bool = False,
+    workdir: Optional[str] = None,
+) -> Dict[str, float]:
+    """
+    Importa una guia sintetica y mide la consulta now/next
+
+    Returns:
+        Diccionario con programmes, xml_mb, ingest_seconds,
+        programmes_per_second, mb_per_second, now_next_p50/p95/p99 (ms)
+        y, si memory es True, peak_mb
+    """
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        guide = os.path.join(tmp, "guide.xml")
+        now = time.time()
+        write_guide(guide, channels, programmes, now)
+        xml_mb = os.path.getsize(guide) / (1024 * 1024)
+
+        db = ChannelDatabase(os.path.join(tmp, "bench.db"))
+        try:
+            db.bulk_insert_channels(
+                (f"Bench {i}", f"bench{i}", None, f"http://x/{i}.m3u8", "Bench")
+                for i in range(channels)
+            )
+            if memory:
+                tracemalloc.start()
+            result = import_xmltv(db, guide, now=now)
+            stats = {
+                "programmes": float(result.inserted),
+                "xml_mb": round(xml_mb, 2),
+                "ingest_seconds": round(result.seconds, 3),
+                "programmes_per_second": round(result.programmes_per_second, 1),
+                "mb_per_second": round(xml_mb / max(result.seconds, 1e-9), 2),
+            }
+            if memory:
+                stats["peak_mb"] = round(
+                    tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2
+                )
+                tracemalloc.stop()
+
+            samples = []
+            for _ in range(queries):
+                started = time.perf_counter()
+                guide_now = db.get_now_next(now)
+                samples.append((time.perf_counter() - started) * 1000.0)
+            if len(guide_now) != channels:
+                raise RuntimeError(
+                    f"now/next devolvio {len(guide_now)} canales de {channels}"
+                )
+            for pct in PERCENTILES:
+                stats[f"now_next_p{pct}"] = round(percentile(samples, pct), 3)
+        finally:
+            db.close()
+    return stats
+
+
+def main(argv=None) -> int:
+    """Punto de entrada de linea de comandos"""
+    parser = argparse.ArgumentParser(description="Benchmark de la guia XMLTV")
+    parser.add_argument("--channels", type=int, default=500)
+    parser.add_argument(
+        "--programmes", type=int, default=200, help="Programas por canal"
+    )
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument(
+        "--memory",
+        action="store_true",
+        help="Mide el pico de memoria de la importacion (tracemalloc)",
+    )
+    args = parser.parse_args(argv)
+
+    stats = run_benchmark(args.channels, args.programmes, args.queries, args.memory)
+    print(
+        f"ingest    {stats['programmes']:.0f} programas ({stats['xml_mb']:.1f} MB) "
+        f"en {stats['ingest_seconds']:.2f} s: "
+        f"{stats['programmes_per_second']:.0f} programas/s, "
+        f"{stats['mb_per_second']:.1f} MB/s"
+    )
+    if "peak_mb" in stats:
+        print(f"memoria   pico {stats['peak_mb']:.1f} MB")
+    values = "  ".join(
+        f"p{pct}={stats[f'now_next_p{pct}']:8.2f} ms" for pct in PERCENTILES
+    )
+    print(f"now_next  {values}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Reproductor falso para los benchmarks
+
+Imita lo que hace un reproductor real al abrir un stream HLS: descarga la
+lista (maestra y de medios si hace falta) y el primer segmento, y despues se
+queda "reproduciendo" hasta que lo terminan.
+"""
+
+import re
+import signal
+import sys
+import time
+import urllib.request
+from urllib.parse import urljoin
+
+
+def _get(url: str) -> bytes:
+    with urllib.request.urlopen(url, timeout=10) as response:
+        return response.read()
+
+
+def _first_uri(text: str, base_url: str) -> str:
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            return urljoin(base_url, line)
+    raise ValueError("Lista sin URIs")
+
+
+def main(argv) -> int:
+    if "--version" in argv:
+        print("VLC media player 3.0.0 (falso)")
+        return 0
+
+    url = next(arg for arg in reversed(argv) if re.match(r"https?://", arg))
+    text = _get(url).decode("utf-8", errors="replace")
+    if "#EXT-X-STREAM-INF" in text:
+        url = _first_uri(text, url)
+        text = _get(url).decode("utf-8", errors="replace")
+    _get(_first_uri(text, url))
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    while True:
+        time.sleep(60)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,395 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark de zapping - Mide cuanto tarda un cambio de canal
+
+Recorre el mismo camino que el boton "Reproducir" (zap.zap_channel: busqueda
+en la base de datos -> espejo -> StreamPlayer.play_channel) sin interfaz,
+contra un reproductor falso y un origen HLS local, y calcula p50/p95/p99 de
+cada fase:
+
+    lookup         busqueda del canal en la base de datos
+    play           play_channel completo (resolucion + arranque del reproductor)
+    spawn          arranque del proceso del reproductor
+    first_segment  desde el clic hasta que el origen recibe el primer segmento
+
+Uso:
+    python benchmarks/zap_benchmark.py               # compara con la linea base
+    python benchmarks/zap_benchmark.py --update-baseline
+
+La linea base se guarda por equipo en ~/.cache/vertele/zap_baseline.json y
+solo se compara en el equipo e interprete que la midieron.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import instrument  # noqa: E402
+from database import ChannelDatabase  # noqa: E402
+from mirrors import MirrorSelector  # noqa: E402
+from player import PlayerCache, StreamPlayer  # noqa: E402
+from preresolve import PlaylistResolver  # noqa: E402
+from zap import zap_channel  # noqa: E402
+
+FAKE_PLAYER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_player.py")
+# Los tiempos absolutos solo son comparables en el mismo equipo: la linea
+# base se guarda fuera del repositorio, en la cache del usuario
+BASELINE_PATH = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "vertele",
+    "zap_baseline.json",
+)
+
+STAGES = ("lookup", "play", "spawn", "first_segment")
+SPAN_STAGES = {"zap.lookup": "lookup", "zap.play": "play", "player.spawn": "spawn"}
+PERCENTILES = (50, 95, 99)
+# p99 con pocas iteraciones es demasiado ruidoso para decidir una regresion
+CHECKED_PERCENTILES = ("p50", "p95")
+DEFAULT_TOLERANCE = 0.5
+DEFAULT_SLACK_MS = 5.0
+SEGMENT_TIMEOUT = 10.0
+
+MASTER = """#EXTM3U
+#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=640x360
+low/index.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=2500000,RESOLUTION=1280x720
+hd/index.m3u8
+"""
+
+MEDIA = """#EXTM3U
+#EXT-X-TARGETDURATION:4
+#EXT-X-MEDIA-SEQUENCE:0
+#EXTINF:4.0,
+seg0.ts
+#EXTINF:4.0,
+seg1.ts
+"""
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Percentil con interpolacion lineal entre las dos muestras vecinas"""
+    if not values:
+        raise ValueError("Sin muestras")
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * pct / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(samples: Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+    """Calcula p50/p95/p99 (en ms) de cada fase con muestras"""
+    return {
+        stage: {f"p{pct}": round(percentile(values, pct), 3) for pct in PERCENTILES}
+        for stage, values in samples.items()
+        if values
+    }
+
+
+def find_regressions(
+    summary: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    tolerance: float = DEFAULT_TOLERANCE,
+    slack_ms: float = DEFAULT_SLACK_MS,
+) -> List[str]:
+    """
+    Compara un resultado con la linea base
+
+    Una fase empeora si un percentil supera el de la linea base en mas de
+    tolerance (fraccion) mas slack_ms; el margen absoluto evita falsos
+    positivos en fases de microsegundos.
+
+    Returns:
+        Descripcion de cada regresion encontrada (vacia si no hay ninguna)
+    """
+    problems = []
+    for stage, expected in sorted(baseline.items()):
+        measured = summary.get(stage)
+        if measured is None:
+            problems.append(f"{stage}: sin muestras")
+            continue
+        for name in CHECKED_PERCENTILES:
+            if name not in expected or name not in measured:
+                continue
+            limit = expected[name] * (1.0 + tolerance) + slack_ms
+            if measured[name] > limit:
+                problems.append(
+                    f"{stage} {name}: {measured[name]:.1f} ms "
+                    f"(linea base {expected[name]:.1f} ms, limite {limit:.1f} ms)"
+                )
+    return problems
+
+
+class HLSOrigin:
+    """
+    Origen HLS local con un canal por prefijo (/chN/...)
+
+    Anota el instante (perf_counter) en que se pide el primer segmento de
+    cada canal.
+    """
+
+    def __init__(self):
+        self.first_segment: Dict[str, float] = {}
+        self._events: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        origin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                channel, _, rest = self.path.lstrip("/").partition("/")
+                if rest == "master.m3u8":
+                    body = MASTER.encode("utf-8")
+                elif rest.endswith("index.m3u8"):
+                    body = MEDIA.encode("utf-8")
+                elif rest.endswith(".ts"):
+                    origin._segment_requested(channel)
+                    body = b"\x47" * 188 * 64
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # El reproductor anterior se termina a mitad de descarga
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.base_url = "http://127.0.0.1:%d" % self.server.server_address[1]
+        threading.Thread(
+            target=self.server.serve_forever, args=(0.05,), daemon=True
+        ).start()
+
+    def _event(self, channel: str) -> threading.Event:
+        with self._lock:
+            return self._events.setdefault(channel, threading.Event())
+
+    def _segment_requested(self, channel: str) -> None:
+        with self._lock:
+            self.first_segment.setdefault(channel, time.perf_counter())
+        self._event(channel).set()
+
+    def stream_url(self, channel: str) -> str:
+        return f"{self.base_url}/{channel}/master.m3u8"
+
+    def wait_first_segment(self, channel: str, timeout: float) -> Optional[float]:
+        """Instante del primer segmento del canal, o None si no llega"""
+        if not self._event(channel).wait(timeout):
+            return None
+        return self.first_segment[channel]
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _InlineTasks:
+    """Sustituto de TaskRunner que ejecuta cada tarea en el acto"""
+
+    def submit(self, func, *args, key=None, on_done=None, on_error=None):
+        # Los errores se propagan para que el benchmark falle en lugar de
+        # intentar mostrar un dialogo
+        result = func(*args)
+        if on_done is not None:
+            on_done(result)
+
+
+def zap_handler(db: ChannelDatabase, player: StreamPlayer) -> Callable:
+    """
+    El manejador real de la aplicacion si GTK esta disponible
+
+    Sin PyGObject se llama directamente a zap.zap_channel, el mismo codigo
+    que VerTeleApp ejecuta en su pool de tareas.
+    """
+    try:
+        from app import VerTeleApp
+    except (ImportError, ValueError):
+        mirrors = MirrorSelector(db)
+        return lambda title, instance, page_url, stream_url: zap_channel(
+            db, mirrors, player, title, instance, stream_url
+        )
+
+    # Sin __init__: no se abre la base de datos por defecto ni se crea ventana
+    app = VerTeleApp.__new__(VerTeleApp)
+    app.db = db
+    app.mirrors = MirrorSelector(db)
+    app.player = player
+    app.player_error = None
+    app.window = None
+    app.tasks = _InlineTasks()
+    return app._on_channel_selected
+
+
+def run_benchmark(
+    iterations: int = 30,
+    prefetch: bool = False,
+    workdir: Optional[str] = None,
+    verbose: bool = False,
+) -> Dict[str, List[float]]:
+    """
+    Ejecuta iterations cambios de canal y retorna las muestras (ms) por fase
+
+    Args:
+        iterations: Numero de cambios de canal
+        prefetch: Pre-resuelve cada canal antes del clic, como al resaltarlo
+        workdir: Directorio para la base de datos y la cache (temporal si None)
+        verbose: Muestra el registro de depuracion de la aplicacion
+    """
+    if verbose:
+        instrument.configure_logging("debug")
+    with contextlib.ExitStack() as stack:
+        if workdir is None:
+            workdir = stack.enter_context(tempfile.TemporaryDirectory())
+        origin = HLSOrigin()
+        stack.callback(origin.close)
+
+        db = ChannelDatabase(os.path.join(workdir, "bench.db"))
+        stack.callback(db.close)
+        channels = [f"bench{i}" for i in range(iterations)]
+        db.bulk_insert_channels(
+            (f"Bench {c}", c, None, origin.stream_url(c), "Benchmark") for c in channels
+        )
+
+        resolver = PlaylistResolver() if prefetch else None
+        if resolver is not None:
+            stack.callback(resolver.close)
+        player = StreamPlayer(
+            candidates=[FAKE_PLAYER],
+            cache=PlayerCache(os.path.join(workdir, "players.json")),
+            remote_control=False,
+            max_players=1,
+            resolver=resolver,
+        )
+        stack.callback(player.close)
+        on_channel_selected = zap_handler(db, player)
+
+        recorder = instrument.enable()
+        stack.callback(instrument.disable)
+        samples = {stage: [] for stage in STAGES}
+
+        for channel in channels:
+            stream_url = origin.stream_url(channel)
+            if resolver is not None:
+                resolver.prefetch(stream_url).result(SEGMENT_TIMEOUT)
+            recorder.clear()
+            start = time.perf_counter()
+            on_channel_selected(f"Bench {channel}", channel, None, stream_url)
+            arrived = origin.wait_first_segment(channel, SEGMENT_TIMEOUT)
+            if arrived is None:
+                raise RuntimeError(f"El reproductor no pidio segmentos de {channel}")
+
+            samples["first_segment"].append((arrived - start) * 1000.0)
+            for span in recorder.spans:
+                stage = SPAN_STAGES.get(span.name)
+                if stage is not None:
+                    samples[stage].append(span.duration * 1000.0)
+        return samples
+
+
+def machine_id() -> Dict[str, str]:
+    """Identifica el equipo e interprete en que se midio una linea base"""
+    return {
+        "host": platform.node(),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+    }
+
+
+def load_baseline(path: str) -> Optional[Dict[str, Dict[str, float]]]:
+    """
+    Lee la linea base guardada
+
+    Returns:
+        Las fases, o None si se midio en otro equipo o con otro interprete
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("machine") != machine_id():
+        return None
+    return baseline["stages"]
+
+
+def save_baseline(path: str, summary: Dict[str, Dict[str, float]], iterations: int):
+    """Guarda un resultado como nueva linea base de este equipo"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(
+            {"machine": machine_id(), "iterations": iterations, "stages": summary},
+            f,
+            indent=2,
+        )
+        f.write("\n")
+
+
+def main(argv=None) -> int:
+    """Punto de entrada de linea de comandos"""
+    parser = argparse.ArgumentParser(description="Benchmark de cambio de canal")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="Guarda el resultado como nueva linea base",
+    )
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--slack-ms", type=float, default=DEFAULT_SLACK_MS)
+    parser.add_argument(
+        "--prefetch",
+        action="store_true",
+        help="Pre-resuelve cada canal antes del clic, como al resaltarlo",
+    )
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    summary = summarize(
+        run_benchmark(args.iterations, args.prefetch, None, args.verbose)
+    )
+    for stage in STAGES:
+        if stage in summary:
+            values = "  ".join(f"{k}={v:8.2f} ms" for k, v in summary[stage].items())
+            print(f"{stage:<14} {values}")
+
+    if args.update_baseline:
+        save_baseline(args.baseline, summary, args.iterations)
+        print(f"Linea base guardada en {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No hay linea base en {args.baseline}; usa --update-baseline")
+        return 0
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print(
+            f"La linea base de {args.baseline} es de otro equipo; "
+            "usa --update-baseline"
+        )
+        return 0
+    problems = find_regressions(summary, baseline, args.tolerance, args.slack_ms)
+    for problem in problems:
+        print(f"REGRESION {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
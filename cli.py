@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Linea de comandos - Subcomandos de VerTele sin interfaz grafica
+
+Solo el subcomando gui importa GTK; el resto trabaja directamente con
+ChannelDatabase y StreamPlayer, de modo que los scripts y las tareas de cron
+arrancan rapido y funcionan en equipos sin pantalla. Los modulos de cada
+subcomando se importan al ejecutarlo.
+
+Si la interfaz ya esta abierta, "play" y el lanzamiento de la interfaz se le
+reenvian por el socket de instancia unica (ver ipc.py).
+"""
+
+import argparse
+import sys
+from typing import List, Optional
+
+import instrument
+from database import ChannelDatabase
+
+# Preferencia con el backend de reproductor elegido (la misma que usa la GUI)
+PLAYER_BACKEND_SETTING = "player_backend"
+
+
+def _print_rows(rows) -> None:
+    """Imprime filas separadas por tabuladores, faciles de procesar en scripts"""
+    for row in rows:
+        print("\t".join("" if value is None else str(value) for value in row))
+
+
+def cmd_list(args, db: ChannelDatabase) -> int:
+    """Lista los canales (instance, titulo, stream) ordenados por titulo"""
+    if args.categories:
+        for category in db.get_categories():
+            print(category)
+        return 0
+    _print_rows(
+        (instance, title, stream_url)
+        for title, instance, _, stream_url in db.iter_channels(args.category)
+    )
+    return 0
+
+
+def cmd_search(args, db: ChannelDatabase) -> int:
+    """Busca canales por titulo, instancia o categoria"""
+    results = db.search(" ".join(args.text), args.limit)
+    _print_rows(
+        (instance, title, category) for title, instance, _, _, category in results
+    )
+    return 0 if results else 1
+
+
+def cmd_play(args, db: ChannelDatabase) -> int:
+    """Reproduce un canal por su instancia"""
+    from mirrors import MirrorSelector
+    from player import StreamPlayer
+
+    channel = db.get_channel_by_instance(args.instance)
+    if channel is None:
+        print(f"Canal no encontrado: {args.instance}", file=sys.stderr)
+        return 1
+    title, _, stream_url = channel
+
+    try:
+        player = StreamPlayer(
+            remote_control=False,
+            preferred_backend=args.player or db.get_setting(PLAYER_BACKEND_SETTING),
+        )
+    except RuntimeError as e:
+        print(f"Reproductor no detectado: {e}", file=sys.stderr)
+        return 2
+    stream_url = MirrorSelector(db).select(args.instance, stream_url)
+    if not player.play_channel(title, stream_url):
+        return 1
+    if args.wait:
+        # El reproductor corre en su propia sesion: sin --wait sigue abierto
+        # aunque este proceso termine
+        for process in player.supervisor.running():
+            process.wait()
+    return 0
+
+
+def cmd_import(args, db: ChannelDatabase) -> int:
+    """Importa una lista M3U/M3U8"""
+    from importer import import_playlist
+
+    try:
+        result = import_playlist(db, args.playlist, args.batch_size)
+    except OSError as e:
+        print(f"Error al leer la lista: {e}", file=sys.stderr)
+        return 1
+    print(
+        f"Importados {result.inserted} de {result.parsed} canales "
+        f"({result.skipped} duplicados) en {result.seconds:.2f} s"
+    )
+    return 0
+
+
+def cmd_sync(args, db: ChannelDatabase) -> int:
+    """Sincroniza las listas de proveedores (solo descarga las que cambiaron)"""
+    from sync import sync_sources
+
+    return sync_sources(db, args.urls)
+
+
+def cmd_epg(args, db: ChannelDatabase) -> int:
+    """Importa una guia XMLTV"""
+    import xml.etree.ElementTree as ET
+
+    from epg import import_xmltv
+
+    try:
+        result = import_xmltv(db, args.guide, args.batch_size)
+    except (OSError, ET.ParseError) as e:
+        print(f"Error al leer la guia: {e}", file=sys.stderr)
+        return 1
+    print(
+        f"Importados {result.inserted} de {result.parsed} programas "
+        f"({result.skipped} sin canal o pasados) en {result.seconds:.2f} s"
+    )
+    return 0
+
+
+def cmd_probe(args, db: ChannelDatabase) -> int:
+    """Comprueba que los streams responden y guarda su estado"""
+    import time
+
+    from prober import ChannelProber, probe_database
+
+    prober = ChannelProber(
+        args.concurrency or ChannelProber.DEFAULT_CONCURRENCY,
+        args.per_host or ChannelProber.DEFAULT_PER_HOST,
+        args.timeout or ChannelProber.DEFAULT_TIMEOUT,
+    )
+    start = time.perf_counter()
+    checked, reachable = probe_database(db, prober)
+    print(
+        f"Comprobados {checked} canales en {time.perf_counter() - start:.1f} s: "
+        f"{reachable} accesibles, {checked - reachable} caidos"
+    )
+    return 0
+
+
+def _forward(request) -> Optional[int]:
+    """
+    Envia la peticion a la instancia de la interfaz que ya esta abierta
+
+    Returns:
+        Codigo de salida, o None si no hay ninguna instancia en ejecucion (y
+        la peticion se atiende en local)
+    """
+    from ipc import send_request
+
+    try:
+        response = send_request(request)
+    except (OSError, ValueError) as e:
+        # La instancia recibio la peticion: repetirla abriria otro reproductor
+        print(f"VerTele no respondio a la peticion: {e}", file=sys.stderr)
+        return 1
+    if response is None:
+        return None
+    if not response.get("ok"):
+        print(response.get("error", "Error desconocido"), file=sys.stderr)
+        return 1
+    return 0
+
+
+def cmd_gui(args) -> int:
+    """Abre la interfaz grafica (el unico subcomando que carga GTK)"""
+    try:
+        from app import main as gui_main
+    except (ImportError, ValueError) as e:
+        # gi ausente o sin la version de Gtk requerida
+        print(f"No se puede abrir la interfaz grafica: {e}", file=sys.stderr)
+        return 1
+    return gui_main(args.db_path)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Construye el parser con todos los subcomandos"""
+    parser = argparse.ArgumentParser(
+        prog="VerTele.py",
+        description="Visor de canales. Sin subcomando abre la interfaz grafica.",
+    )
+    parser.add_argument("--db", dest="db_path", help="Ruta de la base de datos")
+    commands = parser.add_subparsers(dest="command", metavar="COMANDO")
+
+    list_parser = commands.add_parser("list", help="Lista los canales")
+    list_parser.add_argument("--category", help="Solo los canales de una categoria")
+    list_parser.add_argument(
+        "--categories", action="store_true", help="Lista las categorias"
+    )
+    list_parser.set_defaults(handler=cmd_list)
+
+    search_parser = commands.add_parser("search", help="Busca canales")
+    search_parser.add_argument("text", nargs="+", help="Texto a buscar")
+    search_parser.add_argument("--limit", type=int, default=None)
+    search_parser.set_defaults(handler=cmd_search)
+
+    play_parser = commands.add_parser("play", help="Reproduce un canal")
+    play_parser.add_argument("instance", help="Instancia del canal (ver list)")
+    play_parser.add_argument("--player", help="Backend a usar (vlc, cvlc, mpv, ffplay)")
+    play_parser.add_argument(
+        "--wait", action="store_true", help="Espera a que se cierre el reproductor"
+    )
+    play_parser.add_argument(
+        "--standalone",
+        action="store_true",
+        help="No reenviar a la interfaz abierta; lanzar el reproductor aqui",
+    )
+    play_parser.set_defaults(handler=cmd_play)
+
+    import_parser = commands.add_parser("import", help="Importa una lista M3U/M3U8")
+    import_parser.add_argument("playlist", help="Archivo M3U/M3U8 ('-' para stdin)")
+    import_parser.add_argument(
+        "--batch-size", type=int, default=ChannelDatabase.INSERT_BATCH_SIZE
+    )
+    import_parser.set_defaults(handler=cmd_import)
+
+    sync_parser = commands.add_parser(
+        "sync", help="Sincroniza listas M3U remotas de proveedores"
+    )
+    sync_parser.add_argument(
+        "urls", nargs="*", help="URLs de las listas (por defecto, las ya conocidas)"
+    )
+    sync_parser.set_defaults(handler=cmd_sync)
+
+    epg_parser = commands.add_parser("epg", help="Importa una guia XMLTV")
+    epg_parser.add_argument(
+        "guide", help="Archivo XMLTV, .xml o .xml.gz ('-' para stdin)"
+    )
+    epg_parser.add_argument(
+        "--batch-size", type=int, default=ChannelDatabase.INSERT_BATCH_SIZE
+    )
+    epg_parser.set_defaults(handler=cmd_epg)
+
+    probe_parser = commands.add_parser(
+        "probe", help="Comprueba que los streams responden"
+    )
+    # Sin valor se usan los de ChannelProber (importarlo aqui costaria asyncio)
+    probe_parser.add_argument("--concurrency", type=int)
+    probe_parser.add_argument("--per-host", type=int)
+    probe_parser.add_argument("--timeout", type=float)
+    probe_parser.set_defaults(handler=cmd_probe)
+
+    gui_parser = commands.add_parser("gui", help="Abre la interfaz grafica")
+    gui_parser.set_defaults(handler=None)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Punto de entrada de linea de comandos"""
+    args = build_parser().parse_args(argv)
+    handler = getattr(args, "handler", None)
+    instrument.configure_from_env()
+
+    # Si la interfaz ya esta abierta, ella atiende la peticion; con --db no,
+    # porque la instancia abierta usa su propia base de datos
+    forwarded = None
+    if args.db_path is None:
+        if handler is None:
+            forwarded = _forward({"command": "show"})
+        elif handler is cmd_play and not (args.standalone or args.player or args.wait):
+            forwarded = _forward({"command": "play", "instance": args.instance})
+    if forwarded is not None:
+        return forwarded
+
+    if handler is None:
+        return cmd_gui(args)
+
+    with instrument.span(f"cli.{args.command}"):
+        db = ChannelDatabase(args.db_path)
+        try:
+            return handler(args, db)
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,110 +4,1168 @@
 Data access layer - Maneja la persistencia de datos
 """
 
+import re
 import sqlite3
-from typing import List, Tuple, Optional
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Set, Tuple, Optional
 from pathlib import Path
+from urllib.parse import quote, urlsplit
+
+from instrument import traced
+
+
+class _ReaderSlot:
+    """Conexion de lectura guardada en el threading.local de un hilo"""
+
+    __slots__ = ("conn", "__weakref__")
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+
+def _close_reader(
+    lock: threading.Lock, readers: Set[sqlite3.Connection], conn: sqlite3.Connection
+) -> None:
+    """Cierra la conexion de un hilo que termino"""
+    with lock:
+        readers.discard(conn)
+    conn.close()
+
+
+class ConnectionManager:
+    """
+    Gestiona las conexiones SQLite de la aplicacion
+
+    La base de datos trabaja en modo WAL: cada hilo obtiene su propia conexion
+    de solo lectura y todas las escrituras pasan por una unica conexion
+    escritora protegida por un lock. Asi una importacion larga no bloquea los
+    listados ni las busquedas de otros hilos.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.in_memory = db_path == ":memory:" or "mode=memory" in db_path
+        self._write_lock = threading.RLock()
+        self._local = threading.local()
+        self._readers: Set[sqlite3.Connection] = set()
+        self._readers_lock = threading.Lock()
+
+        self.writer = sqlite3.connect(db_path, check_same_thread=False)
+        self.writer.row_factory = sqlite3.Row
+        if not self.in_memory:
+            self.writer.execute("PRAGMA journal_mode=WAL")
+            self.writer.execute("PRAGMA synchronous=NORMAL")
+
+    def _open_reader(self) -> "_ReaderSlot":
+        """
+        Abre una conexion de solo lectura para el hilo actual
+
+        La conexion se cierra cuando termina el hilo (al liberarse su
+        threading.local) o en close(), que puede llamarse desde otro hilo.
+        """
+        uri = "file:%s?mode=ro" % quote(str(Path(self.db_path).resolve()))
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        slot = _ReaderSlot(conn)
+        with self._readers_lock:
+            self._readers.add(conn)
+        weakref.finalize(slot, _close_reader, self._readers_lock, self._readers, conn)
+        return slot
+
+    @contextmanager
+    def read(self):
+        """Entrega la conexion de lectura del hilo actual"""
+        if self.in_memory:
+            # Una base en memoria solo existe en la conexion escritora
+            with self._write_lock:
+                yield self.writer
+            return
+
+        slot = getattr(self._local, "slot", None)
+        if slot is None:
+            slot = self._local.slot = self._open_reader()
+        yield slot.conn
+
+    @contextmanager
+    def transaction(self):
+        """Ejecuta un bloque de escrituras en la conexion escritora y hace commit"""
+        with self._write_lock:
+            try:
+                yield self.writer
+                self.writer.commit()
+            except Exception:
+                self.writer.rollback()
+                raise
+
+    def close(self) -> None:
+        """Cierra todas las conexiones (las lectoras de cualquier hilo)"""
+        with self._readers_lock:
+            readers = list(self._readers)
+            self._readers.clear()
+        for conn in readers:
+            conn.close()
+        self.writer.close()
+
+
+def _migration_channels(cursor: sqlite3.Cursor) -> None:
+    """v1: tabla principal de canales"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS channels (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL UNIQUE,
+            instance TEXT NOT NULL UNIQUE,
+            page_url TEXT,
+            stream_url TEXT NOT NULL,
+            category TEXT DEFAULT 'General'
+        )
+    """)
+
+
+def _migration_search_index(cursor: sqlite3.Cursor) -> None:
+    """v2: indice FTS5 de busqueda y triggers que lo sincronizan"""
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'channels_fts'"
+    )
+    if cursor.fetchone() is not None:
+        return
+
+    # remove_diacritics 2 requiere SQLite >= 3.27
+    diacritics = "2" if sqlite3.sqlite_version_info >= (3, 27, 0) else "1"
+    try:
+        cursor.execute(f"""
+            CREATE VIRTUAL TABLE channels_fts USING fts5(
+                title, instance, category,
+                content='channels', content_rowid='id',
+                tokenize='unicode61 remove_diacritics {diacritics}',
+                prefix='2 3'
+            )
+        """)
+    except sqlite3.OperationalError:
+        # SQLite compilado sin FTS5: search() usa LIKE
+        return
+
+    for statement in (
+        """
+        CREATE TRIGGER IF NOT EXISTS channels_fts_ai AFTER INSERT ON channels BEGIN
+            INSERT INTO channels_fts (rowid, title, instance, category)
+            VALUES (new.id, new.title, new.instance, new.category);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS channels_fts_ad AFTER DELETE ON channels BEGIN
+            INSERT INTO channels_fts (channels_fts, rowid, title, instance, category)
+            VALUES ('delete', old.id, old.title, old.instance, old.category);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS channels_fts_au AFTER UPDATE ON channels BEGIN
+            INSERT INTO channels_fts (channels_fts, rowid, title, instance, category)
+            VALUES ('delete', old.id, old.title, old.instance, old.category);
+            INSERT INTO channels_fts (rowid, title, instance, category)
+            VALUES (new.id, new.title, new.instance, new.category);
+        END
+        """,
+    ):
+        cursor.execute(statement)
+    # Indexar los canales que ya existian antes del indice
+    cursor.execute("INSERT INTO channels_fts (channels_fts) VALUES ('rebuild')")
+
+
+def _migration_listing_indexes(cursor: sqlite3.Cursor) -> None:
+    """
+    v3: indice que cubre el listado por categoria ordenado por titulo
+
+    La busqueda por instancia ya usa el indice UNIQUE de la columna: el
+    planificador lo prefiere a cualquier indice cubriente porque devuelve
+    como maximo una fila.
+    """
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_channels_category_title
+        ON channels (category, title, instance, page_url, stream_url)
+    """)
+
+
+def _migration_settings(cursor: sqlite3.Cursor) -> None:
+    """v4: preferencias del usuario (clave/valor)"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        ) WITHOUT ROWID
+    """)
+
+
+def _migration_stream_status(cursor: sqlite3.Cursor) -> None:
+    """v5: estado de los streams segun la ultima comprobacion del prober"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stream_status (
+            instance TEXT PRIMARY KEY,
+            reachable INTEGER NOT NULL,
+            http_status INTEGER,
+            ttfb_ms REAL,
+            variants INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            checked_at REAL NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_stream_status_reachable
+        ON stream_status (reachable, instance)
+    """)
+
+
+def _migration_channel_logos(cursor: sqlite3.Cursor) -> None:
+    """v6: URL del logo de cada canal (tvg-logo de las listas M3U)"""
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(channels)")]
+    if "logo_url" not in columns:
+        cursor.execute("ALTER TABLE channels ADD COLUMN logo_url TEXT")
+
+
+def _migration_epg(cursor: sqlite3.Cursor) -> None:
+    """v7: guia de programacion (XMLTV) con indice de intervalos por canal"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS epg_programmes (
+            id INTEGER PRIMARY KEY,
+            instance TEXT NOT NULL,
+            start INTEGER NOT NULL,
+            stop INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            description TEXT,
+            UNIQUE (instance, start)
+        )
+    """)
+    # El primer programa con stop > ahora es el actual (o el siguiente si hay
+    # un hueco): "ahora y despues" son dos busquedas por canal en este indice
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_epg_instance_stop
+        ON epg_programmes (instance, stop, start)
+    """)
+
+
+def _migration_seed_channels(cursor: sqlite3.Cursor) -> None:
+    """v8: canales de ejemplo (channels_real.py) si la base de datos esta vacia"""
+    if cursor.execute("SELECT 1 FROM channels LIMIT 1").fetchone() is not None:
+        return
+    # Solo una base de datos nueva paga la importacion de la lista
+    from channels_real import CHANNELS
+
+    cursor.executemany(
+        "INSERT OR IGNORE INTO channels (title, instance, page_url, stream_url, category) VALUES (?, ?, ?, ?, ?)",
+        (
+            (
+                ch["title"],
+                ch["instance"],
+                ch["page_url"],
+                ch["stream_url"],
+                ch.get("category", "General"),
+            )
+            for ch in CHANNELS
+        ),
+    )
+
+
+def _migration_channel_streams(cursor: sqlite3.Cursor) -> None:
+    """v9: URLs alternativas (espejos) de cada canal con su puntuacion"""
+    # rank es el orden del proveedor (0 = channels.stream_url); score cuenta
+    # las carreras ganadas y decae con el tiempo desde updated_at
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS channel_streams (
+            instance TEXT NOT NULL,
+            stream_url TEXT NOT NULL,
+            rank INTEGER NOT NULL DEFAULT 0,
+            score REAL NOT NULL DEFAULT 0,
+            updated_at REAL,
+            PRIMARY KEY (instance, stream_url)
+        ) WITHOUT ROWID
+    """)
+
+
+def _migration_provider_sources(cursor: sqlite3.Cursor) -> None:
+    """v10: listas de proveedores sincronizadas y origen de cada canal"""
+    # etag/last_modified permiten peticiones condicionales; content_hash es el
+    # del cuerpo completo, para servidores que no envian validadores
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS provider_sources (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            content_hash TEXT,
+            synced_at REAL
+        ) WITHOUT ROWID
+    """)
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(channels)")]
+    if "source" not in columns:
+        cursor.execute("ALTER TABLE channels ADD COLUMN source TEXT")
+    if "content_hash" not in columns:
+        cursor.execute("ALTER TABLE channels ADD COLUMN content_hash TEXT")
+    # Cubre la lectura de los hashes de una lista sin tocar la tabla
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_channels_source
+        ON channels (source, instance, content_hash)
+    """)
+
+
+# Migraciones en orden; la posicion en la lista es la version del esquema.
+# Cada paso debe ser idempotente y nunca se modifica una vez publicado.
+MIGRATIONS = (
+    _migration_channels,
+    _migration_search_index,
+    _migration_listing_indexes,
+    _migration_settings,
+    _migration_stream_status,
+    _migration_channel_logos,
+    _migration_epg,
+    _migration_seed_channels,
+    _migration_channel_streams,
+    _migration_provider_sources,
+)
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# Consultas frecuentes y el fragmento (o fragmentos) que debe aparecer en su
+# plan (ver verify_query_plans)
+INDEXED_QUERIES = (
+    (
+        "channels_by_category",
+        "SELECT title, instance, page_url, stream_url FROM channels WHERE category = ? ORDER BY title",
+        ("General",),
+        "idx_channels_category_title",
+    ),
+    (
+        "channels_page_by_category",
+        "SELECT title, instance, page_url, stream_url FROM channels WHERE category = ? AND title > ? ORDER BY title LIMIT ?",
+        ("General", "", 500),
+        "idx_channels_category_title",
+    ),
+    (
+        "categories",
+        "SELECT DISTINCT category FROM channels ORDER BY category",
+        (),
+        "idx_channels_category_title",
+    ),
+    (
+        "channel_by_instance",
+        "SELECT title, page_url, stream_url FROM channels WHERE instance = ?",
+        ("canal",),
+        # El numero del indice automatico de UNIQUE depende del orden de las
+        # columnas en la tabla: basta con que sea uno de channels por instancia
+        ("USING INDEX sqlite_autoindex_channels_", "(instance=?)"),
+    ),
+    (
+        "epg_upcoming",
+        "SELECT id FROM epg_programmes WHERE instance = ? AND stop > ? ORDER BY stop LIMIT 2",
+        ("canal", 0),
+        "idx_epg_instance_stop (instance=? AND stop>?)",
+    ),
+    (
+        "streams_by_instance",
+        "SELECT stream_url, rank, score, updated_at FROM channel_streams WHERE instance = ?",
+        ("canal",),
+        "USING PRIMARY KEY (instance=?)",
+    ),
+    (
+        "channel_hashes_by_source",
+        "SELECT instance, content_hash FROM channels WHERE source = ?",
+        ("http://proveedor/lista.m3u",),
+        "USING COVERING INDEX idx_channels_source (source=?)",
+    ),
+)
 
 
 class ChannelDatabase:
     """Gestiona el acceso a la base de datos de canales"""
 
     DB_NAME = "channels.db"
+    INSERT_BATCH_SIZE = 5000
+    PAGE_SIZE = 500
+    SEARCH_LIMIT = 200
+    # Parametros por consulta en las listas IN (SQLite antiguo admite 999)
+    MAX_QUERY_PARAMS = 500
+    # Peso de cada columna del indice FTS en el ranking bm25
+    SEARCH_WEIGHTS = (10.0, 4.0, 1.0)
+    # Cada semana sin ganar una carrera, la puntuacion de un espejo se reduce
+    # a la mitad
+    STREAM_SCORE_HALF_LIFE = 7 * 24 * 3600.0
 
     def __init__(self, db_path: Optional[str] = None):
         self.db_path = db_path or str(Path(__file__).parent / self.DB_NAME)
-        self.conn = sqlite3.connect(self.db_path)
-        self.conn.row_factory = sqlite3.Row
-        self._create_tables()
-        self._seed_data()
-
-    def _create_tables(self) -> None:
-        """Crea las tablas si no existen"""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS channels (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL UNIQUE,
-                instance TEXT NOT NULL UNIQUE,
-                page_url TEXT,
-                stream_url TEXT NOT NULL,
-                category TEXT DEFAULT 'General'
+        self.connections = ConnectionManager(self.db_path)
+        # Conexion escritora, se mantiene por compatibilidad
+        self.conn = self.connections.writer
+        self._migrate()
+        self.fts_enabled = self._has_table("channels_fts")
+
+    @traced("db.migrate")
+    def _migrate(self) -> None:
+        """
+        Aplica las migraciones pendientes segun PRAGMA user_version
+
+        Con el esquema al dia (el arranque habitual) solo se lee el pragma: no
+        hay DDL ni commits. Las pendientes se aplican en una unica transaccion,
+        incluida la carga inicial de canales de una base de datos nueva.
+        """
+        with self.connections.read() as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+
+        with self.connections.transaction() as conn:
+            # BEGIN explicito: sqlite3 no abre transaccion antes de un DDL
+            conn.execute("BEGIN")
+            cursor = conn.cursor()
+            for migration in MIGRATIONS[version:]:
+                migration(cursor)
+            # PRAGMA no admite parametros; SCHEMA_VERSION es siempre un entero
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION:d}")
+
+    def _has_table(self, name: str) -> bool:
+        """Indica si existe una tabla con ese nombre"""
+        with self.connections.read() as conn:
+            cursor = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                (name,),
             )
-        """)
-        self.conn.commit()
+            return cursor.fetchone() is not None
 
-    def _seed_data(self) -> None:
-        """Inserta datos iniciales si la tabla esta vacia"""
-        cursor = self.conn.cursor()
+    def get_schema_version(self) -> int:
+        """Retorna la version del esquema (PRAGMA user_version)"""
+        with self.connections.read() as conn:
+            return conn.execute("PRAGMA user_version").fetchone()[0]
 
-        try:
-            cursor.execute("SELECT COUNT(*) FROM channels")
-            count = cursor.fetchone()[0]
-            if count == 0:
-                self._insert_channels(cursor)
-        except sqlite3.OperationalError:
-            self._insert_channels(cursor)
+    def explain_query_plan(self, sql: str, params: Tuple = ()) -> List[str]:
+        """Retorna el detalle de EXPLAIN QUERY PLAN para una consulta"""
+        with self.connections.read() as conn:
+            cursor = conn.execute("EXPLAIN QUERY PLAN " + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
 
-        self.conn.commit()
+    def verify_query_plans(self) -> List[str]:
+        """
+        Comprueba que las consultas frecuentes usan sus indices
 
-    def _insert_channels(self, cursor) -> None:
-        """Inserta los canales reales desde channels_real.py"""
-        from channels_real import CHANNELS
+        Returns:
+            Lista de problemas encontrados (vacia si todos los planes son correctos)
+        """
+        problems = []
+        for name, sql, params, expected in INDEXED_QUERIES:
+            plan = " | ".join(self.explain_query_plan(sql, params))
+            fragments = (expected,) if isinstance(expected, str) else expected
+            missing = [fragment for fragment in fragments if fragment not in plan]
+            if missing:
+                problems.append(f"{name}: se esperaba {missing} ({plan})")
+            if "TEMP B-TREE" in plan:
+                problems.append(f"{name}: requiere ordenar en memoria ({plan})")
+        return problems
 
-        for ch in CHANNELS:
-            cursor.execute(
-                "INSERT INTO channels (title, instance, page_url, stream_url, category) VALUES (?, ?, ?, ?, ?)",
-                (
-                    ch["title"],
-                    ch["instance"],
-                    ch["page_url"],
-                    ch["stream_url"],
-                    ch.get("category", "General"),
-                ),
-            )
+    @traced("db.bulk_insert_channels")
+    def bulk_insert_channels(
+        self, rows: Iterable[Tuple], batch_size: Optional[int] = None
+    ) -> int:
+        """
+        Inserta canales en lotes dentro de una unica transaccion
+
+        Args:
+            rows: Iterable de tuplas (title, instance, page_url, stream_url, category)
+                con logo_url opcional al final. Se consume por lotes, nunca
+                se materializa completo en memoria.
+            batch_size: Filas por llamada a executemany
+
+        Returns:
+            Numero de canales insertados (los duplicados se ignoran)
+        """
+        batch_size = batch_size or self.INSERT_BATCH_SIZE
+        rows = iter(rows)
+        inserted = 0
+        with self.connections.transaction() as conn:
+            cursor = conn.cursor()
+            while True:
+                batch = [
+                    row if len(row) == 6 else tuple(row) + (None,)
+                    for row in islice(rows, batch_size)
+                ]
+                if not batch:
+                    break
+                cursor.executemany(
+                    "INSERT OR IGNORE INTO channels (title, instance, page_url, stream_url, category, logo_url) VALUES (?, ?, ?, ?, ?, ?)",
+                    batch,
+                )
+                # rowcount no incluye las filas escritas por triggers
+                inserted += cursor.rowcount
+        return inserted
 
     def get_all_channels(self) -> List[Tuple]:
         """Obtiene todos los canales ordenados por titulo"""
-        cursor = self.conn.cursor()
-        cursor.execute(
-            "SELECT title, instance, page_url, stream_url FROM channels ORDER BY title"
-        )
-        channels = cursor.fetchall()
-        return channels
+        with self.connections.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT title, instance, page_url, stream_url FROM channels ORDER BY title"
+            )
+            channels = cursor.fetchall()
+            return channels
+
+    @staticmethod
+    def _listing_filter(
+        category: Optional[str], after: Optional[str], exclude_dead: bool
+    ) -> Tuple[str, List]:
+        """Clausula WHERE comun a los listados de canales"""
+        conditions = []
+        params = []
+        if category is not None:
+            conditions.append("category = ?")
+            params.append(category)
+        if after is not None:
+            conditions.append("title > ?")
+            params.append(after)
+        if exclude_dead:
+            conditions.append(
+                "instance NOT IN (SELECT instance FROM stream_status WHERE reachable = 0)"
+            )
+        where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+        return where, params
 
+    @traced("db.get_channels_page")
+    def get_channels_page(
+        self,
+        category: Optional[str] = None,
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> Tuple[List[Tuple], Optional[str]]:
+        """
+        Obtiene una pagina de canales ordenados por titulo (paginacion keyset)
+
+        El titulo es UNIQUE, asi que sirve como cursor: cada pagina continua
+        despues del ultimo titulo entregado sin usar OFFSET.
+
+        Args:
+            category: Filtra por categoria si se indica
+            after: Cursor devuelto por la pagina anterior (None para la primera)
+            limit: Tamaño de la pagina
+
+        Returns:
+            Tupla (filas, cursor). El cursor es None cuando no hay mas paginas.
+        """
+        limit = limit or self.PAGE_SIZE
+        where, params = self._listing_filter(category, after, False)
+
+        with self.connections.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT title, instance, page_url, stream_url FROM channels {where} ORDER BY title LIMIT ?",
+                params + [limit + 1],
+            )
+            rows = cursor.fetchall()
+            if len(rows) > limit:
+                rows = rows[:limit]
+                return rows, rows[-1][0]
+            return rows, None
+
+    def iter_channel_pages(
+        self, category: Optional[str] = None, page_size: Optional[int] = None
+    ) -> Iterator[List[Tuple]]:
+        """Genera las paginas de canales una a una, sin mantener cursores abiertos"""
+        after = None
+        while True:
+            rows, after = self.get_channels_page(category, after, page_size)
+            if rows:
+                yield rows
+            if after is None:
+                break
+
+    def iter_channels(
+        self, category: Optional[str] = None, page_size: Optional[int] = None
+    ) -> Iterator[Tuple]:
+        """Genera los canales ordenados por titulo, pagina a pagina"""
+        for page in self.iter_channel_pages(category, page_size):
+            yield from page
+
+    @traced("db.get_channel_by_instance")
     def get_channel_by_instance(self, instance: str) -> Optional[Tuple]:
         """Obtiene un canal especifico por su instancia"""
-        cursor = self.conn.cursor()
-        cursor.execute(
-            "SELECT title, page_url, stream_url FROM channels WHERE instance = ?",
-            (instance,),
-        )
-        channel = cursor.fetchone()
-        return channel
+        with self.connections.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT title, page_url, stream_url FROM channels WHERE instance = ?",
+                (instance,),
+            )
+            channel = cursor.fetchone()
+            return channel
+
+    @traced("db.count_channels")
+    def count_channels(
+        self, category: Optional[str] = None, exclude_dead: bool = False
+    ) -> int:
+        """Cuenta los canales de una categoria (o todos)"""
+        where, params = self._listing_filter(category, None, exclude_dead)
+        with self.connections.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT COUNT(*) FROM channels {where}", params)
+            return cursor.fetchone()[0]
+
+    @traced("db.count_channels_by_category")
+    def count_channels_by_category(self, exclude_dead: bool = False) -> Dict[str, int]:
+        """Cuenta los canales de cada categoria (en orden alfabetico)"""
+        where, params = self._listing_filter(None, None, exclude_dead)
+        with self.connections.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT category, COUNT(*) FROM channels {where} GROUP BY category ORDER BY category",
+                params,
+            )
+            return dict(cursor.fetchall())
+
+    @traced("db.get_channels_slice")
+    def get_channels_slice(
+        self,
+        category: Optional[str],
+        offset: int,
+        limit: int,
+        after: Optional[str] = None,
+        exclude_dead: bool = False,
+    ) -> List[Tuple]:
+        """
+        Obtiene (title, instance, logo_url) de un tramo de canales ordenados
+        por titulo
+
+        Args:
+            category: Filtra por categoria si se indica
+            offset: Posicion de la primera fila del tramo
+            limit: Numero de filas
+            after: Titulo de la fila anterior a offset, si se conoce. Permite
+                saltar directamente con el indice en lugar de usar OFFSET.
+            exclude_dead: Omite los canales caidos en la ultima comprobacion
+        """
+        where, params = self._listing_filter(category, after, exclude_dead)
+        if after is not None:
+            offset = 0
+        with self.connections.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT title, instance, logo_url FROM channels {where} ORDER BY title LIMIT ? OFFSET ?",
+                params + [limit, offset],
+            )
+            return cursor.fetchall()
+
+    @traced("db.get_categories")
+    def get_categories(self) -> List[str]:
+        """Obtiene las categorias existentes ordenadas alfabeticamente"""
+        with self.connections.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT DISTINCT category FROM channels ORDER BY category")
+            return [row[0] for row in cursor.fetchall()]
 
     def get_channels_by_category(self, category: str) -> List[Tuple]:
         """Obtiene canales por categoria"""
-        cursor = self.conn.cursor()
-        cursor.execute(
-            "SELECT title, instance, page_url, stream_url FROM channels WHERE category = ? ORDER BY title",
-            (category,),
-        )
-        return cursor.fetchall()
+        with self.connections.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT title, instance, page_url, stream_url FROM channels WHERE category = ? ORDER BY title",
+                (category,),
+            )
+            return cursor.fetchall()
+
+    @staticmethod
+    def _build_match_query(text: str) -> str:
+        """Convierte el texto del usuario en una consulta FTS5 por prefijos"""
+        terms = re.findall(r"\w+", text, re.UNICODE)
+        return " ".join('"%s"*' % term for term in terms)
+
+    @traced("db.search")
+    def search(self, text: str, limit: Optional[int] = None) -> List[Tuple]:
+        """
+        Busca canales por titulo, instancia o categoria
+
+        La busqueda usa el indice FTS5: coincide por prefijo, ignora tildes
+        y ordena por relevancia (bm25).
+
+        Args:
+            text: Texto introducido por el usuario
+            limit: Maximo de resultados
+
+        Returns:
+            Filas (title, instance, page_url, stream_url, category)
+        """
+        limit = limit or self.SEARCH_LIMIT
+        query = self._build_match_query(text)
+        if not query:
+            return []
+
+        with self.connections.read() as conn:
+            cursor = conn.cursor()
+            if not self.fts_enabled:
+                cursor.execute(
+                    "SELECT title, instance, page_url, stream_url, category FROM channels WHERE title LIKE ? ORDER BY title LIMIT ?",
+                    ("%" + text.strip() + "%", limit),
+                )
+                return cursor.fetchall()
+
+            cursor.execute(
+                """
+                SELECT c.title, c.instance, c.page_url, c.stream_url, c.category
+                FROM channels_fts
+                JOIN channels c ON c.id = channels_fts.rowid
+                WHERE channels_fts MATCH ?
+                ORDER BY bm25(channels_fts, ?, ?, ?)
+                LIMIT ?
+                """,
+                (query,) + self.SEARCH_WEIGHTS + (limit,),
+            )
+            return cursor.fetchall()
+
+    def record_stream_status(self, results: Iterable[Tuple]) -> None:
+        """
+        Guarda el resultado de comprobar streams en una unica transaccion
+
+        Args:
+            results: Tuplas (instance, reachable, http_status, ttfb_ms,
+                variants, error, checked_at), por ejemplo prober.ProbeResult
+        """
+        with self.connections.transaction() as conn:
+            conn.executemany(
+                """
+                INSERT OR REPLACE INTO stream_status
+                    (instance, reachable, http_status, ttfb_ms, variants, error, checked_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (tuple(result) for result in results),
+            )
+
+    def get_stream_status(self, instance: str) -> Optional[Tuple]:
+        """Obtiene el ultimo estado comprobado de un canal"""
+        with self.connections.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT reachable, http_status, ttfb_ms, variants, error, checked_at FROM stream_status WHERE instance = ?",
+                (instance,),
+            )
+            return cursor.fetchone()
+
+    @traced("db.get_dead_instances")
+    def get_dead_instances(self) -> Set[str]:
+        """Instancias de los canales cuyo stream no respondio en la ultima comprobacion"""
+        with self.connections.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT instance FROM stream_status WHERE reachable = 0")
+            return {row[0] for row in cursor.fetchall()}
+
+    def last_channel_id(self) -> int:
+        """Ultimo id asignado a un canal (0 si nunca se inserto ninguno)"""
+        with self.connections.read() as conn:
+            row = conn.execute(
+                "SELECT seq FROM sqlite_sequence WHERE name = 'channels'"
+            ).fetchone()
+        return row[0] if row else 0
+
+    def add_channel_streams(
+        self, rows: Iterable[Tuple], after_id: Optional[int] = None
+    ) -> int:
+        """
+        Registra URLs alternativas de canales en una unica transaccion
+
+        Args:
+            rows: Tuplas (instance, stream_url, rank); las URLs ya registradas
+                conservan su rango y puntuacion
+            after_id: Si se indica, solo se registran las de canales con id
+                mayor (los insertados tras last_channel_id)
+
+        Returns:
+            Numero de URLs nuevas
+        """
+        with self.connections.transaction() as conn:
+            if after_id is None:
+                cursor = conn.executemany(
+                    "INSERT OR IGNORE INTO channel_streams (instance, stream_url, rank) VALUES (?, ?, ?)",
+                    rows,
+                )
+            else:
+                cursor = conn.executemany(
+                    "INSERT OR IGNORE INTO channel_streams (instance, stream_url, rank) "
+                    "SELECT ?, ?, ? WHERE EXISTS "
+                    "(SELECT 1 FROM channels WHERE instance = ? AND id > ?)",
+                    (
+                        (instance, url, rank, instance, after_id)
+                        for instance, url, rank in rows
+                    ),
+                )
+            return cursor.rowcount
+
+    def _decayed_score(
+        self, score: float, updated_at: Optional[float], now: float
+    ) -> float:
+        """Puntuacion de un espejo reducida segun el tiempo desde su ultima victoria"""
+        if not score or updated_at is None:
+            return 0.0
+        elapsed = max(now - updated_at, 0.0)
+        return score * 0.5 ** (elapsed / self.STREAM_SCORE_HALF_LIFE)
+
+    @traced("db.get_stream_candidates")
+    def get_stream_candidates(
+        self, instance: str, now: Optional[float] = None
+    ) -> List[str]:
+        """
+        URLs de un canal de la mejor a la peor
+
+        Se ordenan por puntuacion (con decaimiento) y despues por rango; la
+        URL de channels entra con rango 0 aunque no tenga fila en
+        channel_streams.
+
+        Args:
+            instance: Instancia del canal
+            now: Instante de referencia para el decaimiento (segundos epoch)
+        """
+        now = time.time() if now is None else now
+        with self.connections.read() as conn:
+            rows = conn.execute(
+                "SELECT stream_url, rank, score, updated_at FROM channel_streams WHERE instance = ?",
+                (instance,),
+            ).fetchall()
+            primary = conn.execute(
+                "SELECT stream_url FROM channels WHERE instance = ?", (instance,)
+            ).fetchone()
+        if primary is not None and primary[0] not in {row[0] for row in rows}:
+            rows.append((primary[0], 0, 0.0, None))
+        rows.sort(key=lambda row: (-self._decayed_score(row[2], row[3], now), row[1]))
+        return [row[0] for row in rows]
+
+    def record_stream_win(
+        self, instance: str, stream_url: str, now: Optional[float] = None
+    ) -> None:
+        """Suma una victoria a un espejo sobre su puntuacion ya decaida"""
+        now = time.time() if now is None else now
+        with self.connections.transaction() as conn:
+            row = conn.execute(
+                "SELECT rank, score, updated_at FROM channel_streams WHERE instance = ? AND stream_url = ?",
+                (instance, stream_url),
+            ).fetchone()
+            rank, score, updated_at = row if row is not None else (0, 0.0, None)
+            conn.execute(
+                "INSERT OR REPLACE INTO channel_streams (instance, stream_url, rank, score, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (
+                    instance,
+                    stream_url,
+                    rank,
+                    self._decayed_score(score, updated_at, now) + 1.0,
+                    now,
+                ),
+            )
+
+    def get_stream_hosts(self) -> Set[str]:
+        """Hosts de todas las URLs de streams (canales y espejos)"""
+        with self.connections.read() as conn:
+            cursor = conn.execute(
+                "SELECT stream_url FROM channels UNION SELECT stream_url FROM channel_streams"
+            )
+            hosts = {urlsplit(row[0]).hostname for row in cursor}
+        hosts.discard(None)
+        return hosts
+
+    def get_provider_source(self, url: str) -> Optional[Tuple]:
+        """
+        Estado de la ultima sincronizacion de una lista
+
+        Returns:
+            (etag, last_modified, content_hash, synced_at) o None si nunca se
+            sincronizo
+        """
+        with self.connections.read() as conn:
+            cursor = conn.execute(
+                "SELECT etag, last_modified, content_hash, synced_at FROM provider_sources WHERE url = ?",
+                (url,),
+            )
+            return cursor.fetchone()
+
+    def get_provider_sources(self) -> List[str]:
+        """URLs de las listas sincronizadas alguna vez"""
+        with self.connections.read() as conn:
+            cursor = conn.execute("SELECT url FROM provider_sources ORDER BY url")
+            return [row[0] for row in cursor.fetchall()]
+
+    def set_provider_source(
+        self,
+        url: str,
+        etag: Optional[str],
+        last_modified: Optional[str],
+        content_hash: Optional[str],
+        synced_at: float,
+    ) -> None:
+        """Guarda los validadores de una lista sin cambiar sus canales"""
+        with self.connections.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO provider_sources (url, etag, last_modified, content_hash, synced_at) VALUES (?, ?, ?, ?, ?)",
+                (url, etag, last_modified, content_hash, synced_at),
+            )
+
+    @traced("db.get_source_hashes")
+    def get_source_hashes(self, source: str) -> Dict[str, str]:
+        """instance -> content_hash de los canales que aporta una lista"""
+        with self.connections.read() as conn:
+            cursor = conn.execute(
+                "SELECT instance, content_hash FROM channels WHERE source = ?",
+                (source,),
+            )
+            return dict(cursor.fetchall())
+
+    @traced("db.apply_source_diff")
+    def apply_source_diff(
+        self,
+        source: str,
+        inserts: List[Tuple],
+        updates: List[Tuple],
+        deletes: List[str],
+        mirrors: Dict[str, List[str]],
+        validators: Tuple,
+    ) -> Tuple[int, int, int, List[str]]:
+        """
+        Aplica los cambios de una lista en una unica transaccion
+
+        Solo se escriben las filas afectadas; los canales de otras listas o
+        importados a mano no se tocan, ni tampoco sus espejos.
+
+        Args:
+            source: URL de la lista
+            inserts, updates: Tuplas (title, instance, page_url, stream_url,
+                category, logo_url, content_hash)
+            deletes: Instancias que ya no aparecen en la lista
+            mirrors: instance -> URLs en orden (la principal primero) de los
+                canales insertados o modificados
+            validators: (etag, last_modified, content_hash, synced_at) de la
+                lista
+
+        Returns:
+            Tupla (insertados, modificados, eliminados, omitidos), donde
+            omitidos son las instancias que no se escribieron porque su
+            titulo o instancia ya pertenece a otro canal
+        """
+        with self.connections.transaction() as conn:
+            cursor = conn.cursor()
+            # Un titulo o instancia que ya existe (de otra lista o importado a
+            # mano) se ignora, igual que en bulk_insert_channels
+            cursor.executemany(
+                "INSERT OR IGNORE INTO channels (title, instance, page_url, stream_url, category, logo_url, content_hash, source) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (row + (source,) for row in inserts),
+            )
+            inserted = cursor.rowcount
+            cursor.executemany(
+                "UPDATE OR IGNORE channels SET title = ?, page_url = ?, stream_url = ?, category = ?, logo_url = ?, content_hash = ? WHERE instance = ? AND source = ?",
+                (row[:1] + row[2:] + (row[1], source) for row in updates),
+            )
+            updated = cursor.rowcount
+            cursor.executemany(
+                "DELETE FROM channels WHERE instance = ? AND source = ?",
+                ((instance, source) for instance in deletes),
+            )
+            deleted = cursor.rowcount
+
+            # Una fila se aplico si el canal es de esta lista y tiene su hash
+            owned = dict(
+                cursor.execute(
+                    "SELECT instance, content_hash FROM channels WHERE source = ?",
+                    (source,),
+                ).fetchall()
+            )
+            skipped = [
+                row[1] for row in inserts + updates if owned.get(row[1]) != row[6]
+            ]
+
+            # Los espejos se rehacen solo para los canales de esta lista que
+            # cambiaron; los que siguen en la lista conservan su puntuacion
+            cursor.executemany(
+                "DELETE FROM channel_streams WHERE instance = ?",
+                ((instance,) for instance in deletes),
+            )
+            for instance, urls in mirrors.items():
+                if instance not in owned:
+                    continue
+                cursor.execute(
+                    "DELETE FROM channel_streams WHERE instance = ? AND stream_url NOT IN (%s)"
+                    % ",".join("?" * len(urls)),
+                    [instance] + urls,
+                )
+                if len(urls) > 1:
+                    ranked = [(instance, url, rank) for rank, url in enumerate(urls)]
+                    # Sin UPSERT (SQLite < 3.24): primero se reordenan las que
+                    # ya existen y despues se insertan las nuevas
+                    cursor.executemany(
+                        "UPDATE channel_streams SET rank = ? WHERE instance = ? AND stream_url = ?",
+                        ((rank, instance, url) for instance, url, rank in ranked),
+                    )
+                    cursor.executemany(
+                        "INSERT OR IGNORE INTO channel_streams (instance, stream_url, rank) VALUES (?, ?, ?)",
+                        ranked,
+                    )
+            cursor.execute(
+                "INSERT OR REPLACE INTO provider_sources (url, etag, last_modified, content_hash, synced_at) VALUES (?, ?, ?, ?, ?)",
+                (source,) + tuple(validators),
+            )
+        return inserted, updated, deleted, skipped
+
+    @traced("db.bulk_insert_programmes")
+    def bulk_insert_programmes(
+        self, rows: Iterable[Tuple], batch_size: Optional[int] = None
+    ) -> int:
+        """
+        Inserta programas de la guia con una transaccion por lote
+
+        La guia manda sobre lo guardado: en cada lote se borran, por canal,
+        los programas anteriores a esta importacion que se solapan con el
+        intervalo que cubre el lote, de modo que un programa que cambia de
+        hora no deja el antiguo superpuesto. Cada lote se confirma por
+        separado para no retener el escritor durante toda la guia.
+
+        Args:
+            rows: Iterable de tuplas (instance, start, stop, title, description)
+                con start/stop en segundos epoch. Un programa con el mismo
+                canal y hora de inicio sustituye al anterior.
+            batch_size: Filas por lote
+
+        Returns:
+            Numero de programas escritos
+        """
+        batch_size = batch_size or self.INSERT_BATCH_SIZE
+        rows = iter(rows)
+        with self.connections.read() as conn:
+            last_id = conn.execute(
+                "SELECT COALESCE(MAX(id), 0) FROM epg_programmes"
+            ).fetchone()[0]
+        # Ids explicitos y crecientes: las filas de esta importacion quedan
+        # siempre por encima de last_id aunque se borre la de id maximo
+        next_id = last_id
+        written = 0
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            windows: Dict[str, Tuple[int, int]] = {}
+            for instance, start, stop, *_ in batch:
+                low, high = windows.get(instance, (start, stop))
+                windows[instance] = (min(low, start), max(high, stop))
+            with self.connections.transaction() as conn:
+                conn.executemany(
+                    "DELETE FROM epg_programmes WHERE instance = ? AND stop > ? AND start < ? AND id <= ?",
+                    [
+                        (instance, low, high, last_id)
+                        for instance, (low, high) in windows.items()
+                    ],
+                )
+                cursor = conn.executemany(
+                    "INSERT OR REPLACE INTO epg_programmes (id, instance, start, stop, title, description) VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (next_id + number,) + tuple(row)
+                        for number, row in enumerate(batch, 1)
+                    ],
+                )
+                written += cursor.rowcount
+            next_id += len(batch)
+        return written
+
+    def purge_programmes(self, before: float) -> int:
+        """Elimina los programas que terminaron antes de before"""
+        with self.connections.transaction() as conn:
+            cursor = conn.execute(
+                "DELETE FROM epg_programmes WHERE stop < ?", (int(before),)
+            )
+            return cursor.rowcount
+
+    @traced("db.get_now_next")
+    def get_now_next(
+        self, now: float, instances: Optional[Iterable[str]] = None
+    ) -> Dict[str, Tuple[Optional[Tuple], Optional[Tuple]]]:
+        """
+        Programa actual y siguiente de cada canal
+
+        Para cada canal se toman del indice (instance, stop) los dos primeros
+        programas que terminan despues de now, sin recorrer la guia completa:
+        una consulta para todos o una por cada MAX_QUERY_PARAMS instancias.
+
+        Args:
+            now: Instante de referencia (segundos epoch)
+            instances: Limita la consulta a esos canales (todos si es None)
+
+        Returns:
+            instance -> (actual, siguiente), cada uno (start, stop, title) o None
+        """
+        if instances is None:
+            chunks = [[]]
+            where = ""
+        else:
+            instances = list(instances)
+            if not instances:
+                return {}
+            # Una consulta por tramo: la lista IN no supera el limite de SQLite
+            chunks = [
+                instances[i : i + self.MAX_QUERY_PARAMS]
+                for i in range(0, len(instances), self.MAX_QUERY_PARAMS)
+            ]
+        upcoming: Dict[str, List[Tuple]] = {}
+        with self.connections.read() as conn:
+            for chunk in chunks:
+                if chunk:
+                    where = "WHERE c.instance IN (%s)" % ",".join("?" * len(chunk))
+                cursor = conn.execute(
+                    f"""
+                    SELECT p.instance, p.start, p.stop, p.title
+                    FROM channels c
+                    JOIN epg_programmes p ON p.id IN (
+                        SELECT id FROM epg_programmes
+                        WHERE instance = c.instance AND stop > ?
+                        ORDER BY stop LIMIT 2
+                    )
+                    {where}
+                    """,
+                    [int(now)] + chunk,
+                )
+                for instance, start, stop, title in cursor:
+                    upcoming.setdefault(instance, []).append((start, stop, title))
+
+        guide = {}
+        for instance, programmes in upcoming.items():
+            programmes.sort(key=lambda programme: programme[1])
+            if programmes[0][0] <= now:
+                following = programmes[1] if len(programmes) > 1 else None
+                guide[instance] = (programmes[0], following)
+            else:
+                guide[instance] = (None, programmes[0])
+        return guide
+
+    def get_setting(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        """Obtiene una preferencia del usuario"""
+        with self.connections.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT value FROM settings WHERE key = ?", (key,))
+            row = cursor.fetchone()
+            return row[0] if row is not None else default
+
+    def set_setting(self, key: str, value: Optional[str]) -> None:
+        """Guarda una preferencia del usuario (None la elimina)"""
+        with self.connections.transaction() as conn:
+            if value is None:
+                conn.execute("DELETE FROM settings WHERE key = ?", (key,))
+            else:
+                conn.execute(
+                    "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                    (key, value),
+                )
 
     def get_channel_count(self) -> int:
         """Retorna el numero total de canales"""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM channels")
-        count = cursor.fetchone()[0]
-        return count
+        with self.connections.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM channels")
+            count = cursor.fetchone()[0]
+            return count
 
     def close(self) -> None:
-        """Cierra la conexion a la base de datos"""
-        if self.conn:
-            self.conn.close()
+        """Cierra las conexiones a la base de datos"""
+        if self.connections:
+            self.connections.close()
 
 
 if __name__ == "__main__":
     db = ChannelDatabase()
     print(f"Total de canales: {db.get_channel_count()}")
+    print(f"Version del esquema: {db.get_schema_version()}")
+    for problem in db.verify_query_plans():
+        print(f"Plan de consulta incorrecto: {problem}")
     db.close()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Guia de programacion - Importa guias XMLTV en la base de datos
+
+El XML se recorre con iterparse y cada elemento se libera en cuanto se
+procesa, por lo que el consumo de memoria no depende del tamaño de la guia
+(los feeds reales pesan cientos de MB). Los programas se insertan en lotes,
+cada uno en su propia transaccion, y sustituyen a los que se solapan con ellos.
+"""
+
+import argparse
+import calendar
+import gzip
+import sys
+import time
+import xml.etree.ElementTree as ET
+from typing import BinaryIO, Dict, Iterator, NamedTuple, Optional, Set
+
+from database import ChannelDatabase
+from importer import make_instance
+
+# Los programas que terminaron hace mas de un dia se eliminan al importar
+KEEP_PAST_SECONDS = 24 * 3600
+
+
+class Programme(NamedTuple):
+    """Programa de la guia"""
+
+    channel: str
+    start: int
+    stop: int
+    title: str
+    description: Optional[str]
+
+
+class EPGImportResult(NamedTuple):
+    """Resultado de importar una guia"""
+
+    parsed: int
+    inserted: int
+    skipped: int
+    seconds: float
+
+    @property
+    def programmes_per_second(self) -> float:
+        """Velocidad de importacion en programas por segundo"""
+        if self.seconds <= 0:
+            return float(self.parsed)
+        return self.parsed / self.seconds
+
+
+def parse_xmltv_time(text: str) -> int:
+    """
+    Convierte una fecha XMLTV ("20240131203000 +0100") a segundos epoch
+
+    Sin zona horaria se asume UTC.
+    """
+    text = text.strip()
+    stamp = calendar.timegm(
+        (
+            int(text[0:4]),
+            int(text[4:6]),
+            int(text[6:8]),
+            int(text[8:10] or 0),
+            int(text[10:12] or 0),
+            int(text[12:14] or 0),
+            0,
+            0,
+            0,
+        )
+    )
+    zone = text[14:].strip()
+    if zone:
+        sign = -1 if zone[0] == "-" else 1
+        digits = zone.lstrip("+-")
+        stamp -= sign * (int(digits[0:2]) * 3600 + int(digits[2:4] or 0) * 60)
+    return stamp
+
+
+def _child_text(element: ET.Element, tag: str) -> Optional[str]:
+    """Texto del primer hijo con esa etiqueta"""
+    child = element.find(tag)
+    if child is None or child.text is None:
+        return None
+    return child.text.strip()
+
+
+def parse_xmltv(
+    source: BinaryIO, channel_names: Optional[Dict[str, str]] = None
+) -> Iterator[Programme]:
+    """
+    Parsea una guia XMLTV de forma incremental
+
+    Args:
+        source: Archivo binario con el XML
+        channel_names: Si se indica, se rellena con id de canal XMLTV ->
+            nombre visible (los <channel> preceden a los <programme>)
+
+    Yields:
+        Programas con start/stop en segundos epoch
+    """
+    events = ET.iterparse(source, events=("start", "end"))
+    _, root = next(events)
+    for event, element in events:
+        if event != "end":
+            continue
+        if element.tag == "programme":
+            try:
+                programme = Programme(
+                    element.get("channel", ""),
+                    parse_xmltv_time(element.get("start", "")),
+                    parse_xmltv_time(element.get("stop", "")),
+                    _child_text(element, "title") or "",
+                    _child_text(element, "desc"),
+                )
+            except (ValueError, IndexError):
+                # Programa sin hora de inicio o fin valida
+                programme = None
+            # Liberar lo ya procesado mantiene la memoria constante
+            root.clear()
+            if programme is not None:
+                yield programme
+        elif element.tag == "channel":
+            if channel_names is not None:
+                name = _child_text(element, "display-name")
+                if name:
+                    channel_names[element.get("id", "")] = name
+            root.clear()
+
+
+def _open_source(source: str) -> BinaryIO:
+    """Abre la guia desde un archivo (.xml o .xml.gz) o desde stdin ('-')"""
+    if source == "-":
+        return sys.stdin.buffer
+    if source.endswith(".gz"):
+        return gzip.open(source, "rb")
+    return open(source, "rb")
+
+
+def _resolve_instance(
+    channel: str, channel_names: Dict[str, str], known: Set[str]
+) -> Optional[str]:
+    """
+    Canal de la base de datos que corresponde a un id XMLTV
+
+    El id coincide con el tvg-id de las listas M3U; si no, se prueba con la
+    instancia derivada del nombre visible, como hace el importador.
+    """
+    if channel in known:
+        return channel
+    name = channel_names.get(channel)
+    if name:
+        instance = make_instance(name)
+        if instance in known:
+            return instance
+    return None
+
+
+def import_xmltv(
+    db: ChannelDatabase,
+    source: str,
+    batch_size: Optional[int] = None,
+    now: Optional[float] = None,
+) -> EPGImportResult:
+    """
+    Importa una guia XMLTV en la base de datos
+
+    Solo se guardan los programas de canales que existen en la base de datos
+    y que no terminaron hace mas de KEEP_PAST_SECONDS.
+
+    Args:
+        db: Base de datos destino
+        source: Ruta del archivo XMLTV (.xml o .xml.gz) o '-' para stdin
+        batch_size: Filas por lote de insercion
+        now: Instante de referencia (segundos epoch)
+
+    Returns:
+        EPGImportResult con programas procesados, guardados y descartados
+    """
+    start = time.perf_counter()
+    cutoff = (time.time() if now is None else now) - KEEP_PAST_SECONDS
+    known = {row[1] for row in db.iter_channels()}
+    channel_names: Dict[str, str] = {}
+    instances: Dict[str, Optional[str]] = {}
+    parsed = 0
+    skipped = 0
+
+    stream = _open_source(source)
+    try:
+
+        def rows():
+            nonlocal parsed, skipped
+            for programme in parse_xmltv(stream, channel_names):
+                parsed += 1
+                channel = programme.channel
+                if channel not in instances:
+                    instances[channel] = _resolve_instance(
+                        channel, channel_names, known
+                    )
+                instance = instances[channel]
+                if instance is None or programme.stop < cutoff:
+                    skipped += 1
+                    continue
+                yield (
+                    instance,
+                    programme.start,
+                    programme.stop,
+                    programme.title,
+                    programme.description,
+                )
+
+        inserted = db.bulk_insert_programmes(rows(), batch_size)
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+
+    db.purge_programmes(cutoff)
+    return EPGImportResult(parsed, inserted, skipped, time.perf_counter() - start)
+
+
+def main(argv=None) -> int:
+    """Punto de entrada de linea de comandos"""
+    parser = argparse.ArgumentParser(
+        description="Importa una guia XMLTV en la base de datos de VerTele"
+    )
+    parser.add_argument("guide", help="Archivo XMLTV, .xml o .xml.gz ('-' para stdin)")
+    parser.add_argument("--db", dest="db_path", help="Ruta de la base de datos")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=ChannelDatabase.INSERT_BATCH_SIZE,
+        help="Filas por lote de insercion",
+    )
+    args = parser.parse_args(argv)
+
+    db = ChannelDatabase(args.db_path)
+    try:
+        result = import_xmltv(db, args.guide, args.batch_size)
+    except (OSError, ET.ParseError) as e:
+        print(f"Error al leer la guia: {e}", file=sys.stderr)
+        return 1
+    finally:
+        db.close()
+
+    print(
+        f"Importados {result.inserted} de {result.parsed} programas "
+        f"({result.skipped} sin canal o pasados) en {result.seconds:.2f} s "
+        f"({result.programmes_per_second:.0f} programas/s)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
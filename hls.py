@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Utilidades HLS - Parseo de listas maestras y de medios (.m3u8)
+"""
+
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urljoin
+
+_ATTRIBUTE_RE = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^",]*)')
+
+
+class Variant(NamedTuple):
+    """Variante de una lista maestra HLS"""
+
+    uri: str
+    bandwidth: int
+    resolution: Optional[Tuple[int, int]]
+    codecs: str
+
+    @property
+    def height(self) -> int:
+        """Alto en pixeles (0 si la lista no lo declara)"""
+        return self.resolution[1] if self.resolution else 0
+
+
+def parse_attributes(text: str) -> Dict[str, str]:
+    """Parsea una lista de atributos HLS (CLAVE=valor,CLAVE="valor")"""
+    return {key: value.strip('"') for key, value in _ATTRIBUTE_RE.findall(text)}
+
+
+def is_playlist(text: str) -> bool:
+    """Indica si el texto es una lista M3U"""
+    return text.lstrip("\ufeff \r\n\t").startswith("#EXTM3U")
+
+
+def is_master_playlist(text: str) -> bool:
+    """Indica si la lista es maestra (declara variantes)"""
+    return "#EXT-X-STREAM-INF" in text
+
+
+def has_alternate_renditions(text: str) -> bool:
+    """
+    Indica si la lista maestra declara renditions externas (EXT-X-MEDIA con URI)
+
+    Audio, subtitulos o angulos alternativos viven en listas propias que solo
+    se anuncian en la maestra: una variante suelta no los incluye.
+    """
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if line.startswith("#EXT-X-MEDIA:"):
+            if "URI" in parse_attributes(line.split(":", 1)[1]):
+                return True
+    return False
+
+
+def _parse_resolution(value: str) -> Optional[Tuple[int, int]]:
+    """Convierte '1280x720' en (1280, 720)"""
+    try:
+        width, height = value.lower().split("x", 1)
+        return int(width), int(height)
+    except ValueError:
+        return None
+
+
+def parse_master_playlist(text: str, base_url: str = "") -> List[Variant]:
+    """
+    Obtiene las variantes de una lista maestra
+
+    Args:
+        text: Contenido de la lista
+        base_url: URL de la lista, para resolver URIs relativas
+
+    Returns:
+        Variantes en el orden en que aparecen
+    """
+    variants = []
+    attributes = None
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if line.startswith("#EXT-X-STREAM-INF:"):
+            attributes = parse_attributes(line.split(":", 1)[1])
+        elif line and not line.startswith("#") and attributes is not None:
+            try:
+                bandwidth = int(attributes.get("BANDWIDTH", "0"))
+            except ValueError:
+                bandwidth = 0
+            variants.append(
+                Variant(
+                    uri=urljoin(base_url, line),
+                    bandwidth=bandwidth,
+                    resolution=_parse_resolution(attributes.get("RESOLUTION", "")),
+                    codecs=attributes.get("CODECS", ""),
+                )
+            )
+            attributes = None
+    return variants
+
+
+def parse_media_segments(text: str, base_url: str = "") -> List[str]:
+    """Obtiene las URLs absolutas de los segmentos de una lista de medios"""
+    return [
+        urljoin(base_url, line.strip())
+        for line in text.splitlines()
+        if line.strip() and not line.startswith("#")
+    ]
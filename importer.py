@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Importador de listas M3U/M3U8 - Carga listas de proveedores IPTV en la base de datos
+
+El archivo se procesa como un stream linea a linea: la lista no se copia en
+memoria, solo las claves de cada canal para reconocer sus repeticiones (ver
+ChannelKeys).
+"""
+
+import argparse
+import hashlib
+import re
+import sys
+import time
+import unicodedata
+import zlib
+from typing import Dict, Iterable, Iterator, NamedTuple, Optional, TextIO, Tuple
+
+from database import ChannelDatabase
+
+DEFAULT_CATEGORY = "General"
+
+_ATTR_RE = re.compile(r'([\w-]+)="([^"]*)"')
+
+
+class ImportResult(NamedTuple):
+    """Resultado de una importacion"""
+
+    parsed: int
+    inserted: int
+    seconds: float
+
+    @property
+    def skipped(self) -> int:
+        """Entradas descartadas por duplicadas"""
+        return self.parsed - self.inserted
+
+    @property
+    def rows_per_second(self) -> float:
+        """Velocidad de importacion en entradas por segundo"""
+        if self.seconds <= 0:
+            return float(self.parsed)
+        return self.parsed / self.seconds
+
+
+def make_instance(title: str, stream_url: str = "") -> str:
+    """Genera un identificador de instancia a partir del titulo"""
+    normalized = unicodedata.normalize("NFKD", title)
+    ascii_title = "".join(c for c in normalized if not unicodedata.combining(c))
+    instance = re.sub(r"[^a-z0-9]+", "", ascii_title.lower())
+    if not instance:
+        instance = "ch%08x" % zlib.crc32(stream_url.encode("utf-8"))
+    return instance
+
+
+def _split_extinf(line: str):
+    """Separa la cabecera #EXTINF en atributos y titulo"""
+    body = line[len("#EXTINF:") :]
+    in_quotes = False
+    for index, char in enumerate(body):
+        if char == '"':
+            in_quotes = not in_quotes
+        elif char == "," and not in_quotes:
+            return body[:index], body[index + 1 :].strip()
+    return body, ""
+
+
+def parse_m3u(lines: Iterable[str]) -> Iterator[Dict[str, str]]:
+    """
+    Parsea una lista M3U/M3U8 de forma incremental
+
+    Args:
+        lines: Iterable de lineas (por ejemplo un archivo abierto)
+
+    Yields:
+        Diccionarios con title, instance, tvg_id, page_url, stream_url,
+        category y logo (instance es el tvg-id o, si falta, deriva del titulo)
+    """
+    pending = None
+    for raw_line in lines:
+        line = raw_line.strip()
+        if not line:
+            continue
+        if line.startswith("#EXTINF:"):
+            attrs_text, title = _split_extinf(line)
+            attrs = dict(_ATTR_RE.findall(attrs_text))
+            pending = {
+                "title": title or attrs.get("tvg-name", ""),
+                "tvg_id": attrs.get("tvg-id", ""),
+                "category": attrs.get("group-title") or DEFAULT_CATEGORY,
+                "logo": attrs.get("tvg-logo", ""),
+            }
+        elif line.startswith("#"):
+            # #EXTM3U, #EXTVLCOPT, #EXTGRP y similares
+            continue
+        elif pending is not None:
+            title = pending["title"] or line
+            yield {
+                "title": title,
+                "instance": pending["tvg_id"] or make_instance(title, line),
+                "tvg_id": pending["tvg_id"],
+                "page_url": None,
+                "stream_url": line,
+                "category": pending["category"],
+                "logo": pending["logo"],
+            }
+            pending = None
+
+
+class ChannelKeys:
+    """
+    Decide a que canal pertenece cada entrada de una lista
+
+    Una entrada repite un canal anterior si comparte su tvg-id o su titulo
+    exacto. Si no tiene tvg-id y la instancia derivada del titulo ya es de
+    otro canal ("ESPN" y "ESPN+" dan "espn"), recibe un sufijo numerico.
+
+    Solo se guarda un resumen de 8 bytes por titulo e instancia, no las
+    entradas: la memoria crece con el numero de canales pero no con el
+    tamaño de sus URLs ni de sus atributos.
+    """
+
+    def __init__(self):
+        # Resumen del titulo o de la instancia -> instancia del canal
+        self._owners: Dict[bytes, str] = {}
+
+    @staticmethod
+    def _digest(kind: bytes, value: str) -> bytes:
+        return hashlib.blake2b(kind + value.encode("utf-8"), digest_size=8).digest()
+
+    def assign(self, entry: Dict[str, str]) -> Tuple[str, bool]:
+        """
+        Instancia de una entrada de parse_m3u
+
+        Returns:
+            (instancia, repetida): si repetida es True la instancia es la del
+            canal que aparecio antes y la entrada es una URL alternativa
+        """
+        title_key = self._digest(b"t", entry["title"])
+        owner = self._owners.get(title_key)
+        if entry["tvg_id"]:
+            tvg_key = self._digest(b"i", entry["instance"])
+            owner = self._owners.get(tvg_key, owner)
+            if owner is not None:
+                # Las siguientes entradas con este tvg-id son del mismo canal
+                self._owners.setdefault(tvg_key, owner)
+        if owner is not None:
+            return owner, True
+
+        instance = entry["instance"]
+        instance_key = self._digest(b"i", instance)
+        suffix = 1
+        while instance_key in self._owners:
+            suffix += 1
+            instance = f"{entry['instance']}{suffix}"
+            instance_key = self._digest(b"i", instance)
+        self._owners[instance_key] = instance
+        self._owners[title_key] = instance
+        return instance, False
+
+
+def _open_source(source: str) -> TextIO:
+    """Abre la lista desde un archivo o desde stdin ('-')"""
+    if source == "-":
+        return sys.stdin
+    return open(source, "r", encoding="utf-8-sig", errors="replace")
+
+
+def import_playlist(
+    db: ChannelDatabase, source: str, batch_size: Optional[int] = None
+) -> ImportResult:
+    """
+    Importa una lista M3U/M3U8 en la base de datos
+
+    Args:
+        db: Base de datos destino
+        source: Ruta del archivo M3U o '-' para stdin
+        batch_size: Filas por lote de insercion
+
+    Las entradas repetidas de un mismo canal (mismo tvg-id o mismo titulo,
+    ver ChannelKeys) se guardan como URLs alternativas en el orden de la
+    lista, solo para los canales que inserta esta importacion.
+
+    Returns:
+        ImportResult con entradas procesadas, insertadas y duracion
+    """
+    start = time.perf_counter()
+    parsed = 0
+    # Solo se acumulan las claves vistas y las repeticiones, no la lista
+    keys = ChannelKeys()
+    ranks: Dict[str, int] = {}
+    mirrors = []
+
+    stream = _open_source(source)
+    try:
+
+        def rows():
+            nonlocal parsed
+            for entry in parse_m3u(stream):
+                parsed += 1
+                instance, repeated = keys.assign(entry)
+                if repeated:
+                    # Ambas columnas son UNIQUE: la fila se ignoraria
+                    ranks[instance] = ranks.get(instance, 0) + 1
+                    mirrors.append((instance, entry["stream_url"], ranks[instance]))
+                    continue
+                yield (
+                    entry["title"],
+                    instance,
+                    entry["page_url"],
+                    entry["stream_url"],
+                    entry["category"],
+                    entry["logo"] or None,
+                )
+
+        last_id = db.last_channel_id()
+        inserted = db.bulk_insert_channels(rows(), batch_size)
+        if mirrors:
+            # Los canales que ya existian no son de esta lista
+            db.add_channel_streams(mirrors, after_id=last_id)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+    return ImportResult(parsed, inserted, time.perf_counter() - start)
+
+
+def main(argv=None) -> int:
+    """Punto de entrada de linea de comandos"""
+    parser = argparse.ArgumentParser(
+        description="Importa una lista M3U/M3U8 en la base de datos de VerTele"
+    )
+    parser.add_argument("playlist", help="Archivo M3U/M3U8 ('-' para stdin)")
+    parser.add_argument("--db", dest="db_path", help="Ruta de la base de datos")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=ChannelDatabase.INSERT_BATCH_SIZE,
+        help="Filas por lote de insercion",
+    )
+    args = parser.parse_args(argv)
+
+    db = ChannelDatabase(args.db_path)
+    try:
+        result = import_playlist(db, args.playlist, args.batch_size)
+    except OSError as e:
+        print(f"Error al leer la lista: {e}", file=sys.stderr)
+        return 1
+    finally:
+        db.close()
+
+    print(
+        f"Importados {result.inserted} de {result.parsed} canales "
+        f"({result.skipped} duplicados) en {result.seconds:.2f} s "
+        f"({result.rows_per_second:.0f} canales/s)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
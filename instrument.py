@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Instrumentacion - Registro por niveles y medicion de fases (spans)
+
+Los mensajes se emiten con el modulo logging bajo el logger "vertele"; por
+defecto solo se muestran los avisos y errores, y un mensaje de depuracion
+desactivado cuesta una comprobacion de nivel (se formatea solo si se emite).
+
+Mientras no haya un registrador activo, span() no mide nada y su coste es
+el de una comprobacion. Los spans se pueden volcar a un archivo JSON-lines o
+de traza de Chrome (chrome://tracing, Perfetto).
+
+Variables de entorno (ver configure_from_env):
+
+    VERTELE_LOG    nivel de registro: debug, info, warning, error
+    VERTELE_TRACE  archivo donde guardar los spans; con extension .json se
+                   escribe en formato de traza de Chrome, si no en JSON-lines
+"""
+
+import atexit
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+LOGGER_NAME = "vertele"
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(name)s] %(message)s"
+
+
+class Span(NamedTuple):
+    """Intervalo medido"""
+
+    name: str
+    start: float
+    duration: float
+    thread: str
+    attrs: Dict[str, object]
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger de un componente ("player" -> "vertele.player")"""
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+def configure_logging(level=logging.WARNING, stream=None) -> logging.Logger:
+    """
+    Envia los mensajes de VerTele a stderr (o a stream) desde level
+
+    Args:
+        level: Nivel minimo, como entero o nombre ("debug", "info"...)
+    """
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+        if not isinstance(level, int):
+            level = logging.WARNING
+    logger = logging.getLogger(LOGGER_NAME)
+    for handler in list(logger.handlers):
+        if getattr(handler, "_vertele", False):
+            logger.removeHandler(handler)
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handler._vertele = True
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+    return logger
+
+
+class SpanRecorder:
+    """Acumula spans en memoria (acotado a max_spans)"""
+
+    def __init__(self, max_spans: int = 100000):
+        self.max_spans = max_spans
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+        # Referencia para convertir perf_counter en hora real al exportar
+        self.origin = time.perf_counter()
+        self.origin_wall = time.time()
+
+    def record(self, span: Span) -> None:
+        """Guarda un span descartando los mas antiguos al superar el limite"""
+        with self._lock:
+            self.spans.append(span)
+            if len(self.spans) > self.max_spans:
+                del self.spans[: len(self.spans) - self.max_spans]
+
+    def durations(self, name: str) -> List[float]:
+        """Duraciones en segundos de los spans con ese nombre"""
+        with self._lock:
+            return [s.duration for s in self.spans if s.name == name]
+
+    def clear(self) -> None:
+        """Descarta los spans acumulados"""
+        with self._lock:
+            self.spans = []
+
+    def close(self) -> None:
+        """Termina la medicion (los registradores a archivo lo cierran)"""
+
+
+def span_to_dict(span: Span, recorder: SpanRecorder) -> Dict[str, object]:
+    """Representacion JSON-lines de un span (tiempos en ms y hora real)"""
+    return {
+        "name": span.name,
+        "time": round(recorder.origin_wall + (span.start - recorder.origin), 6),
+        "duration_ms": round(span.duration * 1000.0, 3),
+        "thread": span.thread,
+        "attrs": span.attrs,
+    }
+
+
+def span_to_chrome_event(
+    span: Span, recorder: SpanRecorder, tid: int
+) -> Dict[str, object]:
+    """Evento completo ("X") del formato de traza de Chrome (tiempos en us)"""
+    return {
+        "name": span.name,
+        "ph": "X",
+        "ts": round((span.start - recorder.origin) * 1e6, 1),
+        "dur": round(span.duration * 1e6, 1),
+        "pid": os.getpid(),
+        "tid": tid,
+        "args": span.attrs,
+    }
+
+
+class TraceFileRecorder(SpanRecorder):
+    """
+    Escribe cada span en un archivo a medida que se mide
+
+    No guarda los spans en memoria, por lo que sirve para sesiones largas.
+    En formato Chrome se escribe un array JSON; el visor acepta que falte el
+    corchete final si el proceso termina sin cerrar el archivo.
+    """
+
+    def __init__(self, path: str, chrome: Optional[bool] = None):
+        super().__init__(max_spans=0)
+        self.path = path
+        self.chrome = path.endswith(".json") if chrome is None else chrome
+        self._file = open(path, "w", encoding="utf-8")
+        self._count = 0
+        # Nombre de hilo -> identificador numerico de la traza de Chrome
+        self._tids: Dict[str, int] = {}
+        if self.chrome:
+            self._file.write("[\n")
+
+    def record(self, span: Span) -> None:
+        """Añade el span al archivo"""
+        with self._lock:
+            if self._file is None:
+                return
+            if not self.chrome:
+                self._file.write(json.dumps(span_to_dict(span, self), default=str))
+                self._file.write("\n")
+                return
+            tid = self._tids.get(span.thread)
+            if tid is None:
+                tid = self._tids[span.thread] = len(self._tids) + 1
+                self._write_event(
+                    {
+                        "name": "thread_name",
+                        "ph": "M",
+                        "pid": os.getpid(),
+                        "tid": tid,
+                        "args": {"name": span.thread},
+                    }
+                )
+            self._write_event(span_to_chrome_event(span, self, tid))
+
+    def _write_event(self, event: Dict[str, object]) -> None:
+        if self._count:
+            self._file.write(",\n")
+        self._file.write(json.dumps(event, default=str))
+        self._count += 1
+
+    def close(self) -> None:
+        """Cierra el archivo"""
+        with self._lock:
+            if self._file is None:
+                return
+            if self.chrome:
+                self._file.write("\n]\n")
+            self._file.close()
+            self._file = None
+
+
+_recorder: Optional[SpanRecorder] = None
+
+
+def enable(recorder: Optional[SpanRecorder] = None) -> SpanRecorder:
+    """Activa la medicion de spans y retorna el registrador"""
+    global _recorder
+    _recorder = recorder or SpanRecorder()
+    return _recorder
+
+
+def disable() -> None:
+    """Desactiva la medicion de spans"""
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder is not None:
+        recorder.close()
+
+
+def get_recorder() -> Optional[SpanRecorder]:
+    """Registrador activo, o None si la medicion esta desactivada"""
+    return _recorder
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Mide la duracion del bloque si hay un registrador activo"""
+    recorder = _recorder
+    if recorder is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder.record(
+            Span(
+                name,
+                start,
+                time.perf_counter() - start,
+                threading.current_thread().name,
+                attrs,
+            )
+        )
+
+
+def traced(name: str) -> Callable:
+    """Decorador que mide cada llamada a la funcion como un span"""
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _recorder is None:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def configure_from_env(environ=None) -> Optional[SpanRecorder]:
+    """
+    Configura el registro y la traza segun VERTELE_LOG y VERTELE_TRACE
+
+    Returns:
+        El registrador de la traza, o None si no se pidio
+    """
+    environ = os.environ if environ is None else environ
+    configure_logging(environ.get("VERTELE_LOG") or logging.WARNING)
+    path = environ.get("VERTELE_TRACE")
+    if not path:
+        return None
+    try:
+        recorder = enable(TraceFileRecorder(path))
+    except OSError as e:
+        get_logger("trace").error("No se pudo abrir la traza %s: %s", path, e)
+        return None
+    atexit.register(disable)
+    get_logger("trace").info("Guardando spans en %s", path)
+    return recorder
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Instancia unica - Reenvia los lanzamientos a la instancia en ejecucion
+
+La primera instancia de la interfaz escucha en un socket Unix por usuario y
+los lanzamientos posteriores (por ejemplo "VerTele.py play <instance>") le
+envian su peticion y terminan en milisegundos, sin abrir la base de datos,
+detectar el reproductor ni crear otra ventana.
+
+Protocolo: una linea JSON por peticion ({"command": "play", "instance": ...})
+y una linea JSON de respuesta ({"ok": true} o {"ok": false, "error": ...}).
+"""
+
+import json
+import os
+import socket
+import stat
+import tempfile
+import threading
+from typing import Callable, Dict, Optional
+
+from instrument import get_logger
+
+log = get_logger("ipc")
+
+MAX_REQUEST_BYTES = 64 * 1024
+# Espera maxima de la instancia en ejecucion para atender una peticion
+HANDLER_TIMEOUT = 5.0
+# El cliente espera algo mas que el servidor, para recibir su respuesta de error
+REQUEST_TIMEOUT = HANDLER_TIMEOUT + 2.0
+# Comprobar si un socket existente sigue vivo no necesita tanto
+PING_TIMEOUT = 2.0
+
+
+class InstanceRunningError(RuntimeError):
+    """Ya hay otra instancia escuchando en el socket"""
+
+
+def socket_path() -> str:
+    """Ruta del socket del usuario ($XDG_RUNTIME_DIR/vertele-<uid>.sock)"""
+    directory = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(directory, f"vertele-{os.getuid()}.sock")
+
+
+def _read_line(sock: socket.socket) -> bytes:
+    """Lee hasta el primer salto de linea (o el cierre de la conexion)"""
+    data = b""
+    while b"\n" not in data and len(data) < MAX_REQUEST_BYTES:
+        chunk = sock.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+    return data.split(b"\n", 1)[0]
+
+
+def send_request(
+    request: Dict, path: Optional[str] = None, timeout: Optional[float] = None
+) -> Optional[Dict]:
+    """
+    Envia una peticion a la instancia en ejecucion
+
+    Returns:
+        La respuesta, o None si no hay ninguna instancia escuchando
+
+    Raises:
+        OSError o ValueError si la instancia no responde a tiempo o responde
+        algo que no es JSON: la peticion pudo haberse atendido, asi que no se
+        debe repetir en local
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout or REQUEST_TIMEOUT)
+    try:
+        try:
+            sock.connect(path or socket_path())
+        except (FileNotFoundError, ConnectionRefusedError):
+            return None
+        sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        line = _read_line(sock)
+    finally:
+        sock.close()
+    if not line:
+        return {"ok": False, "error": "Sin respuesta de la instancia en ejecucion"}
+    return json.loads(line.decode("utf-8"))
+
+
+class InstanceServer:
+    """
+    Escucha las peticiones de otros lanzamientos
+
+    handler(request) se llama en el hilo de la conexion y devuelve el
+    diccionario de respuesta; el trabajo de interfaz lo debe pasar al hilo
+    principal (GLib.idle_add en la aplicacion).
+    """
+
+    def __init__(self, handler: Callable[[Dict], Dict], path: Optional[str] = None):
+        self.handler = handler
+        self.path = path or socket_path()
+        self._sock = None
+        self._inode = None
+        self._closed = False
+
+    def start(self) -> "InstanceServer":
+        """
+        Empieza a escuchar
+
+        Un socket abandonado por una instancia que termino mal se reemplaza.
+
+        Raises:
+            InstanceRunningError: si otra instancia ya esta escuchando
+        """
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._bind(sock)
+        except BaseException:
+            sock.close()
+            raise
+        sock.listen(8)
+        self._sock = sock
+        self._inode = os.stat(self.path).st_ino
+        threading.Thread(target=self._serve, name="ipc", daemon=True).start()
+        return self
+
+    def _bind(self, sock: socket.socket) -> None:
+        # El socket solo es accesible para el usuario
+        old_umask = os.umask(0o177)
+        try:
+            try:
+                sock.bind(self.path)
+            except OSError:
+                try:
+                    alive = (
+                        send_request({"command": "ping"}, self.path, PING_TIMEOUT)
+                        is not None
+                    )
+                except (OSError, ValueError) as e:
+                    # No responde a tiempo o no responde JSON: no es VerTele
+                    log.info("El socket %s no responde al ping: %s", self.path, e)
+                    alive = False
+                if alive:
+                    raise InstanceRunningError(self.path)
+                if os.path.exists(self.path) and stat.S_ISSOCK(
+                    os.stat(self.path).st_mode
+                ):
+                    log.info("Eliminando socket abandonado %s", self.path)
+                    os.unlink(self.path)
+                sock.bind(self.path)
+        finally:
+            os.umask(old_umask)
+
+    def _serve(self) -> None:
+        """Acepta conexiones hasta que se cierra el servidor"""
+        while not self._closed:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            threading.Thread(
+                target=self._handle, args=(conn,), name="ipc-request", daemon=True
+            ).start()
+
+    def _handle(self, conn: socket.socket) -> None:
+        """Atiende una peticion y responde"""
+        conn.settimeout(5.0)
+        try:
+            try:
+                request = json.loads(_read_line(conn).decode("utf-8"))
+                if request.get("command") == "ping":
+                    response = {"ok": True}
+                else:
+                    response = self.handler(request)
+            except (ValueError, AttributeError) as e:
+                response = {"ok": False, "error": f"Peticion no valida: {e}"}
+            except Exception as e:
+                log.exception("Error al atender la peticion")
+                response = {"ok": False, "error": str(e)}
+            conn.sendall(json.dumps(response).encode("utf-8") + b"\n")
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+    def close(self) -> None:
+        """Deja de escuchar y elimina el socket si sigue siendo el nuestro"""
+        if self._sock is None or self._closed:
+            return
+        self._closed = True
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
+        try:
+            if os.stat(self.path).st_ino == self._inode:
+                os.unlink(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Modelo de lista perezoso - Gtk.TreeModel respaldado por ChannelDatabase
+
+En lugar de copiar todos los canales en un Gtk.ListStore, el modelo solo
+conoce el numero de filas y pide a la base de datos los bloques que el
+TreeView dibuja. Las URLs no se guardan: se consultan al reproducir.
+
+Con un TaskRunner los bloques que faltan se leen en segundo plano: mientras
+llegan las filas se muestran vacias y al cargarse se emite row-changed.
+"""
+
+import gi
+
+gi.require_version("Gtk", "3.0")
+from gi.repository import GObject, Gtk
+
+from typing import Callable, List, Optional, Tuple
+
+from instrument import get_logger
+from rowcache import RowCache
+
+log = get_logger("listmodel")
+
+
+class ChannelListModel(GObject.Object, Gtk.TreeModel):
+    """
+    Lista plana de canales (title, instance, logo_url) de una categoria
+
+    El numero de filas se fija al crear el modelo; para reflejar cambios en
+    la base de datos se crea un modelo nuevo.
+    """
+
+    # Fila que se muestra mientras su bloque se lee en segundo plano
+    PLACEHOLDER = ("", "", "")
+
+    COLUMN_TITLE = 0
+    COLUMN_INSTANCE = 1
+    COLUMN_LOGO = 2
+    N_COLUMNS = 3
+
+    def __init__(
+        self,
+        source,
+        category: Optional[str] = None,
+        exclude_dead: bool = False,
+        block_size: Optional[int] = None,
+        max_blocks: Optional[int] = None,
+        length: Optional[int] = None,
+        task_runner=None,
+        on_rows_loaded: Optional[Callable[[List[Tuple]], None]] = None,
+    ):
+        """
+        Args:
+            source: Objeto con count_channels y get_channels_slice
+                (normalmente ChannelDatabase)
+            category: Categoria a mostrar (None para todas)
+            exclude_dead: Omite los canales caidos
+            length: Numero de filas ya contado fuera del hilo de GTK (si es
+                None se cuenta aqui)
+            task_runner: TaskRunner para leer los bloques en segundo plano
+                (si es None se leen al pedirlos)
+            on_rows_loaded: Se llama con las filas de cada bloque leido en
+                segundo plano (hilo principal)
+        """
+        super().__init__()
+        self.category = category
+        if length is None:
+            length = source.count_channels(category, exclude_dead)
+        self.length = length
+        self.task_runner = task_runner
+        self.on_rows_loaded = on_rows_loaded
+        # Bloques que se estan leyendo en segundo plano
+        self._loading = set()
+        self.rows = RowCache(
+            lambda offset, limit, after: source.get_channels_slice(
+                category, offset, limit, after, exclude_dead
+            ),
+            block_size,
+            max_blocks,
+        )
+
+    def _iter(self, index: int):
+        """Iterador para la fila index (user_data desplazado: 0 seria NULL)"""
+        tree_iter = Gtk.TreeIter()
+        tree_iter.user_data = index + 1
+        return tree_iter
+
+    @staticmethod
+    def _index(tree_iter) -> int:
+        return tree_iter.user_data - 1
+
+    def do_get_flags(self):
+        return Gtk.TreeModelFlags.LIST_ONLY | Gtk.TreeModelFlags.ITERS_PERSIST
+
+    def do_get_n_columns(self):
+        return self.N_COLUMNS
+
+    def do_get_column_type(self, column):
+        return GObject.TYPE_STRING
+
+    def do_get_iter(self, path):
+        indices = path.get_indices()
+        if len(indices) == 1 and 0 <= indices[0] < self.length:
+            return True, self._iter(indices[0])
+        return False, None
+
+    def do_get_path(self, tree_iter):
+        return Gtk.TreePath.new_from_indices([self._index(tree_iter)])
+
+    def _request_block(self, number: int) -> None:
+        """Lee un bloque en segundo plano (una sola vez aunque se pida varias)"""
+        if number in self._loading:
+            return
+        self._loading.add(number)
+        self.task_runner.submit(
+            self.rows.load,
+            number,
+            on_done=lambda rows: self._on_block_loaded(number, rows),
+            on_error=lambda error: self._on_block_failed(number, error),
+        )
+
+    def _on_block_loaded(self, number: int, rows) -> None:
+        """Guarda el bloque y redibuja sus filas (hilo principal)"""
+        self._loading.discard(number)
+        self.rows.store(number, rows)
+        first = number * self.rows.block_size
+        for index in range(first, min(first + len(rows), self.length)):
+            self.row_changed(Gtk.TreePath.new_from_indices([index]), self._iter(index))
+        if self.on_rows_loaded is not None:
+            self.on_rows_loaded(rows)
+
+    def _on_block_failed(self, number: int, error: Exception) -> None:
+        """Permite reintentar el bloque la proxima vez que se dibuje"""
+        self._loading.discard(number)
+        log.error(
+            "No se pudo leer el bloque %d de %s: %s", number, self.category, error
+        )
+
+    def do_get_value(self, tree_iter, column):
+        index = self._index(tree_iter)
+        if self.task_runner is None:
+            row = self.rows.get(index)
+        else:
+            row = self.rows.get_cached(index)
+            if row is None:
+                self._request_block(self.rows.block_of(index))
+                row = self.PLACEHOLDER
+        if row is None or row[column] is None:
+            return ""
+        return row[column]
+
+    def do_iter_next(self, tree_iter):
+        index = self._index(tree_iter) + 1
+        if index < self.length:
+            tree_iter.user_data = index + 1
+            return True, tree_iter
+        return False, None
+
+    def do_iter_previous(self, tree_iter):
+        index = self._index(tree_iter) - 1
+        if index >= 0:
+            tree_iter.user_data = index + 1
+            return True, tree_iter
+        return False, None
+
+    def do_iter_children(self, parent):
+        if parent is None and self.length > 0:
+            return True, self._iter(0)
+        return False, None
+
+    def do_iter_has_child(self, tree_iter):
+        return False
+
+    def do_iter_n_children(self, tree_iter):
+        if tree_iter is None:
+            return self.length
+        return 0
+
+    def do_iter_nth_child(self, parent, n):
+        if parent is None and 0 <= n < self.length:
+            return True, self._iter(n)
+        return False, None
+
+    def do_iter_parent(self, child):
+        return False, None
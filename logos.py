@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Logos de canales - Descarga, escalado y cache de miniaturas
+
+Los logos se descargan en segundo plano reutilizando conexiones, se escalan
+fuera del hilo de GTK a la altura de la fila y se guardan como miniaturas en
+una cache en disco acotada por tamaño. Las imagenes ya decodificadas se
+mantienen en una LRU en memoria para que dibujar una fila no cueste nada.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from instrument import get_logger
+from net import HTTPClient
+from tasks import TaskRunner
+
+log = get_logger("logos")
+
+
+class LogoDiskCache:
+    """
+    Miniaturas en disco con expulsion LRU por tamaño total
+
+    La fecha de modificacion de cada archivo marca su ultimo uso.
+    """
+
+    DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+    def __init__(self, directory: str, max_bytes: Optional[int] = None):
+        self.directory = directory
+        self.max_bytes = max_bytes or self.DEFAULT_MAX_BYTES
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.total_bytes = 0
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self) -> None:
+        """Carga el indice de archivos existentes, del menos al mas reciente"""
+        found = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".png"):
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(found):
+            self._entries[name] = size
+            self.total_bytes += size
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def get(self, name: str) -> Optional[bytes]:
+        """Lee una miniatura y la marca como usada"""
+        with self._lock:
+            if name not in self._entries:
+                return None
+            self._entries.move_to_end(name)
+        try:
+            with open(self._path(name), "rb") as f:
+                data = f.read()
+            os.utime(self._path(name))
+        except OSError:
+            with self._lock:
+                self.total_bytes -= self._entries.pop(name, 0)
+            return None
+        return data
+
+    def put(self, name: str, data: bytes) -> None:
+        """Guarda una miniatura y expulsa las menos usadas si sobra tamaño"""
+        temporary = self._path(name + ".tmp%d" % threading.get_ident())
+        with open(temporary, "wb") as f:
+            f.write(data)
+        os.replace(temporary, self._path(name))
+
+        expired = []
+        with self._lock:
+            self.total_bytes -= self._entries.pop(name, 0)
+            self._entries[name] = len(data)
+            self.total_bytes += len(data)
+            while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_name, size = self._entries.popitem(last=False)
+                self.total_bytes -= size
+                expired.append(old_name)
+        for old_name in expired:
+            try:
+                os.remove(self._path(old_name))
+            except OSError:
+                pass
+
+
+class PixbufThumbnailer:
+    """Escala y decodifica imagenes con GdkPixbuf"""
+
+    def scale(self, data: bytes, size: int) -> bytes:
+        """Decodifica una imagen escalada a size px de alto y la codifica en PNG"""
+        from gi.repository import GdkPixbuf
+
+        loader = GdkPixbuf.PixbufLoader()
+
+        def on_size_prepared(loader, width, height):
+            # Escalar durante la decodificacion evita el pixbuf a tamaño completo
+            if height > size:
+                loader.set_size(max(1, width * size // height), size)
+
+        loader.connect("size-prepared", on_size_prepared)
+        loader.write(data)
+        loader.close()
+        pixbuf = loader.get_pixbuf()
+        if pixbuf is None:
+            raise ValueError("Imagen no valida")
+        ok, png = pixbuf.save_to_bufferv("png", [], [])
+        if not ok:
+            raise ValueError("No se pudo codificar la miniatura")
+        return png
+
+    def load(self, data: bytes):
+        """Convierte una miniatura PNG en un GdkPixbuf"""
+        from gi.repository import GdkPixbuf
+
+        loader = GdkPixbuf.PixbufLoader.new_with_type("png")
+        loader.write(data)
+        loader.close()
+        return loader.get_pixbuf()
+
+
+class LogoLoader:
+    """
+    Carga logos bajo demanda para las filas visibles
+
+    get() nunca bloquea: devuelve la imagen si ya esta en memoria y, si no,
+    programa su carga y avisa con on_loaded(url) en el hilo principal.
+
+    Las cargas que aun no empezaron forman una cola acotada: al desplazarse
+    por la lista se descartan las peticiones mas antiguas (filas que ya no se
+    ven) en lugar de descargar todos los logos por los que se paso. Un logo
+    que falla no se pide de nuevo hasta pasados FAILURE_TTL segundos.
+    """
+
+    DEFAULT_SIZE = 24
+    MEMORY_ENTRIES = 512
+    MAX_LOGO_BYTES = 2 * 1024 * 1024
+    # Peticiones en espera; cubre de sobra las filas visibles de una lista
+    MAX_QUEUED = 64
+    FAILURE_TTL = 300.0
+    # Resultado de una carga descartada antes de empezar
+    _STALE = object()
+
+    def __init__(
+        self,
+        cache_dir: str,
+        size: Optional[int] = None,
+        on_loaded: Optional[Callable[[str], None]] = None,
+        dispatch: Optional[Callable] = None,
+        thumbnailer=None,
+        http: Optional[HTTPClient] = None,
+        max_workers: int = 4,
+        memory_entries: Optional[int] = None,
+        max_disk_bytes: Optional[int] = None,
+        max_queued: Optional[int] = None,
+        failure_ttl: Optional[float] = None,
+    ):
+        """
+        Args:
+            cache_dir: Directorio de la cache de miniaturas
+            size: Alto de las miniaturas en px (la altura de la fila)
+            on_loaded: Se llama en el hilo principal cuando llega un logo
+            dispatch: Despachador al hilo principal (GLib.idle_add por defecto)
+            thumbnailer: Objeto con scale(data, size) y load(data)
+            max_queued: Cargas en espera antes de descartar las mas antiguas
+            failure_ttl: Segundos hasta reintentar un logo que fallo
+        """
+        self.size = size or self.DEFAULT_SIZE
+        self.on_loaded = on_loaded
+        self.thumbnailer = thumbnailer or PixbufThumbnailer()
+        self.http = http or HTTPClient(timeout=10)
+        self.disk = LogoDiskCache(cache_dir, max_disk_bytes)
+        self.memory_entries = memory_entries or self.MEMORY_ENTRIES
+        self.max_queued = max_queued or self.MAX_QUEUED
+        self.failure_ttl = self.FAILURE_TTL if failure_ttl is None else failure_ttl
+        self._memory = OrderedDict()
+        # url -> instante (time.monotonic) a partir del cual se reintenta
+        self._failed: Dict[str, float] = {}
+        # Cargas en espera o en curso (solo se toca en el hilo principal)
+        self._pending: Dict[str, bool] = {}
+        # Cargas en espera, de la peticion mas antigua a la mas reciente;
+        # los hilos del pool la consultan al empezar cada carga
+        self._queue = OrderedDict()
+        self._queue_lock = threading.Lock()
+        # Pool propio: una descarga lenta no debe retrasar un cambio de canal
+        self._tasks = TaskRunner(max_workers=max_workers, dispatch=dispatch)
+        self.downloads = 0
+
+    def _cache_name(self, url: str) -> str:
+        digest = hashlib.sha1(f"{self.size}:{url}".encode("utf-8")).hexdigest()
+        return digest + ".png"
+
+    def get(self, url: Optional[str]):
+        """
+        Imagen del logo si ya esta cargada, o None
+
+        Llamar solo desde el hilo principal (por ejemplo desde la funcion de
+        dibujo de la celda, que GTK solo invoca para las filas visibles).
+        """
+        if not url:
+            return None
+        retry_at = self._failed.get(url)
+        if retry_at is not None:
+            if time.monotonic() < retry_at:
+                return None
+            del self._failed[url]
+        image = self._memory.get(url)
+        if image is not None:
+            self._memory.move_to_end(url)
+            return image
+        with self._queue_lock:
+            if url in self._queue:
+                # Sigue visible: pasa al final para no descartarla
+                self._queue.move_to_end(url)
+                return None
+        if url in self._pending:
+            return None
+
+        stale = []
+        with self._queue_lock:
+            self._queue[url] = True
+            while len(self._queue) > self.max_queued:
+                stale.append(self._queue.popitem(last=False)[0])
+        for stale_url in stale:
+            self._pending.pop(stale_url, None)
+        self._pending[url] = True
+        self._tasks.submit(
+            self._load_queued,
+            url,
+            on_done=lambda image: self._on_loaded(url, image),
+            on_error=lambda e: self._on_failed(url, e),
+        )
+        return None
+
+    def _download(self, url: str) -> bytes:
+        """Descarga un logo (hilo del pool, conexion reutilizada por host)"""
+        response = self.http.get(url)
+        self.downloads += 1
+        if response.status != 200:
+            raise OSError(f"HTTP {response.status}")
+        if len(response.body) > self.MAX_LOGO_BYTES:
+            raise ValueError("Logo demasiado grande")
+        return response.body
+
+    def _load_queued(self, url: str):
+        """Carga un logo si su peticion sigue en la cola (hilo del pool)"""
+        with self._queue_lock:
+            if self._queue.pop(url, None) is None:
+                return self._STALE
+        return self._load(url)
+
+    def _load(self, url: str):
+        """Obtiene la miniatura de disco o la descarga y escala (hilo del pool)"""
+        name = self._cache_name(url)
+        thumbnail = self.disk.get(name)
+        if thumbnail is None:
+            thumbnail = self.thumbnailer.scale(self._download(url), self.size)
+            self.disk.put(name, thumbnail)
+        return self.thumbnailer.load(thumbnail)
+
+    def _on_loaded(self, url: str, image) -> None:
+        """Guarda la imagen en la LRU en memoria (hilo principal)"""
+        if image is self._STALE:
+            # Descartada en la cola; otra peticion de la misma URL la sustituye
+            return
+        self._pending.pop(url, None)
+        self._memory[url] = image
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+        if self.on_loaded is not None:
+            self.on_loaded(url)
+
+    def _on_failed(self, url: str, e: Exception) -> None:
+        """Recuerda los logos que fallan para no reintentarlos enseguida"""
+        self._pending.pop(url, None)
+        self._failed[url] = time.monotonic() + self.failure_ttl
+        log.info("No se pudo cargar %s: %s", url, e)
+
+    def cached_urls(self) -> List[str]:
+        """URLs con imagen en memoria, de la menos a la mas reciente"""
+        return list(self._memory)
+
+    def close(self) -> None:
+        """Detiene las descargas pendientes"""
+        self._tasks.shutdown()
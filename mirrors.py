@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Espejos de streams - Elige la URL de un canal que responde antes
+
+Los canales con varias URLs (tabla channel_streams) se resuelven con una
+carrera al estilo "happy eyeballs" (RFC 8305): se pide la lista HLS de la
+mejor candidata y, si no responde en STAGGER segundos o falla, se lanza la
+siguiente sin cancelar las anteriores. La primera lista valida gana, el resto
+de peticiones se cancela y la ganadora suma puntos en la base de datos para
+salir primera la proxima vez.
+
+asyncio y el prober se importan con la primera carrera: el arranque y los
+canales con una sola URL no los cargan.
+"""
+
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from database import ChannelDatabase
+from instrument import get_logger, span
+
+log = get_logger("mirrors")
+
+
+class RaceResult(NamedTuple):
+    """Resultado de una carrera entre espejos"""
+
+    url: Optional[str]
+    seconds: float
+    errors: Dict[str, str]
+
+
+class MirrorRacer:
+    """Compite entre las URLs de un canal pidiendo su lista HLS"""
+
+    DEFAULT_CANDIDATES = 3
+    # Retardo entre arranques recomendado por RFC 8305
+    DEFAULT_STAGGER = 0.25
+    DEFAULT_TIMEOUT = 5.0
+
+    def __init__(
+        self,
+        candidates: Optional[int] = None,
+        stagger: Optional[float] = None,
+        timeout: Optional[float] = None,
+    ):
+        from prober import ChannelProber
+
+        self.candidates = candidates or self.DEFAULT_CANDIDATES
+        self.stagger = self.DEFAULT_STAGGER if stagger is None else stagger
+        self.prober = ChannelProber(timeout=timeout or self.DEFAULT_TIMEOUT)
+
+    async def _race(self, urls: List[str]) -> Tuple[Optional[str], Dict[str, str]]:
+        """Arranca las candidatas escalonadas; retorna la primera valida"""
+        import asyncio
+
+        errors: Dict[str, str] = {}
+        waiting = list(urls)
+        running: Dict[asyncio.Future, str] = {}
+        try:
+            while waiting or running:
+                # Tras un fallo o STAGGER segundos sin respuesta entra la siguiente
+                if waiting:
+                    url = waiting.pop(0)
+                    running[asyncio.ensure_future(self.prober.probe_one("", url))] = url
+                done, _ = await asyncio.wait(
+                    list(running),
+                    timeout=self.stagger if waiting else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    url = running.pop(task)
+                    result = task.result()
+                    if result.reachable:
+                        return url, errors
+                    errors[url] = result.error
+            return None, errors
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.wait(list(running))
+
+    def race(self, urls: List[str]) -> RaceResult:
+        """
+        Compite entre las primeras self.candidates URLs, en ese orden
+
+        Returns:
+            RaceResult con la URL ganadora (None si ninguna respondio), la
+            duracion y el error de cada candidata que fallo
+        """
+        import asyncio
+
+        start = time.perf_counter()
+        loop = asyncio.new_event_loop()
+        try:
+            url, errors = loop.run_until_complete(self._race(urls[: self.candidates]))
+        finally:
+            loop.close()
+        return RaceResult(url, time.perf_counter() - start, errors)
+
+
+class MirrorSelector:
+    """Elige la URL a reproducir de cada canal y recuerda las ganadoras"""
+
+    def __init__(self, db: ChannelDatabase, racer: Optional[MirrorRacer] = None):
+        self.db = db
+        self.racer = racer
+
+    def select(self, instance: str, default_url: str) -> str:
+        """
+        URL con la que reproducir el canal
+
+        Con una sola URL no hay carrera ni peticiones de red. Si ninguna
+        candidata responde se devuelve la mejor clasificada para que el
+        reproductor lo intente y muestre su propio error.
+        """
+        candidates = self.db.get_stream_candidates(instance)
+        if len(candidates) <= 1:
+            return default_url
+
+        if self.racer is None:
+            self.racer = MirrorRacer()
+        with span("mirrors.race", instance=instance, candidates=len(candidates)):
+            result = self.racer.race(candidates)
+        for url, error in result.errors.items():
+            log.info("Espejo de %s descartado: %s (%s)", instance, url, error)
+        if result.url is None:
+            log.warning("Ningun espejo de %s respondio", instance)
+            return candidates[0]
+
+        log.debug(
+            "Espejo de %s: %s en %.0f ms", instance, result.url, result.seconds * 1000
+        )
+        self.db.record_stream_win(instance, result.url)
+        return result.url
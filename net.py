@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Cliente HTTP con conexiones persistentes (keep-alive) compartidas entre hilos
+"""
+
+import http.client
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+USER_AGENT = "VerTele/1.0"
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+
+class Response(NamedTuple):
+    """Respuesta HTTP completa"""
+
+    url: str
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+
+
+class HTTPClient:
+    """
+    Cliente HTTP que reutiliza las conexiones a cada host
+
+    Evita repetir el handshake TCP/TLS en cada peticion al mismo origen. Las
+    conexiones libres se comparten entre hilos y se guardan como maximo
+    MAX_IDLE_PER_HOST por origen: un pico de hilos (por ejemplo un hilo por
+    cliente del proxy) no deja abierto un pool por hilo.
+    """
+
+    DEFAULT_TIMEOUT = 10.0
+    MAX_REDIRECTS = 5
+    MAX_IDLE_PER_HOST = 4
+
+    def __init__(
+        self, timeout: Optional[float] = None, max_idle_per_host: Optional[int] = None
+    ):
+        self.timeout = timeout or self.DEFAULT_TIMEOUT
+        self.max_idle_per_host = max_idle_per_host or self.MAX_IDLE_PER_HOST
+        # (scheme, netloc) -> conexiones libres, la mas reciente al final
+        self._idle: Dict[Tuple[str, str], List[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+
+    def _acquire(self, scheme: str, netloc: str) -> http.client.HTTPConnection:
+        """Toma una conexion libre del origen o abre una nueva"""
+        with self._lock:
+            idle = self._idle.get((scheme, netloc))
+            if idle:
+                return idle.pop()
+        if scheme == "https":
+            return http.client.HTTPSConnection(netloc, timeout=self.timeout)
+        return http.client.HTTPConnection(netloc, timeout=self.timeout)
+
+    def _release(
+        self, scheme: str, netloc: str, conn: http.client.HTTPConnection
+    ) -> None:
+        """Devuelve una conexion libre al pool, o la cierra si esta lleno"""
+        with self._lock:
+            idle = self._idle.setdefault((scheme, netloc), [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def _request_once(self, url: str, headers: Dict[str, str]) -> Response:
+        """Hace una peticion GET, reintentando una vez si la conexion caducó"""
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"Esquema no soportado: {parts.scheme}")
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+
+        for attempt in range(2):
+            conn = self._acquire(parts.scheme, parts.netloc)
+            try:
+                conn.request("GET", path, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                # Una conexion reutilizada puede haber sido cerrada por el servidor
+                if attempt == 0:
+                    continue
+                raise
+            response_headers = {k.lower(): v for k, v in response.getheaders()}
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(parts.scheme, parts.netloc, conn)
+            return Response(url, response.status, response_headers, body)
+        raise OSError(f"No se pudo descargar {url}")
+
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> Response:
+        """
+        Descarga una URL siguiendo redirecciones
+
+        Args:
+            url: URL http(s)
+            headers: Cabeceras adicionales (por ejemplo If-None-Match)
+
+        Returns:
+            Response con la URL final tras las redirecciones
+
+        Raises:
+            OSError, http.client.HTTPException o ValueError si falla la descarga
+        """
+        request_headers = {"User-Agent": USER_AGENT, "Accept-Encoding": "identity"}
+        request_headers.update(headers or {})
+        for _ in range(self.MAX_REDIRECTS + 1):
+            response = self._request_once(url, request_headers)
+            location = response.headers.get("location")
+            if response.status in REDIRECT_CODES and location:
+                url = urljoin(url, location)
+                continue
+            return response
+        raise ValueError("Demasiadas redirecciones")
+
+    def close(self) -> None:
+        """Cierra las conexiones libres de todos los origenes"""
+        with self._lock:
+            pools, self._idle = list(self._idle.values()), {}
+        for idle in pools:
+            for conn in idle:
+                conn.close()
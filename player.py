@@ -4,80 +4,675 @@
 Service layer - Lógica de negocio para reproducir canales
 """
 
-from typing import Tuple, Optional
+from typing import Dict, List, Tuple, Optional
+import abc
+import json
+import logging
+import shutil
+import socket
 import subprocess
 import sys
 import os
+import tempfile
+import threading
+import time
+
+from instrument import get_logger, span, traced
+
+log = get_logger("player")
+
+
+def player_environment() -> Dict[str, str]:
+    """Entorno para los procesos del reproductor"""
+    # WSLg: configurar PulseAudio
+    pulse_socket = "/mnt/wslg/PulseServer"
+    env = os.environ.copy()
+    if os.path.exists(pulse_socket):
+        env["PULSE_SERVER"] = f"unix:{pulse_socket}"
+        log.debug("Usando PulseAudio WSLg: %s", pulse_socket)
+    return env
+
+
+class PlayerCache:
+    """
+    Cache en disco de ejecutables de reproductor ya validados
+
+    Cada entrada se identifica por ruta, mtime y tamaño: mientras el binario
+    no cambie no hace falta volver a ejecutarlo para comprobar que funciona.
+    """
+
+    FILE_NAME = "players.json"
+
+    def __init__(self, cache_path: Optional[str] = None):
+        if cache_path is None:
+            cache_dir = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+                os.path.expanduser("~"), ".cache"
+            )
+            cache_path = os.path.join(cache_dir, "vertele", self.FILE_NAME)
+        self.cache_path = cache_path
+        self._entries = self._load()
+
+    def _load(self) -> Dict[str, Dict]:
+        """Lee la cache; un archivo ausente o corrupto equivale a cache vacia"""
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+            return entries if isinstance(entries, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self) -> None:
+        """Escribe la cache de forma atomica"""
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp_path = self.cache_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            # Sin cache en disco solo se pierde la optimizacion
+            pass
+
+    @staticmethod
+    def _signature(path: str) -> Optional[Tuple[int, int]]:
+        """Retorna (mtime_ns, size) del ejecutable, o None si no existe"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def lookup(self, path: str) -> Optional[bool]:
+        """
+        Consulta si el ejecutable ya fue validado
+
+        Returns:
+            True/False segun la ultima validacion, o None si el binario es
+            desconocido o cambio desde entonces
+        """
+        signature = self._signature(path)
+        entry = self._entries.get(path)
+        if signature is None or entry is None:
+            return None
+        if (entry.get("mtime_ns"), entry.get("size")) != signature:
+            return None
+        return bool(entry.get("ok"))
+
+    def store(self, path: str, ok: bool) -> None:
+        """Guarda el resultado de validar un ejecutable"""
+        signature = self._signature(path)
+        if signature is None:
+            return
+        self._entries[path] = {"mtime_ns": signature[0], "size": signature[1], "ok": ok}
+        self._save()
+
+
+class PlayerLimitError(RuntimeError):
+    """Se alcanzo el maximo de reproductores simultaneos"""
+
+    pass
+
+
+class ProcessSupervisor:
+    """
+    Supervisa los procesos de reproductor lanzados por la aplicacion
+
+    Registra cada proceso, recoge los que terminan sin bloquear (reap) y
+    limita cuantos reproductores pueden estar abiertos a la vez. Con
+    replace_on_zap, lanzar un reproductor nuevo detiene el mas antiguo.
+    """
+
+    DEFAULT_MAX_PLAYERS = 1
+    TERMINATE_TIMEOUT = 2.0
+
+    def __init__(self, max_players: Optional[int] = None, replace_on_zap: bool = True):
+        self.max_players = max_players or self.DEFAULT_MAX_PLAYERS
+        self.replace_on_zap = replace_on_zap
+        self._processes = []
+        # Popen -> instante en que se envio SIGTERM; se indexa por el objeto y
+        # no por el pid, que el sistema puede reutilizar tras recogerlo
+        self._stopping: Dict[subprocess.Popen, float] = {}
+        self._lock = threading.RLock()
+
+    def running(self) -> List[subprocess.Popen]:
+        """Procesos vivos que no se estan deteniendo"""
+        with self._lock:
+            return [
+                p
+                for p in self._processes
+                if p.poll() is None and p not in self._stopping
+            ]
+
+    def spawn(
+        self, cmd: List[str], env: Optional[Dict[str, str]] = None
+    ) -> subprocess.Popen:
+        """
+        Lanza un reproductor respetando el maximo de procesos simultaneos
+
+        Raises:
+            PlayerLimitError: Si se alcanzo el maximo y no se reemplaza
+        """
+        with self._lock:
+            self.reap()
+            active = self.running()
+            if len(active) >= self.max_players:
+                if not self.replace_on_zap:
+                    raise PlayerLimitError(
+                        f"Ya hay {len(active)} reproductores abiertos (maximo {self.max_players})"
+                    )
+                for process in active[: len(active) - self.max_players + 1]:
+                    self.stop(process)
+
+            process = subprocess.Popen(
+                cmd,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True,
+                env=env,
+            )
+            self._processes.append(process)
+            return process
+
+    def stop(self, process: subprocess.Popen, wait: bool = False) -> None:
+        """
+        Detiene un reproductor
+
+        Sin wait solo envia SIGTERM; reap() lo recoge o lo mata con SIGKILL
+        si no termina en TERMINATE_TIMEOUT segundos.
+        """
+        with self._lock:
+            if process.poll() is None and process not in self._stopping:
+                try:
+                    process.terminate()
+                except OSError:
+                    pass
+                self._stopping[process] = time.monotonic()
+        if wait:
+            try:
+                process.wait(timeout=self.TERMINATE_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+            self.reap()
+
+    def reap(self) -> int:
+        """
+        Recoge los procesos terminados sin bloquear
+
+        Returns:
+            Numero de procesos recogidos
+        """
+        now = time.monotonic()
+        with self._lock:
+            alive = []
+            for process in self._processes:
+                if process.poll() is not None:
+                    self._stopping.pop(process, None)
+                    continue
+                stopped_at = self._stopping.get(process)
+                if stopped_at is not None and now - stopped_at > self.TERMINATE_TIMEOUT:
+                    process.kill()
+                alive.append(process)
+            reaped = len(self._processes) - len(alive)
+            self._processes = alive
+        return reaped
+
+    def shutdown(self) -> None:
+        """Detiene todos los reproductores y espera a que terminen"""
+        with self._lock:
+            processes = list(self._processes)
+        for process in processes:
+            self.stop(process)
+        for process in processes:
+            self.stop(process, wait=True)
+
+
+class PlayerSession(abc.ABC):
+    """
+    Sesion persistente de un reproductor controlado a distancia
+
+    Mantiene un unico proceso vivo y le ordena cargar cada canal por su
+    interfaz de control, evitando el arranque en frio en cada cambio. Las
+    respuestas del reproductor se leen y descartan en un hilo aparte: si nadie
+    las lee se llena el buffer del socket y el reproductor se bloquea.
+    """
+
+    CONNECT_TIMEOUT = 10.0
+    CONNECT_RETRY_DELAY = 0.05
+
+    def __init__(
+        self,
+        executable: str,
+        env: Optional[Dict[str, str]] = None,
+        supervisor: Optional[ProcessSupervisor] = None,
+    ):
+        self.executable = executable
+        self.env = env
+        self.supervisor = supervisor or ProcessSupervisor()
+        self.process = None
+        self._sock = None
+
+    @abc.abstractmethod
+    def build_command(self) -> List[str]:
+        """Linea de comandos que arranca el reproductor en modo controlable"""
+
+    @abc.abstractmethod
+    def _open_socket(self) -> socket.socket:
+        """Abre una conexion con la interfaz de control"""
+
+    @abc.abstractmethod
+    def _send_load(self, sock: socket.socket, title: str, stream_url: str) -> None:
+        """Ordena al reproductor cargar un stream"""
+
+    @abc.abstractmethod
+    def _send_quit(self, sock: socket.socket) -> None:
+        """Ordena al reproductor terminar"""
+
+    def is_alive(self) -> bool:
+        """Indica si el proceso del reproductor sigue en ejecucion"""
+        return self.process is not None and self.process.poll() is None
+
+    def start(self) -> None:
+        """Arranca el proceso del reproductor"""
+        self.process = self.supervisor.spawn(self.build_command(), self.env)
+        log.info("Sesion persistente iniciada con PID: %d", self.process.pid)
+
+    def _connect(self) -> socket.socket:
+        """Espera a que la interfaz de control acepte conexiones"""
+        deadline = time.monotonic() + self.CONNECT_TIMEOUT
+        while True:
+            try:
+                return self._open_socket()
+            except OSError:
+                if not self.is_alive() or time.monotonic() > deadline:
+                    raise
+                time.sleep(self.CONNECT_RETRY_DELAY)
+
+    def _drain_replies(self, sock: socket.socket) -> None:
+        """Lee y descarta las respuestas del reproductor hasta que se cierre"""
+        while True:
+            try:
+                data = sock.recv(65536)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            if not data:
+                return
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("Respuesta del reproductor: %s", data[:200])
+
+    def _disconnect(self) -> None:
+        """Cierra la conexion de control"""
+        if self._sock is not None:
+            try:
+                # shutdown despierta al hilo que lee las respuestas
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+    def load(self, title: str, stream_url: str) -> bool:
+        """
+        Carga un stream en el reproductor, arrancandolo si hace falta
+
+        Returns:
+            True si el reproductor acepto la orden
+        """
+        for attempt in range(2):
+            try:
+                if not self.is_alive():
+                    self._disconnect()
+                    self.start()
+                if self._sock is None:
+                    self._sock = self._connect()
+                    threading.Thread(
+                        target=self._drain_replies,
+                        args=(self._sock,),
+                        name="player-replies",
+                        daemon=True,
+                    ).start()
+                self._send_load(self._sock, title, stream_url)
+                return True
+            except OSError as e:
+                log.warning("Fallo el control remoto (intento %d): %s", attempt + 1, e)
+                self._disconnect()
+        return False
+
+    def close(self) -> None:
+        """Termina el reproductor y libera la conexion"""
+        if self._sock is not None:
+            try:
+                self._send_quit(self._sock)
+            except OSError:
+                pass
+        self._disconnect()
+        if self.process is not None:
+            self.supervisor.stop(self.process, wait=True)
+        self.process = None
+
+
+class VLCRemoteSession(PlayerSession):
+    """Sesion de VLC controlada por su interfaz RC sobre TCP local"""
+
+    HOST = "127.0.0.1"
+
+    def __init__(
+        self,
+        executable: str,
+        env: Optional[Dict[str, str]] = None,
+        supervisor: Optional[ProcessSupervisor] = None,
+        port: Optional[int] = None,
+    ):
+        super().__init__(executable, env, supervisor)
+        self.port = port or self._free_port()
+
+    @staticmethod
+    def _free_port() -> int:
+        """Reserva un puerto TCP libre en la interfaz local"""
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.bind(("127.0.0.1", 0))
+            return sock.getsockname()[1]
+
+    def build_command(self) -> List[str]:
+        return [
+            self.executable,
+            "--extraintf=rc",
+            f"--rc-host={self.HOST}:{self.port}",
+        ]
+
+    def _open_socket(self) -> socket.socket:
+        return socket.create_connection((self.HOST, self.port), timeout=2)
+
+    def _send_load(self, sock: socket.socket, title: str, stream_url: str) -> None:
+        # Las opciones tras la MRL se aplican solo a ese elemento
+        title = title.replace('"', "'")
+        sock.sendall(f'clear\nadd {stream_url} ":meta-title={title}"\n'.encode("utf-8"))
+
+    def _send_quit(self, sock: socket.socket) -> None:
+        sock.sendall(b"quit\n")
+
+
+class MPVIPCSession(PlayerSession):
+    """Sesion de mpv controlada por su socket JSON IPC"""
+
+    def __init__(
+        self,
+        executable: str,
+        env: Optional[Dict[str, str]] = None,
+        supervisor: Optional[ProcessSupervisor] = None,
+        socket_path: Optional[str] = None,
+    ):
+        super().__init__(executable, env, supervisor)
+        self.socket_path = socket_path or os.path.join(
+            os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir(),
+            f"vertele-mpv-{os.getpid()}.sock",
+        )
+
+    def build_command(self) -> List[str]:
+        return [
+            self.executable,
+            "--idle=yes",
+            "--force-window=yes",
+            f"--input-ipc-server={self.socket_path}",
+        ]
+
+    def _open_socket(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(2)
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    @staticmethod
+    def _command(sock: socket.socket, *args) -> None:
+        """Envia un comando JSON IPC"""
+        message = json.dumps({"command": list(args)}) + "\n"
+        sock.sendall(message.encode("utf-8"))
+
+    def _send_load(self, sock: socket.socket, title: str, stream_url: str) -> None:
+        self._command(sock, "loadfile", stream_url, "replace")
+        self._command(sock, "set_property", "force-media-title", title)
+
+    def _send_quit(self, sock: socket.socket) -> None:
+        self._command(sock, "quit")
+
+
+class PlayerBackend(abc.ABC):
+    """
+    Describe un reproductor: como lanzarlo, como validarlo y si admite
+    control remoto
+
+    La deteccion prefiere los backends con control remoto (cambian de canal
+    sin relanzarse) y con interfaz (has_gui: controles de reproduccion);
+    startup_cost_ms, el tiempo tipico hasta mostrar un stream HLS, solo
+    desempata entre ellos.
+    """
+
+    name = ""
+    executables = ()
+    version_args = ("--version",)
+    startup_cost_ms = 1000
+    has_gui = True
+    session_class = None
+
+    @property
+    def supports_remote_control(self) -> bool:
+        """Indica si el backend admite una sesion persistente"""
+        return self.session_class is not None
+
+    @abc.abstractmethod
+    def build_command(self, executable: str, title: str, stream_url: str) -> List[str]:
+        """Linea de comandos para reproducir un stream en un proceso nuevo"""
+
+    def create_session(
+        self,
+        executable: str,
+        env: Optional[Dict[str, str]] = None,
+        supervisor: Optional[ProcessSupervisor] = None,
+    ) -> Optional[PlayerSession]:
+        """Crea una sesion persistente, o None si el backend no la soporta"""
+        if self.session_class is None:
+            return None
+        return self.session_class(executable, env, supervisor)
+
+
+class VLCBackend(PlayerBackend):
+    """VLC con interfaz grafica"""
+
+    name = "vlc"
+    executables = ("vlc", "/usr/bin/vlc", "/usr/local/bin/vlc", "/snap/bin/vlc")
+    startup_cost_ms = 1500
+    session_class = VLCRemoteSession
+
+    def build_command(self, executable: str, title: str, stream_url: str) -> List[str]:
+        return [executable, "--meta-title=" + title, stream_url]
+
+
+class CVLCBackend(VLCBackend):
+    """VLC sin interfaz (solo ventana de video)"""
+
+    name = "cvlc"
+    executables = ("cvlc", "/usr/bin/cvlc", "/usr/local/bin/cvlc")
+    startup_cost_ms = 1200
+    has_gui = False
+
+
+class MPVBackend(PlayerBackend):
+    """mpv, normalmente el que abre HLS mas rapido"""
+
+    name = "mpv"
+    executables = ("mpv", "/usr/bin/mpv", "/usr/local/bin/mpv", "/snap/bin/mpv")
+    startup_cost_ms = 600
+    session_class = MPVIPCSession
+
+    def build_command(self, executable: str, title: str, stream_url: str) -> List[str]:
+        return [executable, "--force-media-title=" + title, stream_url]
+
+
+class FFplayBackend(PlayerBackend):
+    """ffplay de FFmpeg, sin control remoto"""
+
+    name = "ffplay"
+    executables = ("ffplay", "/usr/bin/ffplay", "/usr/local/bin/ffplay")
+    version_args = ("-version",)
+    startup_cost_ms = 900
+    has_gui = False
+
+    def build_command(self, executable: str, title: str, stream_url: str) -> List[str]:
+        return [executable, "-window_title", title, "-loglevel", "error", stream_url]
+
+
+BACKENDS: Dict[str, PlayerBackend] = {}
+
+
+def register_backend(backend: PlayerBackend) -> PlayerBackend:
+    """Registra un backend de reproductor por su nombre"""
+    BACKENDS[backend.name] = backend
+    return backend
+
+
+for _backend_class in (VLCBackend, CVLCBackend, MPVBackend, FFplayBackend):
+    register_backend(_backend_class())
+
+
+def ordered_backends(preferred: Optional[str] = None) -> List[PlayerBackend]:
+    """
+    Backends registrados, el preferido primero
+
+    Despues van los que tienen control remoto e interfaz, y dentro de cada
+    grupo del mas rapido al mas lento: mpv, vlc, cvlc, ffplay.
+    """
+    backends = sorted(
+        BACKENDS.values(),
+        key=lambda b: (not b.supports_remote_control, not b.has_gui, b.startup_cost_ms),
+    )
+    if preferred in BACKENDS:
+        backends.remove(BACKENDS[preferred])
+        backends.insert(0, BACKENDS[preferred])
+    return backends
+
+
+def backend_for_executable(executable: str) -> PlayerBackend:
+    """Deduce el backend a partir del nombre del ejecutable (VLC por defecto)"""
+    name = os.path.basename(executable).lower()
+    # Los nombres mas largos primero para que 'cvlc' no coincida con 'vlc'
+    for backend_name in sorted(BACKENDS, key=len, reverse=True):
+        if name.startswith(backend_name):
+            return BACKENDS[backend_name]
+    return BACKENDS["vlc"]
 
 
 class StreamPlayer:
     """Maneja la reproducción de streams de video"""
 
-    def __init__(self):
+    VERSION_TIMEOUT = 2
+    # Espera maxima por una pre-resolucion que ya esta en curso
+    RESOLVE_WAIT = 1.0
+
+    def __init__(
+        self,
+        candidates: Optional[List[str]] = None,
+        cache: Optional[PlayerCache] = None,
+        remote_control: bool = True,
+        max_players: Optional[int] = None,
+        preferred_backend: Optional[str] = None,
+        resolver=None,
+        proxy=None,
+    ):
+        """
+        Args:
+            candidates: Ejecutables concretos a probar; por defecto se prueban
+                los de cada backend registrado
+            cache: Cache de ejecutables validados
+            remote_control: Cambiar de canal en una sesion persistente
+            max_players: Maximo de reproductores simultaneos
+            preferred_backend: Nombre del backend a probar primero
+            resolver: preresolve.PlaylistResolver con las listas ya resueltas
+            proxy: proxy.HLSProxy por el que se enrutan los streams
+        """
+        self.candidates = candidates
+        self.preferred_backend = preferred_backend
+        self.resolver = resolver
+        self.proxy = proxy
+        self.cache = cache or PlayerCache()
+        self.remote_control = remote_control
+        self.supervisor = ProcessSupervisor(max_players)
+        self.session = None
         self._detect_player()
 
+    @staticmethod
+    def _resolve_candidate(candidate: str) -> Optional[str]:
+        """Resuelve un candidato a una ruta ejecutable sin lanzar procesos"""
+        if os.path.isabs(candidate):
+            if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+                return candidate
+            return None
+        return shutil.which(candidate)
+
+    def _validate_executable(self, path: str, backend: PlayerBackend) -> bool:
+        """Comprueba que el ejecutable funciona, usando la cache si es posible"""
+        cached = self.cache.lookup(path)
+        if cached is not None:
+            return cached
+
+        try:
+            result = subprocess.run(
+                [path] + list(backend.version_args),
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=self.VERSION_TIMEOUT,
+            )
+            ok = result.returncode == 0
+        except (OSError, subprocess.TimeoutExpired):
+            ok = False
+
+        self.cache.store(path, ok)
+        return ok
+
+    def _candidate_pairs(self) -> List[Tuple[PlayerBackend, str]]:
+        """Pares (backend, candidato) en orden de preferencia"""
+        if self.candidates:
+            return [(backend_for_executable(c), c) for c in self.candidates]
+        return [
+            (backend, candidate)
+            for backend in ordered_backends(self.preferred_backend)
+            for candidate in backend.executables
+        ]
+
+    @traced("player.detect")
     def _detect_player(self) -> None:
         """Detecta el reproductor de video disponible en el sistema"""
         self.player_command = None
         self.player_executable = None
+        self.backend = None
 
-        # Buscar VLC en el sistema - vlc primero para tener interfaz grafica
-        players_to_check = [
-            "vlc",
-            "/usr/bin/vlc",
-            "/usr/local/bin/vlc",
-            "/snap/bin/vlc",
-        ]
-
-        for player in players_to_check:
-            try:
-                # Si es un path absoluto, verificar si existe
-                if player.startswith("/"):
-                    if os.path.isfile(player):
-                        # Verificar si funciona
-                        result = subprocess.run(
-                            [player, "--version"],
-                            stdout=subprocess.DEVNULL,
-                            stderr=subprocess.DEVNULL,
-                            timeout=2,
-                        )
-                        if result.returncode == 0:
-                            self.player_command = player
-                            self.player_executable = player
-                            print(f"[PLAYER] Usando VLC: {player}")
-                            break
-                else:
-                    # Buscar en PATH
-                    result = subprocess.run(
-                        ["which", player],
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.DEVNULL,
-                        timeout=2,
-                    )
-                    if result.returncode == 0:
-                        vlc_path = result.stdout.decode().strip()
-                        # Verificar si funciona
-                        check_result = subprocess.run(
-                            [vlc_path, "--version"],
-                            stdout=subprocess.DEVNULL,
-                            stderr=subprocess.DEVNULL,
-                            timeout=2,
-                        )
-                        if check_result.returncode == 0:
-                            self.player_command = vlc_path
-                            self.player_executable = vlc_path
-                            print(f"[PLAYER] Usando VLC: {vlc_path}")
-                            break
-            except (
-                subprocess.CalledProcessError,
-                FileNotFoundError,
-                subprocess.TimeoutExpired,
-            ):
+        checked = set()
+        for backend, candidate in self._candidate_pairs():
+            path = self._resolve_candidate(candidate)
+            if path is None or path in checked:
                 continue
+            checked.add(path)
+
+            if self._validate_executable(path, backend):
+                self.player_command = path
+                self.player_executable = path
+                self.backend = backend
+                log.info("Usando %s: %s", backend.name, path)
+                break
 
         if self.player_command is None:
             raise RuntimeError(
-                "No se encontro VLC instalado. Instala VLC para reproducir canales."
+                "No se encontro un reproductor compatible. "
+                "Instala VLC o mpv para reproducir canales."
             )
 
     def play_channel(self, title: str, stream_url: str) -> bool:
@@ -91,49 +686,67 @@ class StreamPlayer:
         Returns:
             True si se inicio correctamente, False en caso contrario
         """
-        print(f"[PLAYER] Reproduciendo: {title}")
-        print(f"[PLAYER] Stream URL: {stream_url}")
-        print(f"[PLAYER] Reproductor: {self.player_executable}")
+        log.info("Reproduciendo: %s", title)
+        log.debug("Stream URL: %s", stream_url)
+        log.debug("Reproductor: %s", self.player_executable)
 
         if not self.player_executable:
-            print("[PLAYER] ERROR: player_executable es None")
+            log.error("No hay reproductor detectado")
             return False
 
+        if self.resolver is not None:
+            with span("player.resolve"):
+                stream_url = self.resolver.resolved_url(stream_url, self.RESOLVE_WAIT)
+            log.debug("URL resuelta: %s", stream_url)
+
+        if self.proxy is not None:
+            stream_url = self.proxy.url_for(stream_url)
+
+        if self.remote_control:
+            with span("player.session_load"):
+                loaded = self._play_in_session(title, stream_url)
+            if loaded:
+                return True
+
         try:
-            # WSLg: configurar PulseAudio
-            import os
-
-            pulse_socket = "/mnt/wslg/PulseServer"
-            env = os.environ.copy()
-            if os.path.exists(pulse_socket):
-                env["PULSE_SERVER"] = f"unix:{pulse_socket}"
-                print(f"[PLAYER] Usando PulseAudio WSLg: {pulse_socket}")
-
-            cmd = [
-                self.player_executable,
-                "--meta-title=" + title,
-                stream_url,
-            ]
-            print(f"[PLAYER] Comando: {' '.join(cmd)}")
+            env = player_environment()
+            cmd = self.backend.build_command(self.player_executable, title, stream_url)
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("Comando: %s", " ".join(cmd))
 
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                start_new_session=True,
-                env=env,
-            )
-            print(f"[PLAYER] VLC iniciado con PID: {process.pid}")
-            print(f"[PLAYER] Deberia abrirse una ventana de VLC...")
+            with span("player.spawn", backend=self.backend.name):
+                process = self.supervisor.spawn(cmd, env)
+            log.info("%s iniciado con PID: %d", self.backend.name, process.pid)
 
             return True
-        except Exception as e:
-            print(f"[PLAYER] ERROR al reproducir '{title}': {e}", file=sys.stderr)
-            import traceback
-
-            traceback.print_exc(file=sys.stderr)
+        except Exception:
+            log.exception("Error al reproducir '%s'", title)
             return False
 
+    def _play_in_session(self, title: str, stream_url: str) -> bool:
+        """Cambia de canal en la sesion persistente del reproductor"""
+        if self.session is None:
+            self.session = self.backend.create_session(
+                self.player_executable, player_environment(), self.supervisor
+            )
+            if self.session is None:
+                return False
+        if self.session.load(title, stream_url):
+            log.info("Canal cargado en la sesion PID: %d", self.session.process.pid)
+            return True
+        return False
+
+    def reap(self) -> int:
+        """Recoge sin bloquear los reproductores que ya terminaron"""
+        return self.supervisor.reap()
+
+    def close(self) -> None:
+        """Termina la sesion persistente y todos los reproductores lanzados"""
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+        self.supervisor.shutdown()
+
     def play_channel_with_player(
         self, title: str, stream_url: str, player: str
     ) -> bool:
@@ -146,13 +759,9 @@ class StreamPlayer:
             player: Comando del reproductor ('cvlc', 'vlc', 'mpv', etc.)
         """
         try:
-            cmd = [player, "--meta-title=" + title, stream_url]
-            subprocess.Popen(
-                cmd,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                start_new_session=True,
-            )
+            backend = backend_for_executable(player)
+            cmd = backend.build_command(player, title, stream_url)
+            self.supervisor.spawn(cmd)
             return True
         except Exception:
             return False
@@ -167,7 +776,7 @@ class ChannelNotFoundException(Exception):
 if __name__ == "__main__":
     try:
         player = StreamPlayer()
-        print(f"Reproductor detectado: {player.player_command}")
+        print(f"Reproductor detectado: {player.player_command} ({player.backend.name})")
     except RuntimeError as e:
         print(f"Error: {e}")
         sys.exit(1)
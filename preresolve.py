@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Pre-resolucion HLS - Resuelve la lista maestra antes de pulsar "Reproducir"
+
+Al resaltar un canal se descarga en segundo plano su lista maestra, se elige
+una variante segun la politica de ancho de banda/resolucion y se guarda la URL
+de la lista de medios resultante con un TTL. Al reproducir, el reproductor
+recibe directamente esa URL y se ahorra uno o dos viajes de red.
+
+Al recorrer la lista con el teclado solo interesa el ultimo canal resaltado:
+prefetch_latest deja en espera una unica URL y descarta las anteriores que aun
+no empezaron. Si la lista maestra declara audio o subtitulos aparte
+(EXT-X-MEDIA) se entrega la maestra, porque una variante suelta los pierde.
+"""
+
+import http.client
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, NamedTuple, Optional
+
+import hls
+from instrument import get_logger
+
+log = get_logger("preresolve")
+
+USER_AGENT = "VerTele/1.0"
+
+
+class VariantPolicy(NamedTuple):
+    """Limites para elegir la variante de una lista maestra"""
+
+    max_bandwidth: Optional[int] = None
+    max_height: Optional[int] = None
+
+    def allows(self, variant: hls.Variant) -> bool:
+        """Indica si la variante respeta los limites"""
+        if self.max_bandwidth and variant.bandwidth > self.max_bandwidth:
+            return False
+        if self.max_height and variant.height > self.max_height:
+            return False
+        return True
+
+    def choose(self, variants: List[hls.Variant]) -> Optional[hls.Variant]:
+        """
+        Elige la variante de mayor ancho de banda dentro de los limites
+
+        Si ninguna cumple los limites se elige la de menor ancho de banda.
+        """
+        if not variants:
+            return None
+        allowed = [v for v in variants if self.allows(v)]
+        if allowed:
+            return max(allowed, key=lambda v: v.bandwidth)
+        return min(variants, key=lambda v: v.bandwidth)
+
+
+class PlaylistResolver:
+    """
+    Resuelve y cachea la lista de medios de cada stream
+
+    Las resoluciones se hacen en un pool de hilos, las peticiones repetidas
+    sobre la misma URL se unifican y la cache se limita por numero de
+    entradas y por TTL.
+    """
+
+    DEFAULT_TTL = 30.0
+    MAX_ENTRIES = 256
+    FETCH_TIMEOUT = 5.0
+    MAX_PLAYLIST_BYTES = 1 << 20
+
+    def __init__(
+        self,
+        policy: Optional[VariantPolicy] = None,
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        max_workers: int = 4,
+    ):
+        self.policy = policy or VariantPolicy()
+        self.ttl = ttl or self.DEFAULT_TTL
+        self.max_entries = max_entries or self.MAX_ENTRIES
+        self._cache = OrderedDict()
+        self._pending = {}
+        # Ultimo canal resaltado pendiente: (url, future) o None
+        self._latest = None
+        self._latest_running = False
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="preresolve"
+        )
+
+    def _fetch(self, url: str):
+        """Descarga una lista y retorna (texto, url final tras redirecciones)"""
+        request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+        with urllib.request.urlopen(request, timeout=self.FETCH_TIMEOUT) as response:
+            body = response.read(self.MAX_PLAYLIST_BYTES)
+            return body.decode("utf-8", errors="replace"), response.geturl()
+
+    def _resolve_uncached(self, url: str) -> str:
+        """Descarga la lista maestra y la lista de medios de la variante elegida"""
+        text, final_url = self._fetch(url)
+        if not hls.is_master_playlist(text):
+            return final_url
+
+        variant = self.policy.choose(hls.parse_master_playlist(text, final_url))
+        if variant is None:
+            return final_url
+        # Pre-calentar la lista de medios (conexion, DNS, cache del CDN)
+        _, media_url = self._fetch(variant.uri)
+        if hls.has_alternate_renditions(text):
+            # Con audio o subtitulos aparte el reproductor necesita la maestra
+            # (y conserva asi la adaptacion de bitrate)
+            return final_url
+        return media_url
+
+    def _store(self, url: str, resolved: str) -> None:
+        """Guarda una resolucion y expulsa las entradas mas antiguas"""
+        with self._lock:
+            self._cache[url] = (resolved, time.monotonic() + self.ttl)
+            self._cache.move_to_end(url)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def get_cached(self, url: str) -> Optional[str]:
+        """Retorna la resolucion cacheada si sigue vigente, sin bloquear"""
+        with self._lock:
+            entry = self._cache.get(url)
+            if entry is None:
+                return None
+            resolved, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._cache[url]
+                return None
+            self._cache.move_to_end(url)
+            return resolved
+
+    def resolve(self, url: str) -> str:
+        """
+        Resuelve una URL de forma sincrona
+
+        Returns:
+            La URL de la lista de medios, o la URL original si falla la descarga
+        """
+        cached = self.get_cached(url)
+        if cached is not None:
+            return cached
+        try:
+            resolved = self._resolve_uncached(url)
+        except (OSError, ValueError, http.client.HTTPException) as e:
+            log.warning("No se pudo pre-resolver %s: %s", url, e)
+            return url
+        self._store(url, resolved)
+        return resolved
+
+    def prefetch(self, url: str) -> Future:
+        """Inicia la resolucion en segundo plano (una sola vez por URL)"""
+        with self._lock:
+            pending = self._pending.get(url)
+            if pending is not None:
+                return pending
+            future = self._executor.submit(self.resolve, url)
+            self._pending[url] = future
+        future.add_done_callback(lambda _: self._forget_pending(url, future))
+        return future
+
+    def prefetch_latest(self, url: str) -> Future:
+        """
+        Pre-resuelve la URL del canal resaltado descartando las anteriores
+
+        Solo hay una resolucion de resaltado en curso y otra en espera: la
+        que espera se sustituye por cada nuevo resaltado, de modo que recorrer
+        la lista no encola una descarga por canal.
+        """
+        with self._lock:
+            pending = self._pending.get(url)
+            if pending is not None:
+                return pending
+            if self._latest is not None:
+                stale_url, stale = self._latest
+                stale.cancel()
+                if self._pending.get(stale_url) is stale:
+                    del self._pending[stale_url]
+            future = Future()
+            self._pending[url] = future
+            self._latest = (url, future)
+            if not self._latest_running:
+                self._latest_running = True
+                self._executor.submit(self._resolve_latest)
+        return future
+
+    def _resolve_latest(self) -> None:
+        """Resuelve el ultimo resaltado hasta que no quede ninguno en espera"""
+        try:
+            while True:
+                with self._lock:
+                    if self._latest is None:
+                        self._latest_running = False
+                        return
+                    url, future = self._latest
+                    self._latest = None
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                try:
+                    future.set_result(self.resolve(url))
+                except Exception as e:
+                    # Quien espere la URL no debe quedarse bloqueado
+                    log.exception("Fallo inesperado al pre-resolver %s", url)
+                    future.set_exception(e)
+                finally:
+                    self._forget_pending(url, future)
+        except BaseException:
+            # Sin esto ningun resaltado posterior volveria a lanzar el bucle
+            with self._lock:
+                self._latest_running = False
+            raise
+
+    def _forget_pending(self, url: str, future: Future) -> None:
+        """Elimina una resolucion terminada de las pendientes"""
+        with self._lock:
+            if self._pending.get(url) is future:
+                del self._pending[url]
+
+    def resolved_url(self, url: str, wait: float = 0.0) -> str:
+        """
+        URL a entregar al reproductor
+
+        Si hay una resolucion en curso espera como maximo wait segundos: esa
+        peticion ya esta en vuelo y esperarla no es mas lento que dejar que el
+        reproductor la repita.
+        """
+        cached = self.get_cached(url)
+        if cached is not None:
+            return cached
+        with self._lock:
+            pending = self._pending.get(url)
+        if pending is not None and wait > 0:
+            try:
+                return pending.result(timeout=wait)
+            except Exception:
+                pass
+        return url
+
+    def close(self) -> None:
+        """Detiene el pool de hilos"""
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,343 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Prober de canales - Comprueba en paralelo que los streams responden
+
+Usa asyncio con concurrencia acotada (global y por host) y guarda en la base
+de datos si cada stream es accesible, su tiempo hasta el primer byte y la
+fecha de la ultima comprobacion.
+"""
+
+import argparse
+import asyncio
+import ssl
+import sys
+import time
+from collections import defaultdict, deque
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+import hls
+from database import ChannelDatabase
+
+USER_AGENT = "VerTele/1.0"
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+
+class FetchResult(NamedTuple):
+    """Respuesta HTTP simplificada"""
+
+    url: str
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+    ttfb: float
+
+
+class ProbeResult(NamedTuple):
+    """Resultado de comprobar un stream"""
+
+    instance: str
+    reachable: bool
+    http_status: Optional[int]
+    ttfb_ms: Optional[float]
+    variants: int
+    error: Optional[str]
+    checked_at: float
+
+
+async def _read_body(
+    reader: asyncio.StreamReader, headers: Dict[str, str], max_bytes: int
+) -> bytes:
+    """Lee el cuerpo respetando chunked, Content-Length o cierre de conexion"""
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        chunks = []
+        size = 0
+        while size < max_bytes:
+            line = await reader.readline()
+            chunk_size = int(line.split(b";", 1)[0].strip() or b"0", 16)
+            if chunk_size == 0:
+                break
+            chunks.append(await reader.readexactly(chunk_size))
+            size += chunk_size
+            await reader.readline()
+        return b"".join(chunks)[:max_bytes]
+
+    length = headers.get("content-length")
+    if length is not None:
+        return await reader.readexactly(min(int(length), max_bytes))
+    return await reader.read(max_bytes)
+
+
+async def fetch(
+    url: str,
+    timeout: float = 10.0,
+    max_bytes: int = 1 << 20,
+    max_redirects: int = 5,
+    ssl_context: Optional[ssl.SSLContext] = None,
+) -> FetchResult:
+    """
+    Descarga una URL con asyncio (GET HTTP/1.1, sin dependencias externas)
+
+    El tiempo hasta el primer byte se mide desde el inicio de la primera
+    peticion, incluyendo redirecciones.
+
+    Raises:
+        OSError, EOFError, asyncio.TimeoutError o ValueError si la descarga falla
+    """
+    start = time.perf_counter()
+    for _ in range(max_redirects + 1):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"Esquema no soportado: {parts.scheme}")
+        secure = parts.scheme == "https"
+        port = parts.port or (443 if secure else 80)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+
+        context = None
+        if secure:
+            context = ssl_context or ssl.create_default_context()
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(parts.hostname, port, ssl=context), timeout
+        )
+        try:
+            request = (
+                f"GET {path} HTTP/1.1\r\n"
+                f"Host: {parts.netloc}\r\n"
+                f"User-Agent: {USER_AGENT}\r\n"
+                "Accept: */*\r\n"
+                "Accept-Encoding: identity\r\n"
+                "Connection: close\r\n\r\n"
+            )
+            writer.write(request.encode("latin-1"))
+            await writer.drain()
+
+            status_line = await asyncio.wait_for(reader.readline(), timeout)
+            ttfb = time.perf_counter() - start
+            fields = status_line.decode("latin-1").split(None, 2)
+            if len(fields) < 2 or not fields[0].startswith("HTTP/"):
+                raise ValueError("Respuesta HTTP invalida")
+            status = int(fields[1])
+
+            headers = {}
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout)
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            if status in REDIRECT_CODES and "location" in headers:
+                url = urljoin(url, headers["location"])
+                continue
+
+            body = await asyncio.wait_for(
+                _read_body(reader, headers, max_bytes), timeout
+            )
+            return FetchResult(url, status, headers, body, ttfb)
+        finally:
+            writer.close()
+    raise ValueError("Demasiadas redirecciones")
+
+
+class ChannelProber:
+    """Comprueba streams con concurrencia global y por host acotadas"""
+
+    DEFAULT_CONCURRENCY = 200
+    DEFAULT_PER_HOST = 8
+    DEFAULT_TIMEOUT = 10.0
+    # Canales leidos por adelantado como maximo, repartidos en colas por host
+    MAX_QUEUED = 2000
+
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        per_host: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ):
+        self.concurrency = concurrency or self.DEFAULT_CONCURRENCY
+        self.per_host = per_host or self.DEFAULT_PER_HOST
+        self.timeout = timeout or self.DEFAULT_TIMEOUT
+
+    async def probe_one(self, instance: str, stream_url: str) -> ProbeResult:
+        """Descarga la lista de un canal y verifica que sea HLS valido"""
+        checked_at = time.time()
+        try:
+            result = await fetch(stream_url, self.timeout)
+        except (OSError, EOFError, asyncio.TimeoutError, ValueError) as e:
+            return ProbeResult(
+                instance, False, None, None, 0, str(e) or type(e).__name__, checked_at
+            )
+
+        ttfb_ms = result.ttfb * 1000.0
+        if result.status != 200:
+            return ProbeResult(
+                instance,
+                False,
+                result.status,
+                ttfb_ms,
+                0,
+                f"HTTP {result.status}",
+                checked_at,
+            )
+
+        text = result.body.decode("utf-8", errors="replace")
+        if not hls.is_playlist(text):
+            return ProbeResult(
+                instance,
+                False,
+                result.status,
+                ttfb_ms,
+                0,
+                "No es una lista HLS",
+                checked_at,
+            )
+
+        variants = len(hls.parse_master_playlist(text, result.url))
+        return ProbeResult(
+            instance, True, result.status, ttfb_ms, variants, None, checked_at
+        )
+
+    async def _probe_all(
+        self,
+        targets: Iterable[Tuple[str, str]],
+        on_result: Callable[[ProbeResult], None],
+    ) -> None:
+        """
+        Reparte los canales en colas por host y lanza los que tienen hueco
+
+        Un host lento o saturado solo retrasa su propia cola: las plazas
+        globales libres se dan a canales de otros hosts en lugar de quedar
+        esperando su turno en el host ocupado.
+        """
+        queues: Dict[str, deque] = {}
+        active: Dict[str, int] = defaultdict(int)
+        running: Dict[asyncio.Future, str] = {}
+        targets = iter(targets)
+        exhausted = False
+        queued = 0
+
+        while True:
+            while not exhausted and queued < self.MAX_QUEUED:
+                try:
+                    instance, stream_url = next(targets)
+                except StopIteration:
+                    exhausted = True
+                    break
+                host = urlsplit(stream_url).netloc
+                queues.setdefault(host, deque()).append((instance, stream_url))
+                queued += 1
+
+            for host in list(queues):
+                queue = queues[host]
+                while (
+                    queue
+                    and active[host] < self.per_host
+                    and len(running) < self.concurrency
+                ):
+                    instance, stream_url = queue.popleft()
+                    queued -= 1
+                    active[host] += 1
+                    task = asyncio.ensure_future(self.probe_one(instance, stream_url))
+                    running[task] = host
+                if not queue:
+                    del queues[host]
+
+            # Sin tareas en marcha tampoco quedan canales por lanzar
+            if not running:
+                return
+            done, _ = await asyncio.wait(
+                list(running), return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                active[running.pop(task)] -= 1
+                on_result(task.result())
+
+    def probe(
+        self,
+        targets: Iterable[Tuple[str, str]],
+        on_result: Optional[Callable[[ProbeResult], None]] = None,
+    ) -> List[ProbeResult]:
+        """
+        Comprueba todos los canales indicados
+
+        Args:
+            targets: Iterable de (instance, stream_url); se consume bajo demanda
+            on_result: Se llama con cada resultado en cuanto esta disponible.
+                Si se indica, los resultados no se acumulan en memoria.
+
+        Returns:
+            Los resultados, salvo que se haya indicado on_result
+        """
+        results = []
+        callback = on_result or results.append
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self._probe_all(targets, callback))
+        finally:
+            loop.close()
+        return results
+
+
+def probe_database(
+    db: ChannelDatabase, prober: Optional[ChannelProber] = None, batch_size: int = 500
+) -> Tuple[int, int]:
+    """
+    Comprueba todos los canales de la base de datos y guarda su estado
+
+    Returns:
+        Tupla (canales comprobados, canales accesibles)
+    """
+    prober = prober or ChannelProber()
+    pending = []
+    totals = [0, 0]
+
+    def on_result(result: ProbeResult) -> None:
+        totals[0] += 1
+        totals[1] += int(result.reachable)
+        pending.append(result)
+        if len(pending) >= batch_size:
+            db.record_stream_status(pending)
+            del pending[:]
+
+    targets = ((row[1], row[3]) for row in db.iter_channels())
+    prober.probe(targets, on_result)
+    if pending:
+        db.record_stream_status(pending)
+    return totals[0], totals[1]
+
+
+def main(argv=None) -> int:
+    """Punto de entrada de linea de comandos"""
+    parser = argparse.ArgumentParser(
+        description="Comprueba que los streams de los canales responden"
+    )
+    parser.add_argument("--db", dest="db_path", help="Ruta de la base de datos")
+    parser.add_argument(
+        "--concurrency", type=int, default=ChannelProber.DEFAULT_CONCURRENCY
+    )
+    parser.add_argument("--per-host", type=int, default=ChannelProber.DEFAULT_PER_HOST)
+    parser.add_argument("--timeout", type=float, default=ChannelProber.DEFAULT_TIMEOUT)
+    args = parser.parse_args(argv)
+
+    db = ChannelDatabase(args.db_path)
+    start = time.perf_counter()
+    try:
+        checked, reachable = probe_database(
+            db, ChannelProber(args.concurrency, args.per_host, args.timeout)
+        )
+    finally:
+        db.close()
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"Comprobados {checked} canales en {elapsed:.1f} s: "
+        f"{reachable} accesibles, {checked - reachable} caidos"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,587 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Proxy HLS local con cache compartida de segmentos
+
+Varios reproductores (de este equipo o de otros puestos de la LAN) pueden
+pedir el mismo canal a traves del proxy: cada lista y cada segmento se
+descarga del origen una sola vez y se sirve a todos desde una cache LRU en
+memoria, con un segundo nivel opcional en disco servido con sendfile.
+"""
+
+import argparse
+import http.client
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha1
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Iterable, List, NamedTuple, Optional, Set, Tuple
+from urllib.parse import parse_qs, quote, urljoin, urlsplit
+
+import hls
+from instrument import get_logger
+from net import HTTPClient
+
+log = get_logger("proxy")
+
+PLAYLIST_CONTENT_TYPE = "application/vnd.apple.mpegurl"
+_URI_ATTRIBUTE_RE = re.compile(r'URI="([^"]*)"')
+# Etiquetas cuyo atributo URI apunta a otra lista
+_PLAYLIST_TAGS = ("#EXT-X-MEDIA:", "#EXT-X-I-FRAME-STREAM-INF:")
+
+
+def proxy_url(base_url: str, route: str, upstream_url: str) -> str:
+    """URL del proxy para un recurso del origen"""
+    return f"{base_url}/{route}?url={quote(upstream_url, safe='')}"
+
+
+class CacheEntry(NamedTuple):
+    """Recurso cacheado: en memoria (data) o en disco (path)"""
+
+    content_type: str
+    size: int
+    data: Optional[bytes]
+    path: Optional[str]
+
+
+class UpstreamError(Exception):
+    """El origen respondio con error o no se pudo contactar"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class SegmentCache:
+    """
+    Cache LRU acotada por bytes con un nivel en memoria y otro en disco
+
+    Las entradas expulsadas de memoria pasan al disco (si hay directorio) y
+    las descargas concurrentes de la misma clave se unifican: el primer hilo
+    descarga y el resto espera su resultado.
+    """
+
+    def __init__(
+        self,
+        max_memory_bytes: int = 256 << 20,
+        disk_dir: Optional[str] = None,
+        max_disk_bytes: int = 1 << 30,
+    ):
+        self.max_memory_bytes = max_memory_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk = OrderedDict()
+        self._disk_bytes = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _lookup(self, key: str) -> Optional[CacheEntry]:
+        """Busca una entrada y la marca como usada (requiere el lock)"""
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            return entry
+        entry = self._disk.get(key)
+        if entry is not None and os.path.exists(entry.path):
+            self._disk.move_to_end(key)
+            return entry
+        return None
+
+    def _spill_to_disk(self, key: str, entry: CacheEntry) -> None:
+        """Mueve a disco una entrada expulsada de memoria (requiere el lock)"""
+        if not self.disk_dir or entry.size > self.max_disk_bytes:
+            return
+        path = os.path.join(self.disk_dir, sha1(key.encode("utf-8")).hexdigest())
+        try:
+            with open(path, "wb") as f:
+                f.write(entry.data)
+        except OSError:
+            return
+        self._disk[key] = CacheEntry(entry.content_type, entry.size, None, path)
+        self._disk_bytes += entry.size
+        while self._disk_bytes > self.max_disk_bytes and self._disk:
+            _, old = self._disk.popitem(last=False)
+            self._disk_bytes -= old.size
+            try:
+                os.remove(old.path)
+            except OSError:
+                pass
+
+    def _store(self, key: str, content_type: str, data: bytes) -> CacheEntry:
+        """Guarda una entrada en memoria expulsando las menos usadas"""
+        entry = CacheEntry(content_type, len(data), data, None)
+        with self._lock:
+            self._memory[key] = entry
+            self._memory_bytes += entry.size
+            while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+                old_key, old = self._memory.popitem(last=False)
+                self._memory_bytes -= old.size
+                self._spill_to_disk(old_key, old)
+        return entry
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """Busca una entrada sin descargarla"""
+        with self._lock:
+            return self._lookup(key)
+
+    def get_or_fetch(
+        self, key: str, fetch: Callable[[], Tuple[str, bytes]]
+    ) -> CacheEntry:
+        """
+        Retorna la entrada cacheada o la descarga una sola vez
+
+        Args:
+            key: Clave de la entrada (la URL del origen)
+            fetch: Funcion que retorna (content_type, datos)
+        """
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self.hits += 1
+                return entry
+            waiter = self._inflight.get(key)
+            owner = waiter is None
+            if owner:
+                waiter = self._inflight[key] = _Inflight()
+            else:
+                self.hits += 1
+
+        if not owner:
+            return waiter.wait()
+
+        self.misses += 1
+        try:
+            content_type, data = fetch()
+            entry = self._store(key, content_type, data)
+            waiter.set_result(entry)
+            return entry
+        except Exception as e:
+            waiter.set_error(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+
+class _Inflight:
+    """Descarga en curso que otros hilos pueden esperar"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._entry = None
+        self._error = None
+
+    def set_result(self, entry: CacheEntry) -> None:
+        self._entry = entry
+        self._event.set()
+
+    def set_error(self, error: Exception) -> None:
+        self._error = error
+        self._event.set()
+
+    def wait(self) -> CacheEntry:
+        self._event.wait()
+        if self._error is not None:
+            raise self._error
+        return self._entry
+
+
+class _PlaylistCache:
+    """Listas recientes con TTL corto y descarga unificada"""
+
+    MAX_ENTRIES = 1000
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _prune(self) -> None:
+        """Olvida las listas caducadas (requiere el lock)"""
+        now = time.monotonic()
+        for url in [u for u, (expires, _) in self._entries.items() if expires < now]:
+            self._entries.pop(url, None)
+            self._locks.pop(url, None)
+
+    def get_or_fetch(self, url: str, fetch: Callable[[], Tuple[str, str]]):
+        """Retorna (texto, url final) cacheados o los descarga una sola vez"""
+        with self._lock:
+            if len(self._locks) > self.MAX_ENTRIES:
+                self._prune()
+            url_lock = self._locks.setdefault(url, threading.Lock())
+        with url_lock:
+            entry = self._entries.get(url)
+            if entry is not None and time.monotonic() < entry[0]:
+                return entry[1]
+            result = fetch()
+            self._entries[url] = (time.monotonic() + self.ttl, result)
+            return result
+
+
+class HLSProxy:
+    """
+    Proxy HTTP que reescribe listas HLS y cachea los segmentos
+
+    Rutas:
+        /playlist?url=...  lista maestra o de medios (reescrita)
+        /segment?url=...   segmento, clave o inicializacion (cacheado)
+    """
+
+    DEFAULT_PREFETCH = 3
+    PLAYLIST_TTL = 1.0
+    # Un host desconocido vuelve a consultar la lista de canales como mucho
+    # con esta frecuencia (por si se importaron canales nuevos)
+    HOSTS_RELOAD_SECONDS = 60.0
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        cache: Optional[SegmentCache] = None,
+        prefetch: Optional[int] = None,
+        playlist_ttl: Optional[float] = None,
+        public_host: Optional[str] = None,
+        upstream_hosts: Optional[Callable[[], Iterable[str]]] = None,
+    ):
+        """
+        Args:
+            host: Interfaz de escucha ('0.0.0.0' para compartir en la LAN)
+            port: Puerto (0 elige uno libre)
+            cache: Cache de segmentos compartida
+            prefetch: Segmentos a descargar por adelantado
+            playlist_ttl: Segundos que se reutiliza una lista descargada
+            public_host: Host con el que los reproductores ven el proxy
+            upstream_hosts: Retorna los hosts de origen permitidos (los de la
+                lista de canales); sin ella el proxy descarga cualquier URL
+        """
+        self.cache = cache or SegmentCache()
+        self.prefetch_count = self.DEFAULT_PREFETCH if prefetch is None else prefetch
+        self.client = HTTPClient()
+        self._playlists = _PlaylistCache(playlist_ttl or self.PLAYLIST_TTL)
+        # segmento -> (segmentos de su lista, posicion)
+        self._segment_positions = {}
+        self._positions_lock = threading.Lock()
+        self._prefetcher = ThreadPoolExecutor(
+            max_workers=4, thread_name_prefix="hls-prefetch"
+        )
+        self._upstream_hosts = upstream_hosts
+        self._allowed_hosts: Optional[Set[str]] = None
+        # Hosts de segmentos y variantes de listas ya permitidas
+        self._discovered_hosts: Set[str] = set()
+        self._hosts_loaded_at = 0.0
+        self._hosts_lock = threading.Lock()
+
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        bound_host, bound_port = self.server.server_address[:2]
+        if public_host is None:
+            public_host = "127.0.0.1" if bound_host == "0.0.0.0" else bound_host
+        self.base_url = f"http://{public_host}:{bound_port}"
+        self._thread = None
+
+    def start(self) -> "HLSProxy":
+        """Empieza a atender peticiones en un hilo de fondo"""
+        self._thread = threading.Thread(
+            target=self.server.serve_forever, name="hls-proxy", daemon=True
+        )
+        self._thread.start()
+        log.info("Escuchando en %s", self.base_url)
+        return self
+
+    def url_for(self, stream_url: str) -> str:
+        """URL del proxy para un stream"""
+        return proxy_url(self.base_url, "playlist", stream_url)
+
+    def close(self) -> None:
+        """Detiene el servidor, el pool de precarga y las conexiones al origen"""
+        self.server.shutdown()
+        self.server.server_close()
+        self._prefetcher.shutdown(wait=False)
+        self.client.close()
+
+    def is_allowed(self, url: str) -> bool:
+        """
+        Indica si el proxy puede descargar una URL
+
+        Solo se sirven los hosts de la lista de canales y los que aparecen en
+        sus listas; si no, el proxy seria un relay abierto hacia cualquier
+        direccion alcanzable desde este equipo.
+        """
+        if self._upstream_hosts is None:
+            return True
+        host = urlsplit(url).hostname
+        with self._hosts_lock:
+            allowed = self._allowed_hosts
+            if allowed is not None and (
+                host in allowed or host in self._discovered_hosts
+            ):
+                return True
+            now = time.monotonic()
+            if (
+                allowed is None
+                or now - self._hosts_loaded_at > self.HOSTS_RELOAD_SECONDS
+            ):
+                allowed = self._allowed_hosts = set(self._upstream_hosts())
+                self._hosts_loaded_at = now
+            return host in allowed or host in self._discovered_hosts
+
+    def _allow_discovered(self, urls: Iterable[str]) -> None:
+        """Permite los hosts que referencia una lista ya permitida"""
+        if self._upstream_hosts is None:
+            return
+        hosts = {urlsplit(url).hostname for url in urls}
+        with self._hosts_lock:
+            self._discovered_hosts.update(hosts)
+
+    def _fetch_upstream(self, url: str):
+        """Descarga un recurso del origen"""
+        try:
+            response = self.client.get(url)
+        except (OSError, ValueError, http.client.HTTPException) as e:
+            raise UpstreamError(502, str(e))
+        if response.status != 200:
+            raise UpstreamError(response.status, f"HTTP {response.status}")
+        return response
+
+    def _fetch_playlist(self, url: str) -> Tuple[str, str]:
+        response = self._fetch_upstream(url)
+        return response.body.decode("utf-8", errors="replace"), response.url
+
+    def _fetch_segment(self, url: str) -> Tuple[str, bytes]:
+        response = self._fetch_upstream(url)
+        content_type = response.headers.get("content-type", "video/mp2t")
+        return content_type, response.body
+
+    def get_segment(self, url: str) -> CacheEntry:
+        """Segmento cacheado (lo descarga si hace falta)"""
+        entry = self.cache.get_or_fetch(url, lambda: self._fetch_segment(url))
+        self._prefetch_after(url)
+        return entry
+
+    def _prefetch(self, urls: List[str]) -> None:
+        """Descarga segmentos en segundo plano si no estan en cache"""
+        for url in urls:
+            if self.cache.get(url) is None:
+                self._prefetcher.submit(self._prefetch_one, url)
+
+    def _prefetch_one(self, url: str) -> None:
+        try:
+            self.cache.get_or_fetch(url, lambda: self._fetch_segment(url))
+        except UpstreamError:
+            pass
+
+    def _prefetch_after(self, url: str) -> None:
+        """Precarga los segmentos que siguen a uno recien pedido"""
+        with self._positions_lock:
+            position = self._segment_positions.get(url)
+        if position is None or not self.prefetch_count:
+            return
+        segments, index = position
+        self._prefetch(segments[index + 1 : index + 1 + self.prefetch_count])
+
+    def rewrite_playlist(
+        self, text: str, base_url: str, proxy_base: Optional[str] = None
+    ) -> str:
+        """
+        Reescribe una lista para que todas sus URIs pasen por el proxy
+
+        Las variantes y renditions apuntan a /playlist; segmentos, claves e
+        inicializaciones a /segment.
+
+        Args:
+            text: Lista original
+            base_url: URL final de la lista en el origen
+            proxy_base: URL del proxy tal como la ve el cliente
+        """
+        proxy_base = proxy_base or self.base_url
+        master = hls.is_master_playlist(text)
+        lines = []
+        segments = []
+        upstream = []
+
+        def rewrite_attribute(match, route):
+            absolute = urljoin(base_url, match.group(1))
+            upstream.append(absolute)
+            return 'URI="%s"' % proxy_url(proxy_base, route, absolute)
+
+        for raw_line in text.splitlines():
+            line = raw_line.strip()
+            if not line:
+                lines.append(line)
+            elif line.startswith("#"):
+                # Renditions y variantes I-frame son listas; claves y
+                # mapas de inicializacion, recursos binarios
+                route = "playlist" if line.startswith(_PLAYLIST_TAGS) else "segment"
+                lines.append(
+                    _URI_ATTRIBUTE_RE.sub(lambda m: rewrite_attribute(m, route), line)
+                )
+            else:
+                absolute = urljoin(base_url, line)
+                upstream.append(absolute)
+                if master:
+                    lines.append(proxy_url(proxy_base, "playlist", absolute))
+                else:
+                    segments.append(absolute)
+                    lines.append(proxy_url(proxy_base, "segment", absolute))
+
+        self._allow_discovered(upstream)
+        if segments:
+            self._register_segments(segments, live="#EXT-X-ENDLIST" not in text)
+        return "\n".join(lines) + "\n"
+
+    def _register_segments(self, segments: List[str], live: bool) -> None:
+        """Recuerda el orden de los segmentos e inicia la precarga inicial"""
+        with self._positions_lock:
+            for index, url in enumerate(segments):
+                self._segment_positions[url] = (segments, index)
+            # Acotar la memoria del indice en directos de larga duracion
+            while len(self._segment_positions) > 10000:
+                self._segment_positions.pop(next(iter(self._segment_positions)))
+        if self.prefetch_count:
+            # En directo el reproductor empieza cerca del final de la lista
+            if live:
+                self._prefetch(segments[-self.prefetch_count :])
+            else:
+                self._prefetch(segments[: self.prefetch_count])
+
+    def get_playlist(self, url: str, proxy_base: Optional[str] = None) -> str:
+        """Lista reescrita (descargada como mucho una vez por TTL)"""
+        text, final_url = self._playlists.get_or_fetch(
+            url, lambda: self._fetch_playlist(url)
+        )
+        return self.rewrite_playlist(text, final_url, proxy_base)
+
+    def _handler_class(self):
+        proxy = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                upstream = parse_qs(parts.query).get("url", [None])[0]
+                if upstream is None or parts.path not in ("/playlist", "/segment"):
+                    self.send_error(404)
+                    return
+                if not proxy.is_allowed(upstream):
+                    self.send_error(403, "Origen no permitido")
+                    return
+                # Los clientes de la LAN ven el proxy con el host que usaron
+                host = self.headers.get("Host")
+                proxy_base = f"http://{host}" if host else None
+                try:
+                    if parts.path == "/playlist":
+                        body = proxy.get_playlist(upstream, proxy_base)
+                        body = body.encode("utf-8")
+                        self._send_headers(PLAYLIST_CONTENT_TYPE, len(body))
+                        self.wfile.write(body)
+                    else:
+                        self._send_entry(proxy.get_segment(upstream))
+                except UpstreamError as e:
+                    self.send_error(e.status if e.status >= 400 else 502, str(e))
+                except FileNotFoundError:
+                    # Expulsado del disco mientras se servia
+                    self.send_error(503)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def _send_headers(self, content_type: str, length: int) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(length))
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+
+            def _send_entry(self, entry: CacheEntry) -> None:
+                if entry.data is not None:
+                    self._send_headers(entry.content_type, entry.size)
+                    self.wfile.write(entry.data)
+                    return
+                with open(entry.path, "rb") as f:
+                    self._send_headers(entry.content_type, entry.size)
+                    self.wfile.flush()
+                    # Copia directa archivo -> socket en el kernel (sendfile)
+                    self.connection.sendfile(f)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+class RemoteProxy:
+    """Proxy HLS compartido que se ejecuta en otro equipo de la LAN"""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+
+    def url_for(self, stream_url: str) -> str:
+        """URL del proxy remoto para un stream"""
+        return proxy_url(self.base_url, "playlist", stream_url)
+
+    def close(self) -> None:
+        """No hay nada que liberar en un proxy remoto"""
+        pass
+
+
+def main(argv=None) -> int:
+    """Ejecuta el proxy como servicio independiente para la LAN"""
+    parser = argparse.ArgumentParser(description="Proxy HLS con cache compartida")
+    parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="Interfaz de escucha (0.0.0.0 para compartir en la LAN)",
+    )
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--memory-mb", type=int, default=256)
+    parser.add_argument("--disk-dir", help="Directorio de la cache en disco")
+    parser.add_argument("--disk-mb", type=int, default=1024)
+    parser.add_argument("--prefetch", type=int, default=HLSProxy.DEFAULT_PREFETCH)
+    parser.add_argument(
+        "--db", dest="db_path", help="Base de datos con los origenes permitidos"
+    )
+    parser.add_argument(
+        "--any-upstream",
+        action="store_true",
+        help="Permite cualquier origen, no solo los de la lista de canales",
+    )
+    args = parser.parse_args(argv)
+
+    db = None
+    upstream_hosts = None
+    if not args.any_upstream:
+        from database import ChannelDatabase
+
+        db = ChannelDatabase(args.db_path)
+        upstream_hosts = db.get_stream_hosts
+    cache = SegmentCache(args.memory_mb << 20, args.disk_dir, args.disk_mb << 20)
+    proxy = HLSProxy(
+        args.host, args.port, cache, args.prefetch, upstream_hosts=upstream_hosts
+    )
+    print(f"Escuchando en {args.host}:{args.port}")
+    try:
+        proxy.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        proxy.server.server_close()
+        proxy.client.close()
+        if db is not None:
+            db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Cache de filas por bloques - Mantiene en memoria solo una ventana de filas
+
+Las filas de una lista ordenada se piden a la base de datos en bloques de
+tamaño fijo y se guardan en una LRU acotada, de modo que la memoria no
+depende del tamaño del catalogo sino de cuanto se ha desplazado el usuario.
+
+get descarga el bloque que falta en el acto; para no bloquear el hilo de GTK
+se puede usar get_cached y cargar el bloque aparte con load y store.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+# fetch(offset, limit, after) -> filas; after es la clave de la fila previa
+FetchFunc = Callable[[int, int, Optional[str]], List[Tuple]]
+
+
+class RowCache:
+    """LRU de bloques de filas consecutivas"""
+
+    BLOCK_SIZE = 100
+    MAX_BLOCKS = 20
+
+    def __init__(
+        self,
+        fetch: FetchFunc,
+        block_size: Optional[int] = None,
+        max_blocks: Optional[int] = None,
+    ):
+        self.fetch = fetch
+        self.block_size = block_size or self.BLOCK_SIZE
+        self.max_blocks = max_blocks or self.MAX_BLOCKS
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()
+        self.fetches = 0
+
+    def block_of(self, index: int) -> int:
+        """Numero del bloque que contiene la fila index"""
+        return index // self.block_size
+
+    def load(self, number: int) -> List[Tuple]:
+        """
+        Descarga un bloque sin guardarlo, continuando tras el anterior si esta
+        en cache
+
+        No retiene el cerrojo durante la consulta: se puede llamar desde un
+        hilo del pool mientras el hilo de GTK sigue leyendo filas cacheadas.
+        """
+        with self._lock:
+            previous = self._blocks.get(number - 1)
+        after = previous[-1][0] if previous else None
+        rows = [
+            tuple(row)
+            for row in self.fetch(number * self.block_size, self.block_size, after)
+        ]
+        self.fetches += 1
+        return rows
+
+    def store(self, number: int, rows: List[Tuple]) -> None:
+        """Guarda un bloque descargado y expulsa los menos usados"""
+        with self._lock:
+            self._blocks[number] = rows
+            self._blocks.move_to_end(number)
+            while len(self._blocks) > self.max_blocks:
+                self._blocks.popitem(last=False)
+
+    def get_cached(self, index: int) -> Optional[Tuple]:
+        """Fila en la posicion index si su bloque esta en memoria, sin consultar"""
+        number, position = divmod(index, self.block_size)
+        with self._lock:
+            block = self._blocks.get(number)
+            if block is None:
+                return None
+            self._blocks.move_to_end(number)
+        if position < len(block):
+            return block[position]
+        return None
+
+    def get(self, index: int) -> Optional[Tuple]:
+        """Fila en la posicion index, o None si esta fuera de la lista"""
+        number, position = divmod(index, self.block_size)
+        with self._lock:
+            block = self._blocks.get(number)
+            if block is not None:
+                self._blocks.move_to_end(number)
+        if block is None:
+            block = self.load(number)
+            self.store(number, block)
+        if position < len(block):
+            return block[position]
+        return None
+
+    def cached_rows(self) -> int:
+        """Numero de filas residentes en memoria"""
+        with self._lock:
+            return sum(len(block) for block in self._blocks.values())
+
+    def resident_rows(self) -> List[Tuple]:
+        """Filas de los bloques en memoria, sin consultar ni cambiar su orden LRU"""
+        with self._lock:
+            return [row for block in self._blocks.values() for row in block]
+
+    def clear(self) -> None:
+        """Descarta todos los bloques"""
+        with self._lock:
+            self._blocks.clear()
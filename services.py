@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Servicios de la aplicacion - Componentes de VerTele que no dependen de GTK
+
+VerTeleApp los crea al arrancar; separarlos de la interfaz permite medir y
+probar ese arranque sin pantalla.
+"""
+
+import os
+from typing import Callable, Optional
+
+from database import ChannelDatabase
+from instrument import get_logger, span
+from logos import LogoLoader
+from mirrors import MirrorSelector
+from preresolve import PlaylistResolver, VariantPolicy
+from proxy import HLSProxy, RemoteProxy, SegmentCache
+from tasks import TaskRunner
+
+log = get_logger("services")
+
+
+class AppServices:
+    """Base de datos, pool de tareas, pre-resolucion, proxy HLS y logos"""
+
+    PLAYER_BACKEND_SETTING = "player_backend"
+    MAX_HEIGHT_SETTING = "max_variant_height"
+    MAX_BANDWIDTH_SETTING = "max_variant_bandwidth"
+    # "host:puerto" donde escucha el proxy HLS local ("0.0.0.0:8765" para la LAN)
+    PROXY_LISTEN_SETTING = "proxy_listen"
+    # URL de un proxy HLS compartido en otro equipo
+    PROXY_URL_SETTING = "proxy_url"
+
+    def __init__(self, db_path: Optional[str], dispatch: Callable):
+        """
+        Args:
+            db_path: Ruta de la base de datos (None para la de por defecto)
+            dispatch: Entrega los resultados de las tareas al hilo principal
+                (GLib.idle_add en la aplicacion)
+        """
+        with span("startup.db_open"):
+            self.db = ChannelDatabase(db_path)
+        self.mirrors = MirrorSelector(self.db)
+        # Todo el trabajo bloqueante sale del hilo principal
+        self.tasks = TaskRunner(dispatch=dispatch)
+        self.resolver = PlaylistResolver(self._variant_policy())
+        self.proxy = self._init_proxy()
+        self.logos = LogoLoader(
+            os.path.join(self._cache_dir(), "logos"), dispatch=dispatch
+        )
+
+    def _variant_policy(self) -> VariantPolicy:
+        """Política de variantes HLS según las preferencias guardadas"""
+        max_height = self.db.get_setting(self.MAX_HEIGHT_SETTING)
+        max_bandwidth = self.db.get_setting(self.MAX_BANDWIDTH_SETTING)
+        return VariantPolicy(
+            max_bandwidth=int(max_bandwidth) if max_bandwidth else None,
+            max_height=int(max_height) if max_height else None,
+        )
+
+    @staticmethod
+    def _cache_dir() -> str:
+        """Directorio de cache de la aplicación (XDG_CACHE_HOME/vertele)"""
+        cache_dir = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+            os.path.expanduser("~"), ".cache"
+        )
+        return os.path.join(cache_dir, "vertele")
+
+    def _init_proxy(self):
+        """Crea el proxy HLS si está configurado en las preferencias"""
+        remote_url = self.db.get_setting(self.PROXY_URL_SETTING)
+        if remote_url:
+            return RemoteProxy(remote_url)
+
+        listen = self.db.get_setting(self.PROXY_LISTEN_SETTING)
+        if not listen:
+            return None
+        host, _, port = listen.rpartition(":")
+        cache = SegmentCache(disk_dir=os.path.join(self._cache_dir(), "segments"))
+        try:
+            return HLSProxy(
+                host or "127.0.0.1",
+                int(port),
+                cache,
+                upstream_hosts=self.db.get_stream_hosts,
+            ).start()
+        except (OSError, ValueError) as e:
+            log.warning("No se pudo iniciar el proxy en %s: %s", listen, e)
+            return None
+
+    def close(self) -> None:
+        """Detiene los hilos de trabajo, la pre-resolución y el proxy"""
+        self.tasks.shutdown()
+        self.logos.close()
+        self.resolver.close()
+        if self.proxy is not None:
+            self.proxy.close()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Sincronizacion de proveedores - Actualiza los canales de listas M3U remotas
+
+Cada lista se descarga con una peticion condicional (If-None-Match /
+If-Modified-Since): si el proveedor responde 304, o el cuerpo es identico al
+de la ultima vez, no se escribe nada en la tabla de canales. Si cambio, se
+compara el hash de cada canal con el guardado y solo se insertan, modifican
+o eliminan las filas afectadas, todo en una unica transaccion.
+"""
+
+import argparse
+import hashlib
+import http.client
+import sys
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from database import ChannelDatabase
+from importer import ChannelKeys, parse_m3u
+from instrument import get_logger, span
+from net import HTTPClient
+
+log = get_logger("sync")
+
+
+class SyncResult(NamedTuple):
+    """Resultado de sincronizar una lista"""
+
+    url: str
+    changed: bool
+    inserted: int
+    updated: int
+    deleted: int
+    seconds: float
+    # Instancias que ya pertenecen a otro canal (importado o de otra lista)
+    skipped: Tuple[str, ...] = ()
+
+
+def channel_hash(row: Tuple, mirrors: List[str]) -> str:
+    """Hash del contenido de un canal (fila de channels y sus espejos)"""
+    digest = hashlib.sha1()
+    for value in tuple(row) + tuple(mirrors):
+        digest.update(("" if value is None else str(value)).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def diff_playlist(
+    text: str, existing: Dict[str, str]
+) -> Tuple[List[Tuple], List[Tuple], List[str], Dict[str, List[str]]]:
+    """
+    Compara una lista M3U con los canales guardados de la misma lista
+
+    Args:
+        text: Contenido de la lista
+        existing: instance -> content_hash de los canales guardados
+
+    Returns:
+        (inserts, updates, deletes, mirrors) listos para
+        ChannelDatabase.apply_source_diff
+    """
+    keys = ChannelKeys()
+    rows: Dict[str, Tuple] = {}
+    urls: Dict[str, List[str]] = {}
+    for entry in parse_m3u(text.splitlines()):
+        instance, repeated = keys.assign(entry)
+        if repeated:
+            # Las repeticiones de un canal son espejos, como en el importador
+            if entry["stream_url"] not in urls[instance]:
+                urls[instance].append(entry["stream_url"])
+            continue
+        rows[instance] = (
+            entry["title"],
+            instance,
+            entry["page_url"],
+            entry["stream_url"],
+            entry["category"],
+            entry["logo"] or None,
+        )
+        urls[instance] = [entry["stream_url"]]
+
+    inserts = []
+    updates = []
+    mirrors = {}
+    for instance, row in rows.items():
+        content_hash = channel_hash(row, urls[instance][1:])
+        old_hash = existing.get(instance)
+        if old_hash == content_hash:
+            continue
+        if old_hash is None:
+            inserts.append(row + (content_hash,))
+            if len(urls[instance]) > 1:
+                mirrors[instance] = urls[instance]
+        else:
+            updates.append(row + (content_hash,))
+            mirrors[instance] = urls[instance]
+    deletes = [instance for instance in existing if instance not in rows]
+    return inserts, updates, deletes, mirrors
+
+
+class ProviderSync:
+    """Sincroniza listas de proveedores con la base de datos"""
+
+    def __init__(self, db: ChannelDatabase, client: Optional[HTTPClient] = None):
+        self.db = db
+        self.client = client or HTTPClient()
+
+    def sync(self, url: str, now: Optional[float] = None) -> SyncResult:
+        """
+        Sincroniza una lista
+
+        Raises:
+            OSError, http.client.HTTPException o ValueError si la descarga
+            falla o el proveedor responde con un error
+        """
+        start = time.perf_counter()
+        now = time.time() if now is None else now
+        previous = self.db.get_provider_source(url)
+        etag, last_modified, body_hash = previous[:3] if previous else (None,) * 3
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        with span("sync.fetch", url=url):
+            response = self.client.get(url, headers)
+        if response.status == 304:
+            log.debug("%s sin cambios (304)", url)
+            return SyncResult(url, False, 0, 0, 0, time.perf_counter() - start)
+        if response.status != 200:
+            raise OSError(f"HTTP {response.status} al descargar {url}")
+
+        validators = (
+            response.headers.get("etag"),
+            response.headers.get("last-modified"),
+            hashlib.sha1(response.body).hexdigest(),
+            now,
+        )
+        if validators[2] == body_hash:
+            # Proveedor sin validadores (o que los cambia sin motivo)
+            log.debug("%s sin cambios (mismo contenido)", url)
+            self.db.set_provider_source(url, *validators)
+            return SyncResult(url, False, 0, 0, 0, time.perf_counter() - start)
+
+        with span("sync.diff", url=url):
+            inserts, updates, deletes, mirrors = diff_playlist(
+                response.body.decode("utf-8-sig", errors="replace"),
+                self.db.get_source_hashes(url),
+            )
+        inserted, updated, deleted, skipped = self.db.apply_source_diff(
+            url, inserts, updates, deletes, mirrors, validators
+        )
+        if skipped:
+            log.warning(
+                "%s: %d canales omitidos porque ya existen en otra lista: %s",
+                url,
+                len(skipped),
+                ", ".join(skipped[:10]),
+            )
+        log.info(
+            "%s: %d nuevos, %d modificados, %d eliminados",
+            url,
+            inserted,
+            updated,
+            deleted,
+        )
+        return SyncResult(
+            url,
+            True,
+            inserted,
+            updated,
+            deleted,
+            time.perf_counter() - start,
+            tuple(skipped),
+        )
+
+    def close(self) -> None:
+        """Cierra las conexiones HTTP"""
+        self.client.close()
+
+
+def sync_sources(db: ChannelDatabase, urls: Optional[List[str]] = None) -> int:
+    """
+    Sincroniza las listas indicadas (o todas las conocidas) e informa
+
+    Returns:
+        Codigo de salida: 1 si alguna lista fallo
+    """
+    syncer = ProviderSync(db)
+    status = 0
+    try:
+        for url in urls or db.get_provider_sources():
+            try:
+                result = syncer.sync(url)
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                print(f"Error al sincronizar {url}: {e}", file=sys.stderr)
+                status = 1
+                continue
+            if not result.changed:
+                print(f"{url}: sin cambios ({result.seconds * 1000:.0f} ms)")
+            else:
+                print(
+                    f"{url}: {result.inserted} nuevos, {result.updated} modificados, "
+                    f"{result.deleted} eliminados, {len(result.skipped)} omitidos "
+                    f"en {result.seconds:.2f} s"
+                )
+    finally:
+        syncer.close()
+    return status
+
+
+def main(argv=None) -> int:
+    """Punto de entrada de linea de comandos"""
+    parser = argparse.ArgumentParser(
+        description="Sincroniza listas M3U de proveedores con la base de datos de VerTele"
+    )
+    parser.add_argument(
+        "urls", nargs="*", help="URLs de las listas (por defecto, las ya conocidas)"
+    )
+    parser.add_argument("--db", dest="db_path", help="Ruta de la base de datos")
+    args = parser.parse_args(argv)
+
+    db = ChannelDatabase(args.db_path)
+    try:
+        return sync_sources(db, args.urls)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
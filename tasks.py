@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tareas en segundo plano - Saca del hilo de GTK todo el trabajo bloqueante
+
+Las funciones se ejecutan en un pool de hilos y sus resultados se entregan
+en el bucle principal mediante un despachador (GLib.idle_add en la
+aplicacion), de modo que los callbacks pueden tocar widgets sin riesgo.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from instrument import get_logger
+
+log = get_logger("tasks")
+
+
+def _glib_dispatch(callback: Callable, *args) -> None:
+    """Despachador por defecto: ejecuta el callback en el bucle de GLib"""
+    from gi.repository import GLib
+
+    GLib.idle_add(callback, *args)
+
+
+class Task:
+    """Tarea enviada a un TaskRunner"""
+
+    def __init__(
+        self,
+        func: Callable,
+        args: tuple,
+        key: Optional[str],
+        on_done: Optional[Callable],
+        on_error: Optional[Callable],
+    ):
+        self.func = func
+        self.args = args
+        self.key = key
+        self.on_done = on_done
+        self.on_error = on_error
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        """
+        Cancela la tarea
+
+        Si aun no empezo no se ejecuta; si ya esta en marcha termina igual,
+        pero su resultado se descarta.
+        """
+        self.cancelled = True
+
+
+class TaskRunner:
+    """
+    Pool de hilos con entrega de resultados en el bucle principal
+
+    Las tareas con la misma clave se ejecutan de una en una y solo cuenta la
+    ultima: enviar una tarea nueva descarta el resultado de la que esta en
+    marcha y sustituye a la que estuviera esperando turno.
+    """
+
+    DEFAULT_WORKERS = 4
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        dispatch: Optional[Callable] = None,
+    ):
+        """
+        Args:
+            max_workers: Hilos del pool
+            dispatch: Funcion dispatch(callback, *args) que ejecuta el callback
+                en el hilo principal (GLib.idle_add por defecto)
+        """
+        self.dispatch = dispatch or _glib_dispatch
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or self.DEFAULT_WORKERS,
+            thread_name_prefix="tasks",
+        )
+        self._lock = threading.Lock()
+        # Clave -> tarea en ejecucion / tarea esperando turno / ultima enviada
+        self._running: Dict[str, Task] = {}
+        self._queued: Dict[str, Task] = {}
+        self._latest: Dict[str, Task] = {}
+
+    def submit(
+        self,
+        func: Callable,
+        *args,
+        key: Optional[str] = None,
+        on_done: Optional[Callable] = None,
+        on_error: Optional[Callable] = None,
+    ) -> Task:
+        """
+        Ejecuta func(*args) en segundo plano
+
+        Args:
+            key: Agrupa tareas que se sustituyen entre si (por ejemplo "zap")
+            on_done: Recibe el resultado en el hilo principal
+            on_error: Recibe la excepcion en el hilo principal
+
+        Returns:
+            La tarea, que se puede cancelar
+        """
+        task = Task(func, args, key, on_done, on_error)
+        with self._lock:
+            if key is None:
+                self._start(task)
+                return task
+
+            previous = self._latest.get(key)
+            if previous is not None:
+                previous.cancel()
+            self._latest[key] = task
+
+            if key in self._running:
+                self._queued[key] = task
+            else:
+                self._running[key] = task
+                self._start(task)
+        return task
+
+    def _start(self, task: Task) -> None:
+        self._executor.submit(self._run, task)
+
+    def _run(self, task: Task) -> None:
+        """Ejecuta una tarea en un hilo del pool"""
+        try:
+            if task.cancelled:
+                return
+            try:
+                result = task.func(*task.args)
+            except Exception as e:
+                self.dispatch(self._deliver, task, task.on_error, e)
+            else:
+                self.dispatch(self._deliver, task, task.on_done, result)
+        finally:
+            self._finished(task)
+
+    def _finished(self, task: Task) -> None:
+        """Da paso a la siguiente tarea de la misma clave"""
+        if task.key is None:
+            return
+        with self._lock:
+            if self._running.get(task.key) is not task:
+                return
+            following = self._queued.pop(task.key, None)
+            if following is None or following.cancelled:
+                del self._running[task.key]
+                latest = self._latest.get(task.key)
+                if latest is not None and (latest is task or latest.cancelled):
+                    del self._latest[task.key]
+                return
+            self._running[task.key] = following
+            self._start(following)
+
+    def _deliver(self, task: Task, callback: Optional[Callable], value) -> bool:
+        """Entrega el resultado en el hilo principal si sigue vigente"""
+        if task.cancelled:
+            return False
+        if callback is not None:
+            callback(value)
+        elif isinstance(value, Exception):
+            log.error(
+                "Error en tarea %s",
+                task.key or task.func,
+                exc_info=(type(value), value, value.__traceback__),
+            )
+        return False
+
+    def shutdown(self) -> None:
+        """Cancela las tareas pendientes y detiene el pool sin esperar"""
+        with self._lock:
+            for task in list(self._latest.values()):
+                task.cancel()
+        self._executor.shutdown(wait=False)
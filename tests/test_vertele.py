@@ -9,7 +9,31 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from database import ChannelDatabase
-from player import StreamPlayer, ChannelNotFoundException
+from player import (
+    StreamPlayer,
+    ChannelNotFoundException,
+    PlayerCache,
+    VLCRemoteSession,
+    MPVIPCSession,
+    ProcessSupervisor,
+    PlayerLimitError,
+    backend_for_executable,
+    ordered_backends,
+)
+from epg import import_xmltv, parse_xmltv, parse_xmltv_time
+from importer import import_playlist, make_instance, parse_m3u
+from ipc import InstanceRunningError, InstanceServer, send_request
+from prober import ChannelProber, probe_database
+from preresolve import PlaylistResolver, VariantPolicy
+from proxy import HLSProxy, SegmentCache, proxy_url
+from logos import LogoDiskCache, LogoLoader
+from mirrors import MirrorRacer, MirrorSelector
+from sync import ProviderSync
+from rowcache import RowCache
+from services import AppServices
+from tasks import TaskRunner
+import instrument
+from benchmarks.zap_benchmark import find_regressions, percentile, run_benchmark
 
 
 class TestChannelDatabase:
@@ -45,6 +69,216 @@ class TestChannelDatabase:
         assert "Big Buck Bunny" in channel[0]
         db.close()
 
+    def test_migrations_set_schema_version(self, tmp_path):
+        """Prueba que las migraciones se aplican una vez y son incrementales"""
+        import database
+
+        path = str(tmp_path / "canales.db")
+        db = ChannelDatabase(path)
+        assert db.get_schema_version() == database.SCHEMA_VERSION
+        db.close()
+
+        # Simular una base antigua: solo la tabla de canales (v1)
+        legacy = str(tmp_path / "antigua.db")
+        import sqlite3
+
+        conn = sqlite3.connect(legacy)
+        database._migration_channels(conn.cursor())
+        conn.execute(
+            "INSERT INTO channels (title, instance, stream_url) VALUES ('Antiguo', 'antiguo', 'http://x')"
+        )
+        conn.execute("PRAGMA user_version = 1")
+        conn.commit()
+        conn.close()
+
+        db = ChannelDatabase(legacy)
+        assert db.get_schema_version() == database.SCHEMA_VERSION
+        assert db.get_channel_count() == 1
+        assert db.search("antig")[0][1] == "antiguo"
+        db.close()
+
+    def test_warm_start_does_not_write(self, tmp_path, monkeypatch):
+        """Prueba que abrir una base de datos al dia no ejecuta DDL ni commits"""
+        import sqlite3
+
+        statements = []
+        connect = sqlite3.connect
+
+        def traced_connect(*args, **kwargs):
+            conn = connect(*args, **kwargs)
+            conn.set_trace_callback(statements.append)
+            return conn
+
+        monkeypatch.setattr(sqlite3, "connect", traced_connect)
+        path = str(tmp_path / "canales.db")
+
+        # Base nueva: esquema y canales de ejemplo en una sola transaccion
+        db = ChannelDatabase(path)
+        assert db.get_channel_count() > 0
+        db.close()
+        assert [s for s in statements if s.startswith("COMMIT")] == ["COMMIT"]
+
+        del statements[:]
+        db = ChannelDatabase(path)
+        db.close()
+        writes = [
+            s
+            for s in statements
+            if s.split()[0].upper() in ("BEGIN", "COMMIT", "INSERT", "CREATE")
+        ]
+        assert writes == []
+        assert [s for s in statements if "user_version" in s] == ["PRAGMA user_version"]
+
+    def test_query_plans_use_indexes(self):
+        """Prueba que las consultas frecuentes usan sus indices sin ordenar"""
+        db = ChannelDatabase(":memory:")
+        assert db.verify_query_plans() == []
+        db.close()
+
+    def test_instance_plan_accepts_any_autoindex(self, tmp_path):
+        """Prueba que el plan por instancia vale con otro orden de columnas UNIQUE"""
+        import sqlite3
+
+        path = str(tmp_path / "canales.db")
+        conn = sqlite3.connect(path)
+        conn.execute(
+            "CREATE TABLE channels (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "instance TEXT NOT NULL UNIQUE, title TEXT NOT NULL UNIQUE, "
+            "page_url TEXT, stream_url TEXT NOT NULL, category TEXT DEFAULT 'General')"
+        )
+        conn.close()
+        db = ChannelDatabase(path)
+        plan = db.explain_query_plan(
+            "SELECT title FROM channels WHERE instance = ?", ("canal",)
+        )
+        assert "sqlite_autoindex_channels_1 (instance=?)" in plan[0]
+        assert db.verify_query_plans() == []
+        db.close()
+
+    def test_keyset_pagination(self):
+        """Prueba que las paginas cubren todos los canales sin repetir"""
+        db = ChannelDatabase(":memory:")
+        db.bulk_insert_channels(
+            (f"Canal {i:03d}", f"canal{i}", None, f"http://x/{i}.m3u8", "Test")
+            for i in range(25)
+        )
+        rows, cursor = db.get_channels_page("Test", limit=10)
+        assert len(rows) == 10
+        assert cursor == "Canal 009"
+
+        pages = list(db.iter_channel_pages("Test", page_size=10))
+        assert [len(page) for page in pages] == [10, 10, 5]
+
+        titles = [row[0] for row in db.iter_channels(page_size=4)]
+        assert titles == [row[0] for row in db.get_all_channels()]
+        assert len(set(titles)) == len(titles)
+        db.close()
+
+    def test_categories_include_imported(self):
+        """Prueba que las categorias salen de la columna category"""
+        db = ChannelDatabase(":memory:")
+        db.bulk_insert_channels(
+            [("Canal Nuevo", "canalnuevo", None, "http://x/n.m3u8", "Noticias")]
+        )
+        categories = db.get_categories()
+        assert "Noticias" in categories
+        assert "Peliculas" in categories
+        assert categories == sorted(set(categories))
+        db.close()
+
+    def test_reads_not_blocked_by_write_transaction(self, tmp_path):
+        """Prueba que un hilo puede leer mientras otro mantiene una escritura abierta"""
+        import threading
+
+        db = ChannelDatabase(str(tmp_path / "canales.db"))
+        count = db.get_channel_count()
+        writing = threading.Event()
+        release = threading.Event()
+
+        def slow_import():
+            with db.connections.transaction() as conn:
+                conn.execute(
+                    "INSERT INTO channels (title, instance, stream_url) VALUES ('Nuevo', 'nuevo', 'http://x')"
+                )
+                writing.set()
+                release.wait(5)
+
+        worker = threading.Thread(target=slow_import)
+        worker.start()
+        assert writing.wait(5)
+        try:
+            # El lector ve la ultima version confirmada sin esperar al escritor
+            assert db.get_channel_count() == count
+            assert db.get_channel_by_instance("bigbuckbunny") is not None
+        finally:
+            release.set()
+            worker.join()
+        assert db.get_channel_count() == count + 1
+        db.close()
+
+    def test_thread_readers_are_closed(self, tmp_path):
+        """Prueba que las lectoras de hilos terminados no quedan abiertas"""
+        import gc
+        import threading
+
+        db = ChannelDatabase(str(tmp_path / "canales.db"))
+        # La del hilo principal sigue abierta hasta close()
+        main_readers = len(db.connections._readers)
+        threads = [
+            threading.Thread(target=db.get_channel_by_instance, args=("canal13",))
+            for _ in range(50)
+        ]
+        for thread in threads:
+            thread.start()
+            thread.join()
+        gc.collect()
+        assert len(db.connections._readers) == main_readers
+
+        # Una lectora viva se cierra desde otro hilo sin errores
+        started = threading.Event()
+        release = threading.Event()
+
+        def reader():
+            db.get_channel_by_instance("canal13")
+            started.set()
+            release.wait(5)
+
+        worker = threading.Thread(target=reader)
+        worker.start()
+        started.wait(5)
+        assert len(db.connections._readers) == main_readers + 1
+        db.close()
+        release.set()
+        worker.join()
+        assert len(db.connections._readers) == 0
+
+    def test_search_prefix_and_accents(self):
+        """Prueba la busqueda por prefijo, sin tildes y por categoria"""
+        db = ChannelDatabase(":memory:")
+        db.bulk_insert_channels(
+            [("Canal Económico", "economico", None, "http://x/1.m3u8", "Noticias")]
+        )
+        results = db.search("econ")
+        assert results[0][1] == "economico"
+        assert db.search("ECONÓ")[0][1] == "economico"
+        assert db.search("bunn")[0][0] == "Big Buck Bunny"
+        assert len(db.search("peliculas")) == 5
+        assert db.search("   ") == []
+        db.close()
+
+    def test_search_ranks_title_first(self):
+        """Prueba que una coincidencia en el titulo pesa mas que en la categoria"""
+        db = ChannelDatabase(":memory:")
+        db.bulk_insert_channels(
+            [
+                ("Noticias 24", "noticias24", None, "http://x/1.m3u8", "General"),
+                ("Canal A", "canala", None, "http://x/2.m3u8", "Noticias"),
+            ]
+        )
+        results = db.search("noticias")
+        assert [row[1] for row in results] == ["noticias24", "canala"]
+        db.close()
+
 
 class TestStreamPlayer:
     """Tests para el módulo de reproductor"""
@@ -73,6 +307,1957 @@ class TestStreamPlayer:
         PlayerClass = pl.StreamPlayer
         assert PlayerClass is not None
 
+    def test_backends_with_remote_control_and_gui_first(self):
+        """Prueba que la deteccion prefiere control remoto e interfaz a la rapidez"""
+        assert [b.name for b in ordered_backends()] == ["mpv", "vlc", "cvlc", "ffplay"]
+        assert [b.name for b in ordered_backends("ffplay")][:2] == ["ffplay", "mpv"]
+
+    @staticmethod
+    def _fake_player(tmp_path, name="vlc"):
+        """Crea un ejecutable falso que responde a --version"""
+        path = tmp_path / name
+        path.write_text("#!/bin/sh\necho 'VLC media player 3.0.0'\n")
+        path.chmod(0o755)
+        return str(path)
+
+    def test_detection_warm_cache_spawns_no_processes(self, tmp_path, monkeypatch):
+        """Prueba que con la cache caliente no se lanza ningun subproceso"""
+        import player as pl
+
+        executable = self._fake_player(tmp_path)
+        cache_path = str(tmp_path / "cache" / "players.json")
+
+        cold = StreamPlayer(candidates=[executable], cache=PlayerCache(cache_path))
+        assert cold.player_executable == executable
+
+        def fail_run(*args, **kwargs):
+            raise AssertionError("no deberia lanzar procesos con la cache caliente")
+
+        monkeypatch.setattr(pl.subprocess, "run", fail_run)
+        warm = StreamPlayer(candidates=[executable], cache=PlayerCache(cache_path))
+        assert warm.player_executable == executable
+
+    def test_detection_reprobes_changed_binary(self, tmp_path):
+        """Prueba que un binario modificado se vuelve a validar"""
+        executable = self._fake_player(tmp_path)
+        cache = PlayerCache(str(tmp_path / "players.json"))
+        StreamPlayer(candidates=[executable], cache=cache)
+        assert cache.lookup(executable) is True
+
+        with open(executable, "w") as f:
+            f.write("#!/bin/sh\nexit 1\n")
+        assert cache.lookup(executable) is None
+        with pytest.raises(RuntimeError):
+            StreamPlayer(candidates=[executable], cache=cache)
+        assert cache.lookup(executable) is False
+
+    def test_backend_selection_prefers_fastest(self, tmp_path, monkeypatch):
+        """Prueba que se elige el backend mas rapido salvo preferencia del usuario"""
+        bin_dir = tmp_path / "bin"
+        bin_dir.mkdir()
+        vlc = self._fake_player(bin_dir, "vlc")
+        mpv = self._fake_player(bin_dir, "mpv")
+        monkeypatch.setenv("PATH", str(bin_dir))
+        cache = PlayerCache(str(tmp_path / "players.json"))
+
+        fastest = StreamPlayer(cache=cache)
+        assert fastest.backend.name == "mpv"
+        assert fastest.player_executable == mpv
+
+        db = ChannelDatabase(":memory:")
+        db.set_setting("player_backend", "vlc")
+        preferred = StreamPlayer(
+            cache=cache, preferred_backend=db.get_setting("player_backend")
+        )
+        assert preferred.backend.name == "vlc"
+        assert preferred.player_executable == vlc
+        db.close()
+
+    def test_backend_command_lines(self):
+        """Prueba que cada backend usa sus propias opciones de titulo"""
+        assert backend_for_executable("/usr/bin/cvlc").name == "cvlc"
+        mpv = backend_for_executable("/usr/bin/mpv")
+        assert mpv.supports_remote_control
+        assert mpv.build_command("mpv", "Canal", "http://x") == [
+            "mpv",
+            "--force-media-title=Canal",
+            "http://x",
+        ]
+        ffplay = backend_for_executable("ffplay")
+        assert not ffplay.supports_remote_control
+        assert "--meta-title=Canal" not in ffplay.build_command("ffplay", "Canal", "u")
+
+
+class TestImporter:
+    """Tests para el importador de listas M3U"""
+
+    PLAYLIST = [
+        "#EXTM3U",
+        '#EXTINF:-1 tvg-id="canal1" tvg-logo="http://logo/1.png" group-title="Noticias",Canal Uno',
+        "#EXTVLCOPT:http-user-agent=VLC",
+        "http://example.com/uno.m3u8",
+        '#EXTINF:-1 group-title="Deportes, En Vivo",Señal Ñandú',
+        "http://example.com/dos.m3u8",
+        "#EXTINF:-1,Sin Grupo",
+        "http://example.com/tres.m3u8",
+    ]
+
+    def test_parse_m3u(self):
+        """Prueba que parsea atributos, titulo y categoria"""
+        entries = list(parse_m3u(self.PLAYLIST))
+        assert len(entries) == 3
+        assert entries[0]["instance"] == "canal1"
+        assert entries[0]["category"] == "Noticias"
+        assert entries[0]["logo"] == "http://logo/1.png"
+        assert entries[1]["title"] == "Señal Ñandú"
+        assert entries[1]["instance"] == "senalnandu"
+        assert entries[1]["category"] == "Deportes, En Vivo"
+        assert entries[2]["category"] == "General"
+
+    def test_import_playlist_bulk(self, tmp_path):
+        """Prueba la importacion por lotes con duplicados"""
+        playlist = tmp_path / "lista.m3u"
+        lines = ["#EXTM3U"]
+        for i in range(250):
+            lines.append(f'#EXTINF:-1 group-title="Grupo {i % 3}",Canal {i}')
+            lines.append(f"http://example.com/{i}.m3u8")
+        lines.extend(["#EXTINF:-1,Canal 0", "http://example.com/dup.m3u8"])
+        playlist.write_text("\n".join(lines), encoding="utf-8")
+
+        db = ChannelDatabase(":memory:")
+        before = db.get_channel_count()
+        result = import_playlist(db, str(playlist), batch_size=100)
+        assert result.parsed == 251
+        assert result.inserted == 250
+        assert result.skipped == 1
+        assert result.rows_per_second > 0
+        assert db.get_channel_count() == before + 250
+        assert len(db.get_channels_by_category("Grupo 1")) == 83
+        # La repeticion de "Canal 0" queda como URL alternativa
+        assert db.get_stream_candidates(make_instance("Canal 0")) == [
+            "http://example.com/0.m3u8",
+            "http://example.com/dup.m3u8",
+        ]
+        db.close()
+
+    def test_import_mirrors_by_tvg_id_or_title(self, tmp_path):
+        """Prueba que tvg-id o titulo repetidos son espejos solo de canales nuevos"""
+        playlist = tmp_path / "lista.m3u"
+        playlist.write_text(
+            "\n".join(
+                [
+                    "#EXTM3U",
+                    '#EXTINF:-1 tvg-id="uno.hd",Canal Uno',
+                    "http://a/uno.m3u8",
+                    '#EXTINF:-1 tvg-id="uno.sd",Canal Uno',
+                    "http://b/uno.m3u8",
+                    '#EXTINF:-1 tvg-id="uno.hd",Canal Uno HD',
+                    "http://c/uno.m3u8",
+                    "#EXTINF:-1,Existente",
+                    "http://a/existente.m3u8",
+                    "#EXTINF:-1,Existente",
+                    "http://b/existente.m3u8",
+                ]
+            ),
+            encoding="utf-8",
+        )
+        db = ChannelDatabase(":memory:")
+        existing = make_instance("Existente")
+        db.bulk_insert_channels(
+            [("Existente", existing, None, "http://otro/existente.m3u8", "Test")]
+        )
+
+        result = import_playlist(db, str(playlist))
+        assert (result.parsed, result.inserted) == (5, 1)
+        assert db.get_stream_candidates("uno.hd") == [
+            "http://a/uno.m3u8",
+            "http://b/uno.m3u8",
+            "http://c/uno.m3u8",
+        ]
+        assert db.get_stream_candidates(existing) == ["http://otro/existente.m3u8"]
+        db.close()
+
+    def test_import_colliding_instances_get_suffix(self, tmp_path):
+        """Prueba que titulos distintos con la misma instancia derivada no se mezclan"""
+        playlist = tmp_path / "lista.m3u"
+        playlist.write_text(
+            "#EXTM3U\n#EXTINF:-1,ESPN\nhttp://a/espn.m3u8\n"
+            "#EXTINF:-1,ESPN+\nhttp://a/espnplus.m3u8\n"
+            "#EXTINF:-1,ESPN\nhttp://b/espn.m3u8\n",
+            encoding="utf-8",
+        )
+        db = ChannelDatabase(":memory:")
+        result = import_playlist(db, str(playlist))
+        assert (result.parsed, result.inserted) == (3, 2)
+        assert db.get_channel_by_instance("espn2")[0] == "ESPN+"
+        assert db.get_stream_candidates("espn") == [
+            "http://a/espn.m3u8",
+            "http://b/espn.m3u8",
+        ]
+        assert db.get_stream_candidates("espn2") == ["http://a/espnplus.m3u8"]
+        db.close()
+
+
+class TestCLI:
+    """Tests para los subcomandos de linea de comandos"""
+
+    def test_list_and_search_without_gtk(self, tmp_path, capsys):
+        """Prueba los subcomandos sin interfaz y que no se importa GTK"""
+        import subprocess
+
+        import cli
+
+        playlist = tmp_path / "lista.m3u"
+        playlist.write_text(
+            '#EXTM3U\n#EXTINF:-1 tvg-id="zz1" group-title="Zeta",Zeta Uno\n'
+            "http://example.com/z1.m3u8\n",
+            encoding="utf-8",
+        )
+        db_path = str(tmp_path / "cli.db")
+        assert cli.main(["--db", db_path, "import", str(playlist)]) == 0
+        assert cli.main(["--db", db_path, "list", "--category", "Zeta"]) == 0
+        assert cli.main(["--db", db_path, "search", "zeta"]) == 0
+        assert cli.main(["--db", db_path, "search", "inexistente"]) == 1
+        assert cli.main(["--db", db_path, "play", "inexistente"]) == 1
+        out = capsys.readouterr().out.splitlines()
+        assert out[1] == "zz1\tZeta Uno\thttp://example.com/z1.m3u8"
+        assert out[2] == "zz1\tZeta Uno\tZeta"
+
+        code = (
+            "import sys, cli; rc = cli.main(['--db', sys.argv[1], 'list']);"
+            "assert 'gi' not in sys.modules and 'app' not in sys.modules;"
+            "sys.exit(rc)"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code, db_path],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=30,
+        )
+        assert result.returncode == 0, result.stderr
+        assert b"zz1\tZeta Uno" in result.stdout
+
+
+class TestInstanceServer:
+    """Tests para el socket de instancia unica"""
+
+    def test_request_roundtrip_and_single_instance(self, tmp_path):
+        """Prueba que una peticion llega y que no puede haber dos servidores"""
+        path = str(tmp_path / "vertele.sock")
+        assert send_request({"command": "play"}, path) is None
+
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            return {"ok": request.get("instance") == "canal13"}
+
+        server = InstanceServer(handler, path).start()
+        try:
+            assert send_request({"command": "play", "instance": "canal13"}, path) == {
+                "ok": True
+            }
+            assert (
+                send_request({"command": "play", "instance": "x"}, path)["ok"] is False
+            )
+            assert requests[0] == {"command": "play", "instance": "canal13"}
+            with pytest.raises(InstanceRunningError):
+                InstanceServer(handler, path).start()
+        finally:
+            server.close()
+        assert not os.path.exists(path)
+
+    def test_stale_socket_is_replaced(self, tmp_path):
+        """Prueba que un socket abandonado no impide arrancar"""
+        import socket
+
+        path = str(tmp_path / "vertele.sock")
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(path)
+        stale.close()
+        assert os.path.exists(path)
+
+        server = InstanceServer(lambda request: {"ok": True}, path).start()
+        try:
+            assert send_request({"command": "show"}, path) == {"ok": True}
+        finally:
+            server.close()
+
+    def test_cli_play_is_forwarded(self, tmp_path, monkeypatch):
+        """Prueba que play se reenvia a la instancia abierta salvo con --db"""
+        import cli
+
+        monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+        requests = []
+        server = InstanceServer(
+            lambda request: requests.append(request) or {"ok": True}
+        ).start()
+
+        class NoDatabase(ChannelDatabase):
+            def __init__(self, *args):
+                raise AssertionError("play reenviado no debe abrir la base de datos")
+
+        try:
+            with monkeypatch.context() as patch:
+                patch.setattr(cli, "ChannelDatabase", NoDatabase)
+                assert cli.main(["play", "canal13"]) == 0
+            # Con --db la instancia abierta usaria otra base de datos
+            db_path = tmp_path / "otra.db"
+            assert cli.main(["--db", str(db_path), "play", "noexiste"]) == 1
+        finally:
+            server.close()
+        assert requests == [{"command": "play", "instance": "canal13"}]
+        assert db_path.exists()
+
+    def test_cli_forward_timeout_is_an_error(self, tmp_path, monkeypatch, capsys):
+        """Prueba que una instancia que no responde a tiempo no provoca un play local"""
+        import threading
+
+        import cli
+        import ipc
+
+        monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+        monkeypatch.setattr(ipc, "REQUEST_TIMEOUT", 0.2)
+        release = threading.Event()
+        server = InstanceServer(lambda request: release.wait(5) and {"ok": True})
+        server.start()
+
+        class NoDatabase(ChannelDatabase):
+            def __init__(self, *args):
+                raise AssertionError("la peticion ya se envio: no se repite en local")
+
+        try:
+            monkeypatch.setattr(cli, "ChannelDatabase", NoDatabase)
+            assert cli.main(["play", "canal13"]) == 1
+            assert "no respondio" in capsys.readouterr().err
+        finally:
+            release.set()
+            server.close()
+
+    def test_unresponsive_socket_is_replaced(self, tmp_path):
+        """Prueba que un socket que no responde JSON al ping se trata como abandonado"""
+        import socket
+        import threading
+
+        path = str(tmp_path / "vertele.sock")
+        other = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        other.bind(path)
+        other.listen(1)
+
+        def answer_garbage():
+            conn, _ = other.accept()
+            with conn:
+                conn.recv(1024)
+                conn.sendall(b"esto no es JSON\n")
+
+        thread = threading.Thread(target=answer_garbage, daemon=True)
+        thread.start()
+        try:
+            server = InstanceServer(lambda request: {"ok": True}, path).start()
+            try:
+                assert send_request({"command": "show"}, path) == {"ok": True}
+            finally:
+                server.close()
+        finally:
+            thread.join(5)
+            other.close()
+
+
+XMLTV_GUIDE = """<?xml version="1.0" encoding="UTF-8"?>
+<tv>
+  <channel id="noticias.cl"><display-name>Canal Noticias</display-name></channel>
+  <channel id="otro.cl"><display-name>Canal Cine</display-name></channel>
+  <programme start="20240101100000 +0000" stop="20240101110000 +0000" channel="noticias.cl">
+    <title>Matinal</title><desc>Noticias de la mañana</desc>
+  </programme>
+  <programme start="20240101110000 +0000" stop="20240101120000 +0000" channel="noticias.cl">
+    <title>Mediodia</title>
+  </programme>
+  <programme start="20240101130000 +0100" stop="20240101140000 +0100" channel="noticias.cl">
+    <title>Tarde</title>
+  </programme>
+  <programme start="20240101113000 +0000" stop="20240101123000 +0000" channel="otro.cl">
+    <title>Pelicula</title>
+  </programme>
+  <programme start="20240101100000 +0000" stop="20240101110000 +0000" channel="desconocido">
+    <title>Sin canal</title>
+  </programme>
+  <programme start="roto" stop="" channel="noticias.cl"><title>Roto</title></programme>
+</tv>
+"""
+
+
+class TestEPG:
+    """Tests para la importacion de la guia XMLTV"""
+
+    NOON = 1704110400  # 2024-01-01 12:00:00 UTC
+
+    def test_parse_xmltv_time(self):
+        """Prueba la conversion de fechas XMLTV con zona horaria"""
+        assert parse_xmltv_time("20240101120000 +0000") == self.NOON
+        assert parse_xmltv_time("20240101130000 +0100") == self.NOON
+        assert parse_xmltv_time("20240101093000 -0230") == self.NOON
+        assert parse_xmltv_time("20240101120000") == self.NOON
+
+    def test_parse_xmltv_streams_programmes(self):
+        """Prueba el parseo incremental y los nombres de los canales"""
+        import io
+
+        names = {}
+        programmes = list(parse_xmltv(io.BytesIO(XMLTV_GUIDE.encode()), names))
+        assert len(programmes) == 5
+        assert programmes[0].title == "Matinal"
+        assert programmes[0].description == "Noticias de la mañana"
+        assert programmes[1].description is None
+        assert names == {"noticias.cl": "Canal Noticias", "otro.cl": "Canal Cine"}
+
+    def test_import_and_now_next(self, tmp_path):
+        """Prueba la importacion y la consulta del programa actual y siguiente"""
+        guide = tmp_path / "guia.xml"
+        guide.write_text(XMLTV_GUIDE, encoding="utf-8")
+        db = ChannelDatabase(":memory:")
+        db.bulk_insert_channels(
+            [
+                ("Noticias", "noticias.cl", None, "http://x/n.m3u8", "Test"),
+                # Sin tvg-id: se asocia por el nombre visible
+                ("Canal Cine", "canalcine", None, "http://x/c.m3u8", "Test"),
+            ]
+        )
+        result = import_xmltv(db, str(guide), batch_size=2, now=self.NOON)
+        assert (result.parsed, result.inserted, result.skipped) == (5, 4, 1)
+
+        guide_now = db.get_now_next(self.NOON - 60)
+        current, following = guide_now["noticias.cl"]
+        assert current[2] == "Mediodia"
+        assert following[2] == "Tarde"
+        assert guide_now["canalcine"] == (
+            (self.NOON - 1800, self.NOON + 1800, "Pelicula"),
+            None,
+        )
+        assert db.get_now_next(self.NOON - 60, ["canalcine"]).keys() == {"canalcine"}
+        assert db.get_now_next(self.NOON + 7 * 3600) == {}
+
+        # Reimportar sustituye los programas en lugar de duplicarlos
+        import_xmltv(db, str(guide), now=self.NOON)
+        assert db.get_now_next(self.NOON - 5400)["noticias.cl"][0][2] == "Matinal"
+        with db.connections.read() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM epg_programmes").fetchone()[0]
+        assert count == 4
+        assert db.verify_query_plans() == []
+        db.close()
+
+    def test_now_next_for_many_instances(self, monkeypatch):
+        """Prueba que una lista larga de canales se consulta por tramos"""
+        db = ChannelDatabase(":memory:")
+        db.bulk_insert_channels(
+            (f"Canal {i}", f"canal{i}", None, f"http://x/{i}.m3u8", "Test")
+            for i in range(30)
+        )
+        db.bulk_insert_programmes(
+            (f"canal{i}", self.NOON, self.NOON + 3600, f"Programa {i}", None)
+            for i in range(30)
+        )
+        monkeypatch.setattr(ChannelDatabase, "MAX_QUERY_PARAMS", 7)
+        wanted = [f"canal{i}" for i in range(0, 30, 2)] + ["otro"]
+        guide = db.get_now_next(self.NOON + 60, wanted)
+        assert sorted(guide) == sorted(wanted[:-1])
+        assert guide["canal4"][0][2] == "Programa 4"
+        db.close()
+
+    def test_shifted_programmes_replace_overlaps(self):
+        """Prueba que un programa que cambia de hora no deja el antiguo solapado"""
+        hour = 3600
+        db = ChannelDatabase(":memory:")
+        db.bulk_insert_programmes(
+            [
+                ("uno", self.NOON, self.NOON + hour, "Viejo 1", None),
+                ("uno", self.NOON + hour, self.NOON + 2 * hour, "Viejo 2", None),
+                ("uno", self.NOON + 5 * hour, self.NOON + 6 * hour, "Lejano", None),
+                ("dos", self.NOON, self.NOON + hour, "Otro canal", None),
+            ]
+        )
+        # Lotes de una fila: lo escrito en un lote no lo borra el siguiente
+        written = db.bulk_insert_programmes(
+            [
+                ("uno", self.NOON + 1800, self.NOON + 5400, "Nuevo 1", None),
+                ("uno", self.NOON + 5400, self.NOON + 9000, "Nuevo 2", None),
+            ],
+            batch_size=1,
+        )
+        assert written == 2
+        with db.connections.read() as conn:
+            titles = [
+                row[0]
+                for row in conn.execute(
+                    "SELECT title FROM epg_programmes ORDER BY instance DESC, start"
+                )
+            ]
+        assert titles == ["Nuevo 1", "Nuevo 2", "Lejano", "Otro canal"]
+        db.close()
+
+
+class TestProcessSupervisor:
+    """Tests para el supervisor de procesos de reproductor"""
+
+    SLEEP = [sys.executable, "-c", "import time; time.sleep(30)"]
+
+    def test_replace_on_zap_keeps_one_player(self):
+        """Prueba que un reproductor nuevo reemplaza al anterior"""
+        supervisor = ProcessSupervisor(max_players=1)
+        try:
+            first = supervisor.spawn(self.SLEEP)
+            second = supervisor.spawn(self.SLEEP)
+            assert supervisor.running() == [second]
+            assert first.wait(timeout=5) is not None
+            assert supervisor.reap() == 1
+        finally:
+            supervisor.shutdown()
+        assert second.poll() is not None
+        assert supervisor.running() == []
+
+    def test_limit_without_replace(self):
+        """Prueba que sin reemplazo se respeta el maximo de reproductores"""
+        supervisor = ProcessSupervisor(max_players=2, replace_on_zap=False)
+        try:
+            supervisor.spawn(self.SLEEP)
+            supervisor.spawn(self.SLEEP)
+            with pytest.raises(PlayerLimitError):
+                supervisor.spawn(self.SLEEP)
+        finally:
+            supervisor.shutdown()
+
+    def test_reap_collects_exited_players(self):
+        """Prueba que los procesos terminados se recogen sin bloquear"""
+        supervisor = ProcessSupervisor(max_players=3)
+        process = supervisor.spawn([sys.executable, "-c", "pass"])
+        process.wait(timeout=5)
+        assert supervisor.reap() == 1
+        assert supervisor.running() == []
+
+    def test_stopping_is_tracked_per_process_not_pid(self, tmp_path):
+        """Prueba que un pid reutilizado no hereda el estado de otro proceso"""
+        import time
+
+        ready = tmp_path / "listo"
+        stubborn = [
+            sys.executable,
+            "-c",
+            "import signal, sys, time; signal.signal(signal.SIGTERM, signal.SIG_IGN);"
+            "open(sys.argv[1], 'w').close(); time.sleep(30)",
+            str(ready),
+        ]
+        supervisor = ProcessSupervisor(max_players=2)
+        try:
+            first = supervisor.spawn(stubborn)
+            deadline = time.monotonic() + 5
+            while not ready.exists() and time.monotonic() < deadline:
+                time.sleep(0.01)
+            # Ignora SIGTERM: sigue vivo y marcado como deteniendose
+            supervisor.stop(first)
+            second = supervisor.spawn(self.SLEEP)
+            real_pid, second.pid = second.pid, first.pid
+            try:
+                assert supervisor.running() == [second]
+            finally:
+                second.pid = real_pid
+        finally:
+            supervisor.shutdown()
+        assert first.poll() is not None
+
+
+class _LocalOrigin:
+    """
+    Servidor HTTP local que sustituye a los origenes HLS reales
+
+    routes asocia cada ruta a (status, cuerpo, cabeceras, retardo en segundos).
+    """
+
+    def __init__(self, routes=None):
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        self.routes = dict(routes or {})
+        self.hits = {}
+        origin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                import time
+
+                origin.hits[self.path] = origin.hits.get(self.path, 0) + 1
+                route = origin.routes.get(self.path)
+                if route is None:
+                    route = (404, b"no encontrado")
+                status, body = route[0], route[1]
+                headers = route[2] if len(route) > 2 else {}
+                delay = route[3] if len(route) > 3 else 0
+                if callable(body):
+                    status, body, headers = body(self)
+                if delay:
+                    time.sleep(delay)
+                if isinstance(body, str):
+                    body = body.encode("utf-8")
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.base_url = "http://127.0.0.1:%d" % self.server.server_address[1]
+        threading.Thread(
+            target=self.server.serve_forever, args=(0.05,), daemon=True
+        ).start()
+
+    def url(self, path):
+        return self.base_url + path
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+MASTER_PLAYLIST = """#EXTM3U
+#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=640x360
+low/index.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=2500000,RESOLUTION=1280x720,CODECS="avc1.4d401f,mp4a.40.2"
+hd/index.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=6000000,RESOLUTION=1920x1080
+fhd/index.m3u8
+"""
+
+MEDIA_PLAYLIST = """#EXTM3U
+#EXT-X-TARGETDURATION:2
+#EXT-X-MEDIA-SEQUENCE:0
+#EXTINF:2.0,
+seg0.ts
+#EXTINF:2.0,
+seg1.ts
+#EXTINF:2.0,
+seg2.ts
+"""
+
+
+@pytest.fixture
+def hls_origin():
+    """Origen HLS local con una lista maestra, variantes y segmentos"""
+    routes = {
+        "/live/master.m3u8": (200, MASTER_PLAYLIST),
+        "/moved": (302, b"", {"Location": "/live/master.m3u8"}),
+        "/html": (200, "<html></html>"),
+    }
+    for variant in ("low", "hd", "fhd"):
+        routes[f"/live/{variant}/index.m3u8"] = (200, MEDIA_PLAYLIST)
+        for i in range(3):
+            routes[f"/live/{variant}/seg{i}.ts"] = (200, bytes([i]) * 1024)
+    origin = _LocalOrigin(routes)
+    yield origin
+    origin.close()
+
+
+class TestProber:
+    """Tests para el prober de canales"""
+
+    def test_probe_classifies_streams(self, hls_origin):
+        """Prueba que distingue streams validos, redirigidos y caidos"""
+        import socket
+
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            closed_port = sock.getsockname()[1]
+
+        targets = [
+            ("master", hls_origin.url("/live/master.m3u8")),
+            ("redirect", hls_origin.url("/moved")),
+            ("missing", hls_origin.url("/nada.m3u8")),
+            ("html", hls_origin.url("/html")),
+            ("refused", f"http://127.0.0.1:{closed_port}/x.m3u8"),
+        ]
+        results = {
+            r.instance: r
+            for r in ChannelProber(concurrency=4, per_host=2, timeout=5).probe(targets)
+        }
+        assert results["master"].reachable and results["master"].variants == 3
+        assert results["master"].ttfb_ms > 0
+        assert results["redirect"].reachable
+        assert results["missing"].http_status == 404
+        assert not results["missing"].reachable
+        assert not results["html"].reachable
+        assert not results["refused"].reachable and results["refused"].error
+
+    def test_probe_database_records_status(self, hls_origin):
+        """Prueba que el estado de cada canal se guarda en la base de datos"""
+        db = ChannelDatabase(":memory:")
+        with db.connections.transaction() as conn:
+            conn.execute("DELETE FROM channels")
+        db.bulk_insert_channels(
+            [
+                ("Vivo", "vivo", None, hls_origin.url("/live/master.m3u8"), "Test"),
+                ("Muerto", "muerto", None, hls_origin.url("/nada.m3u8"), "Test"),
+            ]
+        )
+        checked, reachable = probe_database(db, ChannelProber(timeout=5))
+        assert (checked, reachable) == (2, 1)
+        assert db.get_dead_instances() == {"muerto"}
+        assert db.get_stream_status("vivo")[0] == 1
+        db.close()
+
+    def test_slow_host_does_not_block_other_hosts(self, hls_origin):
+        """Prueba que un host saturado no retiene las plazas de otros hosts"""
+        slow = _LocalOrigin(
+            {f"/{i}.m3u8": (200, MEDIA_PLAYLIST, {}, 0.3) for i in range(3)}
+        )
+        try:
+            targets = [(f"lento{i}", slow.url(f"/{i}.m3u8")) for i in range(3)]
+            targets += [
+                (f"rapido{i}", hls_origin.url(f"/rapido{i}.m3u8")) for i in range(3)
+            ]
+            order = []
+            ChannelProber(concurrency=2, per_host=1, timeout=5).probe(
+                targets, lambda result: order.append(result.instance)
+            )
+        finally:
+            slow.close()
+        assert len(order) == 6
+        # Los rapidos terminan mientras el host lento atiende su primer canal
+        assert order[:3] == ["rapido0", "rapido1", "rapido2"]
+
+
+def _closed_port_url(path="/x.m3u8"):
+    """URL de un puerto local sin servidor (conexion rechazada)"""
+    import socket
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return "http://127.0.0.1:%d%s" % (sock.getsockname()[1], path)
+
+
+class TestMirrors:
+    """Tests para la carrera entre espejos de un canal"""
+
+    @pytest.fixture
+    def mirrors(self, hls_origin):
+        """Espejos lento, caido, que no es HLS y rapido en el origen local"""
+        hls_origin.routes["/slow.m3u8"] = (200, MEDIA_PLAYLIST, {}, 1.5)
+        hls_origin.routes["/fast.m3u8"] = (200, MEDIA_PLAYLIST)
+        hls_origin.routes["/error.m3u8"] = (503, "caido")
+        return hls_origin
+
+    def test_fastest_healthy_mirror_wins(self, mirrors):
+        """Prueba que gana el primero que responde aunque se lance despues"""
+        urls = [mirrors.url("/slow.m3u8"), mirrors.url("/fast.m3u8")]
+        result = MirrorRacer(stagger=0.1, timeout=5).race(urls)
+        assert result.url == mirrors.url("/fast.m3u8")
+        assert result.seconds < 1.0
+        assert result.errors == {}
+
+    def test_failure_starts_next_candidate_immediately(self, mirrors):
+        """Prueba que un fallo no espera al escalonado para lanzar la siguiente"""
+        refused = _closed_port_url()
+        urls = [refused, mirrors.url("/error.m3u8"), mirrors.url("/fast.m3u8")]
+        result = MirrorRacer(stagger=5.0, timeout=5).race(urls)
+        assert result.url == mirrors.url("/fast.m3u8")
+        assert result.seconds < 2.0
+        assert set(result.errors) == {refused, mirrors.url("/error.m3u8")}
+        assert result.errors[mirrors.url("/error.m3u8")] == "HTTP 503"
+
+    def test_race_without_healthy_mirror(self, mirrors):
+        """Prueba que sin espejos validos no hay ganador"""
+        urls = [mirrors.url("/error.m3u8"), mirrors.url("/html")]
+        result = MirrorRacer(stagger=0.05, timeout=5).race(urls)
+        assert result.url is None
+        assert len(result.errors) == 2
+
+    def test_winner_is_remembered_with_decay(self):
+        """Prueba que la ganadora sube en el orden y su puntuacion decae"""
+        db = ChannelDatabase(":memory:")
+        db.bulk_insert_channels([("Espejos", "espejos", None, "http://a/", "Test")])
+        db.add_channel_streams(
+            [("espejos", "http://b/", 1), ("espejos", "http://c/", 2)]
+        )
+        assert db.get_stream_candidates("espejos") == [
+            "http://a/",
+            "http://b/",
+            "http://c/",
+        ]
+
+        week = ChannelDatabase.STREAM_SCORE_HALF_LIFE
+        db.record_stream_win("espejos", "http://c/", now=0.0)
+        assert db.get_stream_candidates("espejos", now=1.0)[0] == "http://c/"
+        # Una victoria reciente pesa mas que otra de hace tres semanas
+        db.record_stream_win("espejos", "http://b/", now=3 * week)
+        assert db.get_stream_candidates("espejos", now=3 * week) == [
+            "http://b/",
+            "http://c/",
+            "http://a/",
+        ]
+        db.close()
+
+    def test_selector_fails_over_and_records_winner(self, mirrors):
+        """Prueba que el selector evita el espejo caido y recuerda el bueno"""
+        db = ChannelDatabase(":memory:")
+        db.bulk_insert_channels(
+            [("Espejos", "espejos", None, mirrors.url("/error.m3u8"), "Test")]
+        )
+        db.add_channel_streams([("espejos", mirrors.url("/fast.m3u8"), 1)])
+        selector = MirrorSelector(db, MirrorRacer(stagger=0.05, timeout=5))
+
+        url = selector.select("espejos", mirrors.url("/error.m3u8"))
+        assert url == mirrors.url("/fast.m3u8")
+        assert db.get_stream_candidates("espejos")[0] == url
+        # Un canal con una sola URL no hace peticiones
+        hits = dict(mirrors.hits)
+        assert selector.select("unico", "http://x/") == "http://x/"
+        assert mirrors.hits == hits
+        db.close()
+
+
+def _sync_playlist(channels):
+    """Lista M3U de proveedor con (tvg-id, titulo, url) por entrada"""
+    lines = ["#EXTM3U"]
+    for tvg_id, title, url in channels:
+        lines.append(f'#EXTINF:-1 tvg-id="{tvg_id}" group-title="Sync",{title}')
+        lines.append(url)
+    return "\n".join(lines) + "\n"
+
+
+class TestSync:
+    """Tests para la sincronizacion incremental de listas de proveedores"""
+
+    CHANNELS = [(f"sync{i}", f"Sync {i}", f"http://cdn/{i}.m3u8") for i in range(50)]
+
+    @pytest.fixture
+    def provider(self):
+        """Proveedor local que respeta If-None-Match"""
+        state = {"body": _sync_playlist(self.CHANNELS), "etag": '"v1"'}
+
+        def serve(handler):
+            headers = {"ETag": state["etag"]}
+            if state["etag"] and handler.headers.get("If-None-Match") == state["etag"]:
+                return 304, b"", headers
+            return 200, state["body"], headers if state["etag"] else {}
+
+        origin = _LocalOrigin({"/lista.m3u": (200, serve)})
+        origin.state = state
+        yield origin
+        origin.close()
+
+    def test_diff_keys_repeats_like_importer(self):
+        """Prueba que el diff agrupa espejos por tvg-id o titulo, como el importador"""
+        from sync import diff_playlist
+
+        text = _sync_playlist(
+            [
+                ("uno.hd", "Uno", "http://a/uno.m3u8"),
+                ("uno.hd", "Uno HD", "http://b/uno.m3u8"),
+                ("", "ESPN", "http://a/espn.m3u8"),
+                ("", "ESPN+", "http://a/espnplus.m3u8"),
+                ("", "ESPN", "http://b/espn.m3u8"),
+            ]
+        )
+        inserts, updates, deletes, mirrors = diff_playlist(text, {})
+        assert [(row[0], row[1]) for row in inserts] == [
+            ("Uno", "uno.hd"),
+            ("ESPN", "espn"),
+            ("ESPN+", "espn2"),
+        ]
+        assert mirrors == {
+            "uno.hd": ["http://a/uno.m3u8", "http://b/uno.m3u8"],
+            "espn": ["http://a/espn.m3u8", "http://b/espn.m3u8"],
+        }
+
+    def test_unchanged_source_does_not_write(self, provider):
+        """Prueba que una lista sin cambios se resuelve con un 304 y sin escribir"""
+        db = ChannelDatabase(":memory:")
+        syncer = ProviderSync(db)
+        url = provider.url("/lista.m3u")
+        first = syncer.sync(url)
+        assert first.changed and first.inserted == 50
+        assert db.get_provider_sources() == [url]
+
+        changes = db.conn.total_changes
+        second = syncer.sync(url)
+        assert not second.changed
+        assert db.conn.total_changes == changes
+        assert provider.hits["/lista.m3u"] == 2
+
+        # Sin validadores se compara el cuerpo completo
+        provider.state["etag"] = None
+        assert not syncer.sync(url).changed
+        assert db.get_provider_source(url)[0] is None
+        syncer.close()
+        db.close()
+
+    def test_changed_source_applies_only_the_diff(self, provider):
+        """Prueba que solo se insertan, modifican y eliminan las filas afectadas"""
+        db = ChannelDatabase(":memory:")
+        seeded = db.get_channel_count()
+        syncer = ProviderSync(db)
+        url = provider.url("/lista.m3u")
+        syncer.sync(url)
+        ids = {
+            instance: row_id
+            for row_id, instance in db.conn.execute(
+                "SELECT id, instance FROM channels WHERE source = ?", (url,)
+            )
+        }
+
+        channels = list(self.CHANNELS)
+        channels[1] = ("sync1", "Sync Uno", "http://cdn/1.m3u8")
+        del channels[2]
+        channels.append(("sync50", "Sync 50", "http://cdn/50.m3u8"))
+        channels.append(("sync3", "Sync 3", "http://espejo/3.m3u8"))
+        provider.state.update(body=_sync_playlist(channels), etag='"v2"')
+
+        result = syncer.sync(url)
+        assert (result.inserted, result.updated, result.deleted) == (1, 2, 1)
+        assert db.get_channel_count() == seeded + 50
+        assert db.get_channel_by_instance("sync1")[0] == "Sync Uno"
+        assert db.get_channel_by_instance("sync2") is None
+        assert db.get_stream_candidates("sync3") == [
+            "http://cdn/3.m3u8",
+            "http://espejo/3.m3u8",
+        ]
+        assert db.search("Sync Uno")[0][1] == "sync1"
+        # Las filas sin cambios no se reescriben
+        row_id = db.conn.execute(
+            "SELECT id FROM channels WHERE instance = 'sync4'"
+        ).fetchone()[0]
+        assert row_id == ids["sync4"]
+        assert db.get_provider_source(url)[0] == '"v2"'
+        syncer.close()
+        db.close()
+
+    def test_collisions_and_mirror_ranks(self, provider):
+        """Prueba que no toca canales ajenos y que reordena los espejos"""
+        db = ChannelDatabase(":memory:")
+        db.bulk_insert_channels([("Manual", "manual", None, "http://man/1", "Test")])
+        db.add_channel_streams([("manual", "http://man/2", 1)])
+        channels = [
+            ("manual", "Manual Prov", "http://prov/a.m3u8"),
+            ("manual", "Manual Prov", "http://prov/b.m3u8"),
+            ("espejos", "Espejos", "http://cdn/e.m3u8"),
+            ("espejos", "Espejos", "http://uno/e.m3u8"),
+            ("espejos", "Espejos", "http://dos/e.m3u8"),
+        ]
+        provider.state.update(body=_sync_playlist(channels))
+        syncer = ProviderSync(db)
+        url = provider.url("/lista.m3u")
+
+        result = syncer.sync(url)
+        assert (result.inserted, result.skipped) == (1, ("manual",))
+        assert db.get_stream_candidates("manual") == ["http://man/1", "http://man/2"]
+
+        channels[3:] = [channels[4], channels[3]]
+        provider.state.update(body=_sync_playlist(channels), etag='"v2"')
+        result = syncer.sync(url)
+        assert (result.updated, result.skipped) == (1, ("manual",))
+        assert db.get_stream_candidates("manual") == ["http://man/1", "http://man/2"]
+        assert db.get_stream_candidates("espejos") == [
+            "http://cdn/e.m3u8",
+            "http://dos/e.m3u8",
+            "http://uno/e.m3u8",
+        ]
+        syncer.close()
+        db.close()
+
+
+class TestPlaylistResolver:
+    """Tests para la pre-resolucion de listas HLS"""
+
+    def test_policy_chooses_variant(self, hls_origin):
+        """Prueba que la politica limita resolucion y ancho de banda"""
+        master = hls_origin.url("/live/master.m3u8")
+        resolver = PlaylistResolver(VariantPolicy(max_height=720))
+        try:
+            assert resolver.resolve(master) == hls_origin.url("/live/hd/index.m3u8")
+        finally:
+            resolver.close()
+
+        resolver = PlaylistResolver(VariantPolicy(max_bandwidth=100))
+        try:
+            assert resolver.resolve(master) == hls_origin.url("/live/low/index.m3u8")
+        finally:
+            resolver.close()
+
+    def test_prefetch_caches_with_ttl(self, hls_origin):
+        """Prueba que la resolucion en segundo plano se cachea hasta su TTL"""
+        import time
+
+        master = hls_origin.url("/moved")
+        resolver = PlaylistResolver(ttl=0.2)
+        try:
+            assert resolver.prefetch(master) is not None
+            resolved = resolver.resolved_url(master, wait=5)
+            assert resolved == hls_origin.url("/live/fhd/index.m3u8")
+            assert resolver.get_cached(master) == resolved
+            hits = hls_origin.hits["/live/master.m3u8"]
+            resolver.resolve(master)
+            assert hls_origin.hits["/live/master.m3u8"] == hits
+
+            time.sleep(0.25)
+            assert resolver.get_cached(master) is None
+        finally:
+            resolver.close()
+
+    def test_master_with_renditions_is_kept(self, hls_origin):
+        """Prueba que una maestra con audio aparte no se sustituye por una variante"""
+        audio_master = (
+            '#EXTM3U\n#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="aud",NAME="es",'
+            'URI="audio/es.m3u8"\n' + MASTER_PLAYLIST.split("\n", 1)[1]
+        )
+        origin = _LocalOrigin(
+            {
+                "/live/audio.m3u8": (200, audio_master),
+                "/live/fhd/index.m3u8": (200, MEDIA_PLAYLIST),
+            }
+        )
+        resolver = PlaylistResolver()
+        try:
+            master = origin.url("/live/audio.m3u8")
+            assert resolver.resolve(master) == master
+            # La variante elegida se pre-calienta igualmente
+            assert origin.hits["/live/fhd/index.m3u8"] == 1
+        finally:
+            resolver.close()
+            origin.close()
+
+    def test_prefetch_latest_coalesces_highlights(self):
+        """Prueba que solo se resuelve el ultimo canal resaltado"""
+        routes = {f"/c{i}.m3u8": (200, MEDIA_PLAYLIST, {}, 0.2) for i in range(6)}
+        origin = _LocalOrigin(routes)
+        resolver = PlaylistResolver()
+        try:
+            futures = [
+                resolver.prefetch_latest(origin.url(f"/c{i}.m3u8")) for i in range(6)
+            ]
+            last = origin.url("/c5.m3u8")
+            assert futures[-1].result(timeout=5) == last
+            assert resolver.get_cached(last) == last
+            # El primero ya estaba en curso; los intermedios se descartan
+            assert all(f.cancelled() for f in futures[1:-1])
+            assert sum(origin.hits.values()) <= 2
+        finally:
+            resolver.close()
+            origin.close()
+
+    def test_prefetch_latest_survives_errors(self, monkeypatch):
+        """Prueba que un error de protocolo o inesperado no bloquea los resaltados"""
+        import http.client
+
+        resolver = PlaylistResolver()
+        failures = [http.client.IncompleteRead(b""), RuntimeError("fallo")]
+
+        def fetch(url):
+            if failures:
+                raise failures.pop(0)
+            return MEDIA_PLAYLIST, url
+
+        monkeypatch.setattr(resolver, "_fetch", fetch)
+        try:
+            assert resolver.prefetch_latest("http://a/1.m3u8").result(5) == (
+                "http://a/1.m3u8"
+            )
+            with pytest.raises(RuntimeError):
+                resolver.prefetch_latest("http://a/2.m3u8").result(5)
+            assert resolver.prefetch_latest("http://a/3.m3u8").result(5) == (
+                "http://a/3.m3u8"
+            )
+        finally:
+            resolver.close()
+
+    def test_unreachable_stream_keeps_original_url(self, hls_origin):
+        """Prueba que un fallo de red entrega la URL original al reproductor"""
+        resolver = PlaylistResolver()
+        try:
+            url = hls_origin.url("/nada.m3u8")
+            assert resolver.resolve(url) == url
+            assert resolver.get_cached(url) is None
+        finally:
+            resolver.close()
+
+
+def _http_get(url):
+    """Descarga una URL con urllib (cliente de prueba)"""
+    import urllib.request
+
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return response.read()
+
+
+class TestHTTPClient:
+    """Tests para el cliente HTTP con conexiones persistentes"""
+
+    def test_idle_connections_bounded_across_threads(self, hls_origin):
+        """Prueba que muchos hilos no dejan abierta una conexion libre cada uno"""
+        import threading
+
+        from net import HTTPClient
+
+        client = HTTPClient(max_idle_per_host=2)
+        barrier = threading.Barrier(10)
+        url = hls_origin.url("/live/master.m3u8")
+
+        def fetch():
+            barrier.wait()
+            assert client.get(url).status == 200
+
+        threads = [threading.Thread(target=fetch) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        idle = [conn for pool in client._idle.values() for conn in pool]
+        assert len(idle) <= 2
+        # Otro hilo reutiliza una de las conexiones libres
+        reused = threading.Thread(target=lambda: client.get(url))
+        reused.start()
+        reused.join()
+        assert sum(len(pool) for pool in client._idle.values()) == len(idle)
+        client.close()
+        assert client._idle == {}
+
+
+class TestHLSProxy:
+    """Tests para el proxy HLS con cache compartida"""
+
+    def test_viewers_share_upstream_fetches(self, hls_origin):
+        """Prueba que varios espectadores generan una sola descarga por segmento"""
+        from concurrent.futures import ThreadPoolExecutor
+
+        proxy = HLSProxy(prefetch=0).start()
+        try:
+            master = _http_get(proxy.url_for(hls_origin.url("/live/master.m3u8")))
+            variant_url = [
+                line for line in master.decode().splitlines() if "hd%2Findex" in line
+            ][0]
+            assert variant_url.startswith(proxy.base_url + "/playlist?url=")
+
+            media = _http_get(variant_url).decode()
+            segment_urls = [l for l in media.splitlines() if l.startswith("http")]
+            assert len(segment_urls) == 3
+
+            def viewer(_):
+                return [_http_get(url) for url in segment_urls]
+
+            with ThreadPoolExecutor(max_workers=6) as pool:
+                results = list(pool.map(viewer, range(6)))
+            assert all(r[1] == bytes([1]) * 1024 for r in results)
+            for i in range(3):
+                assert hls_origin.hits[f"/live/hd/seg{i}.ts"] == 1
+        finally:
+            proxy.close()
+
+    def test_prefetch_next_segments(self, hls_origin):
+        """Prueba que el proxy descarga por adelantado los segmentos siguientes"""
+        import time
+
+        proxy = HLSProxy(prefetch=2).start()
+        try:
+            media_url = proxy.url_for(hls_origin.url("/live/low/index.m3u8"))
+            _http_get(media_url)
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline and (
+                hls_origin.hits.get("/live/low/seg1.ts", 0) == 0
+            ):
+                time.sleep(0.01)
+            # Directo sin EXT-X-ENDLIST: se precargan los ultimos segmentos
+            assert hls_origin.hits.get("/live/low/seg1.ts") == 1
+            assert hls_origin.hits.get("/live/low/seg0.ts") is None
+        finally:
+            proxy.close()
+
+    def test_disk_tier_serves_evicted_segments(self, hls_origin, tmp_path):
+        """Prueba que los segmentos expulsados de memoria se sirven desde disco"""
+        cache = SegmentCache(max_memory_bytes=1500, disk_dir=str(tmp_path))
+        proxy = HLSProxy(cache=cache, prefetch=0).start()
+        try:
+            urls = [hls_origin.url(f"/live/fhd/seg{i}.ts") for i in range(3)]
+            for url in urls:
+                _http_get(proxy_url(proxy.base_url, "segment", url))
+            entry = cache.get(urls[0])
+            assert entry.data is None and entry.path is not None
+            body = _http_get(proxy_url(proxy.base_url, "segment", urls[0]))
+            assert body == bytes([0]) * 1024
+            assert hls_origin.hits["/live/fhd/seg0.ts"] == 1
+        finally:
+            proxy.close()
+
+    def test_only_channel_hosts_are_proxied(self, hls_origin):
+        """Prueba que el proxy rechaza origenes ajenos a la lista de canales"""
+        import urllib.error
+
+        proxy = HLSProxy(prefetch=0, upstream_hosts=lambda: {"127.0.0.1"}).start()
+        try:
+            master = _http_get(proxy.url_for(hls_origin.url("/live/master.m3u8")))
+            assert b"playlist?url=" in master
+            with pytest.raises(urllib.error.HTTPError) as error:
+                _http_get(proxy.url_for("http://localhost:1/interno"))
+            assert error.value.code == 403
+        finally:
+            proxy.close()
+
+    def test_iframe_playlists_are_routed_as_playlists(self):
+        """Prueba que las variantes I-frame se reescriben hacia /playlist"""
+        proxy = HLSProxy(prefetch=0).start()
+        try:
+            text = proxy.rewrite_playlist(
+                "#EXTM3U\n"
+                '#EXT-X-I-FRAME-STREAM-INF:BANDWIDTH=1000,URI="iframe.m3u8"\n'
+                "#EXT-X-STREAM-INF:BANDWIDTH=800000\nlow.m3u8\n",
+                "http://origen/live/master.m3u8",
+            )
+            assert "/playlist?url=http%3A%2F%2Forigen%2Flive%2Fiframe.m3u8" in text
+        finally:
+            proxy.close()
+
+    def test_malformed_upstream_response_is_bad_gateway(self):
+        """Prueba que una respuesta HTTP invalida del origen se traduce en 502"""
+        import socket
+        import threading
+
+        from proxy import UpstreamError
+
+        listener = socket.socket()
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(4)
+
+        def serve():
+            for _ in range(2):
+                conn, _ = listener.accept()
+                conn.recv(4096)
+                conn.sendall(b"esto no es HTTP\r\n\r\n")
+                conn.close()
+
+        threading.Thread(target=serve, daemon=True).start()
+        proxy = HLSProxy(prefetch=0).start()
+        try:
+            with pytest.raises(UpstreamError) as error:
+                proxy._fetch_upstream(
+                    "http://127.0.0.1:%d/seg.ts" % listener.getsockname()[1]
+                )
+            assert error.value.status == 502
+        finally:
+            proxy.close()
+            listener.close()
+
+
+class _FakeControlServer:
+    """
+    Servidor de control falso que registra las lineas recibidas
+
+    Si se indica reply, contesta cada linea con esos bytes, como hacen VLC
+    (eco de la interfaz RC) y mpv (respuestas y eventos JSON).
+    """
+
+    def __init__(self, family, address, reply=b""):
+        import socket
+        import threading
+
+        self.reply = reply
+        self.lines = []
+        self.connections = 0
+        self.received = threading.Event()
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.bind(address)
+        self.sock.listen(5)
+        self.address = self.sock.getsockname()
+        self.closed = False
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _serve(self):
+        while not self.closed:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            self.connections += 1
+            with conn, conn.makefile("r", encoding="utf-8") as stream:
+                for line in stream:
+                    self.lines.append(line.rstrip("\n"))
+                    self.received.set()
+                    if self.reply:
+                        try:
+                            conn.sendall(self.reply)
+                        except OSError:
+                            return
+
+    def wait_for(self, count, timeout=5):
+        import time
+
+        deadline = time.monotonic() + timeout
+        while len(self.lines) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return len(self.lines) >= count
+
+    def close(self):
+        import socket
+
+        # shutdown despierta al accept bloqueado; sin el, el hilo seguiria
+        # aceptando en el descriptor que reutilice el siguiente socket
+        self.closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        self.thread.join(1)
+
+
+def _sleeping_command(self):
+    """Proceso de reproductor falso que solo espera"""
+    return [sys.executable, "-c", "import time; time.sleep(30)"]
+
+
+class TestPlayerSession:
+    """Tests para la sesion persistente con control remoto"""
+
+    def test_vlc_rc_session_reuses_process(self, monkeypatch):
+        """Prueba que varios cambios de canal usan un unico proceso VLC"""
+        import socket
+
+        server = _FakeControlServer(socket.AF_INET, ("127.0.0.1", 0))
+        monkeypatch.setattr(VLCRemoteSession, "build_command", _sleeping_command)
+        session = VLCRemoteSession("vlc", port=server.address[1])
+        try:
+            assert session.load("Canal Uno", "http://x/uno.m3u8")
+            pid = session.process.pid
+            assert session.load("Canal Dos", "http://x/dos.m3u8")
+            assert session.process.pid == pid
+            assert server.wait_for(4)
+            assert server.lines[:2] == [
+                "clear",
+                'add http://x/uno.m3u8 ":meta-title=Canal Uno"',
+            ]
+            assert server.lines[3].startswith("add http://x/dos.m3u8")
+            assert server.connections == 1
+        finally:
+            session.close()
+            server.close()
+        assert session.process is None
+
+    def test_replies_are_drained(self, monkeypatch):
+        """Prueba que las respuestas del reproductor no llenan el socket"""
+        import socket
+
+        # Mas de lo que caben en los buffers del socket sin que nadie lea
+        server = _FakeControlServer(
+            socket.AF_INET, ("127.0.0.1", 0), reply=b"x" * (1 << 20)
+        )
+        monkeypatch.setattr(VLCRemoteSession, "build_command", _sleeping_command)
+        session = VLCRemoteSession("vlc", port=server.address[1])
+        try:
+            for i in range(3):
+                assert session.load(f"Canal {i}", f"http://x/{i}.m3u8")
+            assert server.wait_for(6)
+        finally:
+            session.close()
+            server.close()
+
+    def test_sessions_and_backends_are_abstract(self):
+        """Prueba que las clases base no se pueden instanciar"""
+        from player import PlayerBackend, PlayerSession
+
+        with pytest.raises(TypeError):
+            PlayerSession("vlc")
+        with pytest.raises(TypeError):
+            PlayerBackend()
+
+    def test_mpv_ipc_session_sends_loadfile(self, tmp_path, monkeypatch):
+        """Prueba que mpv recibe loadfile por su socket JSON IPC"""
+        import json
+        import socket
+
+        socket_path = str(tmp_path / "mpv.sock")
+        server = _FakeControlServer(socket.AF_UNIX, socket_path)
+        monkeypatch.setattr(MPVIPCSession, "build_command", _sleeping_command)
+        session = MPVIPCSession("mpv", socket_path=socket_path)
+        try:
+            assert session.load("Canal Uno", "http://x/uno.m3u8")
+            assert server.wait_for(2)
+            commands = [json.loads(line)["command"] for line in server.lines]
+            assert commands[0] == ["loadfile", "http://x/uno.m3u8", "replace"]
+            assert commands[1] == ["set_property", "force-media-title", "Canal Uno"]
+        finally:
+            session.close()
+            server.close()
+
+
+class TestStartup:
+    """Presupuesto de tiempo del arranque de la interfaz"""
+
+    # Desde VerTeleApp.__init__ hasta window.show_all() con la base ya creada
+    STARTUP_BUDGET_SECONDS = 1.0
+
+    def test_startup_within_budget(self, tmp_path, monkeypatch):
+        """Prueba que la ventana aparece dentro del presupuesto de arranque"""
+        import time
+
+        pytest.importorskip("gi")
+        from gi.repository import Gtk
+
+        if not Gtk.init_check(sys.argv)[0]:
+            pytest.skip("Sin pantalla para GTK")
+        import app
+
+        monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+        path = str(tmp_path / "canales.db")
+        ChannelDatabase(path).close()
+
+        recorder = instrument.enable()
+        vertele = None
+        try:
+            start = time.perf_counter()
+            vertele = app.VerTeleApp(path)
+            vertele._setup_ui()
+            elapsed = time.perf_counter() - start
+            phases = {s.name: round(s.duration * 1000, 1) for s in recorder.spans}
+        finally:
+            instrument.disable()
+            # Si el constructor fallo no hay nada que cerrar y su error se ve
+            if vertele is not None:
+                vertele.close()
+                if vertele.window is not None:
+                    vertele.window.destroy()
+                vertele.db.close()
+        assert elapsed < self.STARTUP_BUDGET_SECONDS, phases
+
+    def test_headless_startup_within_budget(self, tmp_path, monkeypatch):
+        """Prueba que los servicios de VerTeleApp arrancan sin GTK"""
+        import time
+
+        monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+        path = str(tmp_path / "canales.db")
+        ChannelDatabase(path).close()
+
+        recorder = instrument.enable()
+        services = None
+        try:
+            start = time.perf_counter()
+            services = AppServices(path, dispatch=lambda callback, *args: None)
+            elapsed = time.perf_counter() - start
+            phases = {s.name: round(s.duration * 1000, 1) for s in recorder.spans}
+        finally:
+            instrument.disable()
+            if services is not None:
+                services.close()
+                services.db.close()
+        # Sin ventana el arranque debe quedar muy por debajo del presupuesto
+        assert elapsed < self.STARTUP_BUDGET_SECONDS / 4, phases
+
+
+class TestChannelWindow:
+    """Tests de la ventana de canales con TaskRunner"""
+
+    def test_default_channel_selected_from_counts(self, tmp_path):
+        """Prueba que el canal por defecto llega en segundo plano y solo construye su pestaña"""
+        import queue
+
+        pytest.importorskip("gi")
+        from gi.repository import Gtk
+
+        if not Gtk.init_check(sys.argv)[0]:
+            pytest.skip("Sin pantalla para GTK")
+        import ui
+
+        db = ChannelDatabase(str(tmp_path / "canales.db"))
+        delivered = queue.Queue()
+        runner = TaskRunner(
+            dispatch=lambda callback, *args: delivered.put((callback, args))
+        )
+        window = ui.ChannelWindow(
+            lambda *args: None, channel_source=db, task_runner=runner
+        )
+        try:
+            counts = db.count_channels_by_category()
+            empty, category = list(counts)[:2]
+            # Una pestaña sin filas (p. ej. todos sus canales caídos) se salta
+            counts[empty] = 0
+            first = db.get_channels_slice(category, 0, 1)[0]
+            for name in counts:
+                window.add_category(name)
+            window.select_default_channel(counts)
+            while window.selected_channel is None:
+                callback, args = delivered.get(timeout=5)
+                callback(*args)
+            assert window.selected_channel[1] == first[1]
+            # La primera pestaña se construye al insertarla; las demás no
+            assert set(window.treeviews) <= {empty, category}
+            # La consulta en segundo plano completa las URLs del canal
+            while window.selected_channel[3] is None:
+                callback, args = delivered.get(timeout=5)
+                callback(*args)
+            assert window.selected_channel[3] == db.get_channel_by_instance(first[1])[2]
+        finally:
+            window.destroy()
+            runner.shutdown()
+            db.close()
+
+    def test_now_playing_updates_only_loaded_rows(self):
+        """Prueba que la guia se pide y se actualiza solo para las filas leidas"""
+        pytest.importorskip("gi")
+        from gi.repository import Gtk
+
+        if not Gtk.init_check(sys.argv)[0]:
+            pytest.skip("Sin pantalla para GTK")
+        import ui
+
+        db = ChannelDatabase(":memory:")
+        window = ui.ChannelWindow(lambda *args: None, channel_source=db)
+        try:
+            categories = db.get_categories()
+            for category in categories:
+                window.add_category(category)
+            window.select_default_channel()
+            loaded = window.loaded_instances()
+            assert window.selected_channel[1] in loaded
+            assert len(loaded) < db.get_channel_count()
+
+            window.now_playing = {"uno": "Viejo", "dos": "Sigue"}
+            window.set_now_playing({"tres": ((0, 1, "Nuevo"), None)}, ["uno", "tres"])
+            assert window.now_playing == {"dos": "Sigue", "tres": "Nuevo"}
+        finally:
+            window.destroy()
+            db.close()
+
+
+class TestInstrument:
+    """Tests para el registro y la exportacion de spans"""
+
+    def test_trace_files_jsonl_and_chrome(self, tmp_path):
+        """Prueba que los spans se vuelcan en JSON-lines y en formato Chrome"""
+        import json
+
+        @instrument.traced("db.prueba")
+        def query(value):
+            return value * 2
+
+        for name in ("traza.jsonl", "traza.json"):
+            path = str(tmp_path / name)
+            instrument.configure_from_env({"VERTELE_TRACE": path})
+            try:
+                with instrument.span("startup.ui_build", tabs=3):
+                    assert query(21) == 42
+            finally:
+                instrument.disable()
+            assert query(1) == 2
+            with open(path, encoding="utf-8") as f:
+                text = f.read()
+            if name.endswith(".jsonl"):
+                events = [json.loads(line) for line in text.splitlines()]
+                assert [e["name"] for e in events] == ["db.prueba", "startup.ui_build"]
+                assert events[1]["attrs"] == {"tabs": 3}
+                assert events[1]["duration_ms"] >= events[0]["duration_ms"]
+            else:
+                events = [e for e in json.loads(text) if e["ph"] == "X"]
+                assert [e["name"] for e in events] == ["db.prueba", "startup.ui_build"]
+                assert events[0]["ts"] >= events[1]["ts"]
+
+    def test_logging_is_leveled(self):
+        """Prueba que los mensajes de depuracion solo se emiten si se piden"""
+        import io
+        import logging
+
+        stream = io.StringIO()
+        log = instrument.get_logger("prueba")
+        try:
+            instrument.configure_logging("warning", stream)
+            log.debug("oculto %s", "x")
+            log.warning("visible")
+            assert not log.isEnabledFor(logging.DEBUG)
+            instrument.configure_logging("debug", stream)
+            log.debug("depuracion")
+        finally:
+            instrument.configure_logging(logging.WARNING)
+        lines = stream.getvalue().splitlines()
+        assert len(lines) == 2
+        assert "WARNING [vertele.prueba] visible" in lines[0]
+        assert lines[1].endswith("DEBUG [vertele.prueba] depuracion")
+
+
+class TestZapBenchmark:
+    """Tests para la instrumentacion y el benchmark de zapping"""
+
+    def test_span_disabled_records_nothing(self):
+        """Prueba que sin registrador activo span() no mide nada"""
+        instrument.disable()
+        with instrument.span("zap.lookup"):
+            pass
+        assert instrument.get_recorder() is None
+
+    def test_percentile_interpolates(self):
+        """Prueba el calculo de percentiles"""
+        values = [float(v) for v in range(1, 101)]
+        assert percentile(values, 50) == pytest.approx(50.5)
+        assert percentile(values, 99) == pytest.approx(99.01)
+        assert percentile([7.0], 95) == 7.0
+
+    def test_find_regressions(self):
+        """Prueba que solo se marcan las fases que superan la tolerancia"""
+        baseline = {"lookup": {"p50": 1.0, "p95": 2.0}, "play": {"p50": 10.0}}
+        ok = {"lookup": {"p50": 1.2, "p95": 2.5}, "play": {"p50": 14.0}}
+        assert find_regressions(ok, baseline, tolerance=0.5, slack_ms=0.0) == []
+
+        slow = {"lookup": {"p50": 1.0, "p95": 2.0}, "play": {"p50": 16.0}}
+        problems = find_regressions(slow, baseline, tolerance=0.5, slack_ms=0.0)
+        assert len(problems) == 1 and problems[0].startswith("play p50")
+        assert find_regressions({}, baseline) == [
+            "lookup: sin muestras",
+            "play: sin muestras",
+        ]
+
+    def test_baseline_is_per_machine(self, tmp_path):
+        """Prueba que una linea base de otro equipo no se compara"""
+        import json
+
+        from benchmarks.zap_benchmark import load_baseline, save_baseline
+
+        path = str(tmp_path / "cache" / "baseline.json")
+        summary = {"lookup": {"p50": 1.0}}
+        save_baseline(path, summary, 10)
+        assert load_baseline(path) == summary
+
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        data["machine"]["host"] = "otro-equipo"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        assert load_baseline(path) is None
+
+    def test_run_benchmark_measures_every_stage(self, tmp_path):
+        """Prueba que el benchmark mide todas las fases del cambio de canal"""
+        samples = run_benchmark(iterations=3, workdir=str(tmp_path))
+        assert instrument.get_recorder() is None
+        for stage in ("lookup", "play", "spawn", "first_segment"):
+            assert len(samples[stage]) == 3
+        assert min(samples["first_segment"]) >= min(samples["play"])
+
+    def test_epg_benchmark_measures_ingest_and_now_next(self, tmp_path):
+        """Prueba el benchmark de la guia con una guia pequeña"""
+        from benchmarks import epg_benchmark
+
+        stats = epg_benchmark.run_benchmark(
+            channels=20, programmes=10, queries=3, workdir=str(tmp_path)
+        )
+        assert stats["programmes"] == 200
+        assert stats["programmes_per_second"] > 0
+        assert stats["now_next_p95"] >= stats["now_next_p50"]
+
+
+class TestRowCache:
+    """Tests para la cache de filas de las listas perezosas"""
+
+    @staticmethod
+    def _db(count):
+        db = ChannelDatabase(":memory:")
+        db.bulk_insert_channels(
+            (f"Canal {i:05d}", f"canal{i}", None, f"http://x/{i}.m3u8", "Test")
+            for i in range(count)
+        )
+        return db
+
+    def test_rows_match_listing_and_memory_is_bounded(self):
+        """Prueba que recorrer toda la lista mantiene acotadas las filas residentes"""
+        db = self._db(5000)
+        calls = []
+
+        def fetch(offset, limit, after):
+            calls.append(after)
+            return db.get_channels_slice("Test", offset, limit, after)
+
+        cache = RowCache(fetch, block_size=100, max_blocks=5)
+        assert db.count_channels("Test") == 5000
+        expected = [tuple(row[:2]) + (None,) for row in db.iter_channels("Test")]
+        assert [cache.get(i) for i in range(5000)] == expected
+        assert cache.get(5000) is None
+        assert cache.cached_rows() <= 500
+        assert cache.resident_rows() == expected[-cache.cached_rows() :]
+        # Los bloques consecutivos continuan tras el anterior sin OFFSET
+        assert all(after is not None for after in calls[1:50])
+        db.close()
+
+    def test_random_access_and_lru(self):
+        """Prueba el acceso aleatorio y que los bloques recientes no se recargan"""
+        db = self._db(1000)
+        cache = RowCache(
+            lambda offset, limit, after: db.get_channels_slice(
+                "Test", offset, limit, after
+            ),
+            block_size=50,
+            max_blocks=2,
+        )
+        assert cache.get(777) == ("Canal 00777", "canal777", None)
+        assert cache.get(10) == ("Canal 00010", "canal10", None)
+        assert cache.get(760) == ("Canal 00760", "canal760", None)
+        assert cache.fetches == 2
+        assert cache.get(300)[0] == "Canal 00300"
+        assert cache.get(20)[0] == "Canal 00020"
+        assert cache.fetches == 4
+        db.close()
+
+    def test_background_loading(self):
+        """Prueba que get_cached no consulta y que load/store continuan el keyset"""
+        db = self._db(300)
+        calls = []
+
+        def fetch(offset, limit, after):
+            calls.append(after)
+            return db.get_channels_slice("Test", offset, limit, after)
+
+        cache = RowCache(fetch, block_size=100, max_blocks=2)
+        assert cache.get_cached(150) is None
+        assert cache.fetches == 0
+        assert cache.block_of(150) == 1
+
+        cache.store(0, cache.load(0))
+        cache.store(1, cache.load(1))
+        assert cache.get_cached(150) == ("Canal 00150", "canal150", None)
+        assert calls == [None, "Canal 00099"]
+        cache.store(2, cache.load(2))
+        # El bloque menos usado sale de memoria
+        assert cache.get_cached(5) is None
+        assert cache.get(5)[0] == "Canal 00005"
+        db.close()
+
+    def test_slice_excludes_dead_channels(self):
+        """Prueba que se pueden omitir los canales caidos"""
+        from prober import ProbeResult
+
+        db = self._db(10)
+        db.record_stream_status(
+            [ProbeResult("canal3", False, None, None, 0, "timeout", 0.0)]
+        )
+        assert db.count_channels("Test", exclude_dead=True) == 9
+        rows = db.get_channels_slice("Test", 0, 20, exclude_dead=True)
+        assert "canal3" not in [row[1] for row in rows]
+        db.close()
+
+
+class TestTaskRunner:
+    """Tests para la ejecucion de tareas en segundo plano"""
+
+    @staticmethod
+    def _runner():
+        """TaskRunner cuyo despachador encola los callbacks como GLib.idle_add"""
+        import queue
+
+        delivered = queue.Queue()
+        runner = TaskRunner(
+            max_workers=2, dispatch=lambda cb, *args: delivered.put((cb, args))
+        )
+        return runner, delivered
+
+    @staticmethod
+    def _main_loop(delivered, count, timeout=5):
+        """Ejecuta count callbacks en el hilo actual, como el bucle de GLib"""
+        for _ in range(count):
+            callback, args = delivered.get(timeout=timeout)
+            callback(*args)
+
+    def test_results_are_delivered_through_dispatcher(self):
+        """Prueba que resultados y errores llegan por el despachador"""
+        import threading
+
+        runner, delivered = self._runner()
+        results, errors, threads = [], [], []
+
+        def work(value):
+            threads.append(threading.current_thread())
+            return value * 2
+
+        runner.submit(work, 21, on_done=results.append)
+        runner.submit(int, "x", on_error=errors.append)
+        self._main_loop(delivered, 2)
+        assert results == [42]
+        assert isinstance(errors[0], ValueError)
+        assert threads[0] is not threading.current_thread()
+        runner.shutdown()
+
+    def test_same_key_runs_serially_and_latest_wins(self):
+        """Prueba que las tareas con la misma clave se sustituyen"""
+        import threading
+
+        runner, delivered = self._runner()
+        release = threading.Event()
+        started, results = [], []
+
+        def work(name):
+            started.append(name)
+            if name == "primera":
+                release.wait(5)
+            return name
+
+        runner.submit(work, "primera", key="zap", on_done=results.append)
+        runner.submit(work, "segunda", key="zap", on_done=results.append)
+        runner.submit(work, "tercera", key="zap", on_done=results.append)
+        release.set()
+        self._main_loop(delivered, 2)
+        # La segunda nunca llega a ejecutarse y la primera queda obsoleta
+        assert started == ["primera", "tercera"]
+        assert results == ["tercera"]
+        runner.shutdown()
+
+    def test_cancelled_task_is_not_delivered(self):
+        """Prueba que una tarea cancelada no entrega su resultado"""
+        import queue
+
+        runner, delivered = self._runner()
+        results = []
+        task = runner.submit(lambda: "valor", on_done=results.append)
+        task.cancel()
+        try:
+            self._main_loop(delivered, 1, timeout=0.5)
+        except queue.Empty:
+            pass
+        assert results == []
+        runner.shutdown()
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
+
+
+class _FakeThumbnailer:
+    """Sustituye a GdkPixbuf: la miniatura es la imagen recortada a size bytes"""
+
+    def scale(self, data, size):
+        if not data.startswith(b"IMG"):
+            raise ValueError("Imagen no valida")
+        return data[:size]
+
+    def load(self, data):
+        return ("imagen", data)
+
+
+class TestLogoLoader:
+    """Tests para la descarga y cache de logos"""
+
+    @staticmethod
+    def _loader(cache_dir, **kwargs):
+        import queue
+
+        delivered = queue.Queue()
+        loader = LogoLoader(
+            str(cache_dir),
+            size=8,
+            dispatch=lambda cb, *args: delivered.put((cb, args)),
+            thumbnailer=_FakeThumbnailer(),
+            **kwargs,
+        )
+        return loader, delivered
+
+    def test_logo_is_downloaded_once_and_cached(self, tmp_path):
+        """Prueba la carga asincrona y las caches en memoria y en disco"""
+        origin = _LocalOrigin({"/logo.png": (200, b"IMG-logo-grande")})
+        url = origin.url("/logo.png")
+        loaded = []
+        loader, delivered = self._loader(tmp_path)
+        loader.on_loaded = loaded.append
+        try:
+            assert loader.get(url) is None
+            # Pedirlo de nuevo mientras carga no lanza otra descarga
+            assert loader.get(url) is None
+            TestTaskRunner._main_loop(delivered, 1)
+            assert loaded == [url]
+            assert loader.get(url) == ("imagen", b"IMG-logo")
+            assert loader.get(None) is None
+        finally:
+            loader.close()
+        assert origin.hits["/logo.png"] == 1
+
+        # Un cargador nuevo encuentra la miniatura en disco
+        loader, delivered = self._loader(tmp_path)
+        try:
+            assert loader.get(url) is None
+            TestTaskRunner._main_loop(delivered, 1)
+            assert loader.get(url) == ("imagen", b"IMG-logo")
+            assert loader.downloads == 0
+        finally:
+            loader.close()
+            origin.close()
+        assert origin.hits["/logo.png"] == 1
+
+    def test_failed_logo_is_not_retried(self, tmp_path):
+        """Prueba que un logo que falla no se vuelve a pedir"""
+        origin = _LocalOrigin({"/roto.png": (200, b"no es imagen")})
+        url = origin.url("/roto.png")
+        loader, delivered = self._loader(tmp_path)
+        try:
+            loader.get(url)
+            loader.get(origin.url("/falta.png"))
+            TestTaskRunner._main_loop(delivered, 2)
+            assert loader.get(url) is None
+            assert loader.get(origin.url("/falta.png")) is None
+            assert loader.cached_urls() == []
+        finally:
+            loader.close()
+            origin.close()
+        assert origin.hits == {"/roto.png": 1, "/falta.png": 1}
+
+    def test_failed_logo_is_retried_after_ttl(self, tmp_path):
+        """Prueba que un fallo transitorio caduca y el logo se vuelve a pedir"""
+        import time
+
+        origin = _LocalOrigin({"/caido.png": (503, b"")})
+        url = origin.url("/caido.png")
+        loader, delivered = self._loader(tmp_path, failure_ttl=0.1)
+        try:
+            loader.get(url)
+            TestTaskRunner._main_loop(delivered, 1)
+            origin.routes["/caido.png"] = (200, b"IMG-vuelve")
+            assert loader.get(url) is None
+            time.sleep(0.15)
+            assert loader.get(url) is None
+            TestTaskRunner._main_loop(delivered, 1)
+            assert loader.get(url) == ("imagen", b"IMG-vuel")
+        finally:
+            loader.close()
+            origin.close()
+        assert origin.hits["/caido.png"] == 2
+
+    def test_stale_requests_are_dropped(self, tmp_path):
+        """Prueba que al desplazarse solo se cargan las peticiones recientes"""
+        import time
+
+        routes = {"/lento.png": (200, b"IMG-lento", {}, 0.3)}
+        routes.update({f"/{i}.png": (200, b"IMG-%d" % i) for i in range(5)})
+        origin = _LocalOrigin(routes)
+        loader, delivered = self._loader(tmp_path, max_workers=1, max_queued=2)
+        try:
+            # El unico hilo queda ocupado con el primer logo
+            loader.get(origin.url("/lento.png"))
+            deadline = time.monotonic() + 5
+            while "/lento.png" not in origin.hits and time.monotonic() < deadline:
+                time.sleep(0.01)
+            for i in range(5):
+                loader.get(origin.url(f"/{i}.png"))
+            # La fila 3 sigue visible: se pide otra vez y no se descarta
+            loader.get(origin.url("/3.png"))
+            TestTaskRunner._main_loop(delivered, 6)
+            assert sorted(loader.cached_urls()) == sorted(
+                origin.url(path) for path in ("/lento.png", "/3.png", "/4.png")
+            )
+        finally:
+            loader.close()
+            origin.close()
+        assert set(origin.hits) == {"/lento.png", "/3.png", "/4.png"}
+
+    def test_disk_cache_evicts_least_recently_used(self, tmp_path):
+        """Prueba que la cache en disco respeta su tamaño maximo"""
+        cache = LogoDiskCache(str(tmp_path), max_bytes=10)
+        cache.put("a.png", b"1234")
+        cache.put("b.png", b"1234")
+        assert cache.get("a.png") == b"1234"
+        cache.put("c.png", b"1234")
+        assert cache.get("b.png") is None
+        assert sorted(os.listdir(str(tmp_path))) == ["a.png", "c.png"]
+        assert LogoDiskCache(str(tmp_path)).total_bytes == 8
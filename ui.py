@@ -7,41 +7,66 @@ UI layer - Interfaz gráfica usando Gtk con categorías
 import gi
 
 gi.require_version("Gtk", "3.0")
-from gi.repository import Gtk
+from gi.repository import Gtk, GLib
 
-from typing import List, Tuple, Dict, Optional
+from typing import List, Tuple, Dict, Optional, Set
+
+from instrument import get_logger
+from listmodel import ChannelListModel
+
+log = get_logger("ui")
 
 
 class ChannelWindow(Gtk.Window):
     """Ventana principal de la aplicación con categorías"""
 
-    CATEGORIES = {
-        "Peliculas": [
-            "Big Buck Bunny",
-            "Tears of Steel",
-            "Apple Test Stream",
-            "Sintel",
-            "Elephants Dream",
-        ],
-        "Deportes": [
-            "Red Bull TV",
-        ],
-        "Documentales": [
-            "NASA TV",
-        ],
-        "Musica": [
-            "Radio 105 Network",
-        ],
-        "Tecnologia": [
-            "Twit Live",
-        ],
-    }
-
-    def __init__(self, on_channel_selected):
+    # Construir en segundo plano las pestañas vecinas de la visible
+    PREFETCH_ADJACENT = True
+
+    def __init__(
+        self,
+        on_channel_selected,
+        search_func=None,
+        on_channel_highlighted=None,
+        categories: Optional[List[str]] = None,
+        channel_source=None,
+        task_runner=None,
+        logo_loader=None,
+        on_rows_loaded=None,
+    ):
+        """
+        Args:
+            channel_source: Origen de los canales (normalmente ChannelDatabase);
+                las listas le piden solo las filas visibles
+            task_runner: TaskRunner para buscar y consultar canales fuera del
+                hilo de GTK (si es None se hace en el propio hilo)
+            logo_loader: LogoLoader para mostrar el logo de cada canal
+            on_rows_loaded: Se llama con las instancias de las filas que
+                acaban de leerse (bloques de las listas y resultados de
+                búsqueda), por ejemplo para consultar su programa en emisión
+        """
         super().__init__(title="VerTele - Visor de Canales")
         self.on_channel_selected = on_channel_selected
+        self.on_channel_highlighted = on_channel_highlighted
+        self.on_rows_loaded = on_rows_loaded
+        self.search_func = search_func
+        self.channel_source = channel_source
+        self.task_runner = task_runner
+        self.logo_loader = logo_loader
+        self._logo_redraw_pending = False
+        if logo_loader is not None:
+            logo_loader.on_loaded = self._on_logo_loaded
+        self._search_task = None
         self.selected_channel = None
-        self.channels_by_category = {}
+        self.models_by_category = {}
+        # Pestañas de categoría (aún sin construir o ya construidas)
+        self.placeholders = {}
+        self.page_categories = {}
+        # Canales cuyo stream no respondió en la última comprobación
+        self.dead_instances = set()
+        # Programa en emisión de cada canal según la guía (instance -> título)
+        self.now_playing = {}
+        self.hide_dead = False
 
         self.set_border_width(10)
         self.set_default_size(600, 600)
@@ -49,93 +74,312 @@ class ChannelWindow(Gtk.Window):
 
         self.selected_treeview = None
         self.treeviews = {}
-        self._setup_ui()
+        self._setup_ui(categories or [])
 
-    def _setup_ui(self) -> None:
+    def _setup_ui(self, categories: List[str]) -> None:
         """Configura la interfaz de usuario con categorías"""
+        # Buscador global sobre todas las categorías
+        self.search_entry = Gtk.SearchEntry()
+        self.search_entry.set_placeholder_text("Buscar canal...")
+        self.search_entry.connect("search-changed", self._on_search_changed)
+
         # Notebook para las categorías
         notebook = Gtk.Notebook()
         notebook.set_tab_pos(Gtk.PositionType.TOP)
-
-        # Crear pestañas para cada categoría
-        for category, channels in self.CATEGORIES.items():
-            scrolled_window = Gtk.ScrolledWindow()
-            scrolled_window.set_policy(
-                Gtk.PolicyType.AUTOMATIC, Gtk.PolicyType.AUTOMATIC
-            )
-            scrolled_window.set_min_content_height(300)
-
-            # ListStore para esta categoría
-            channel_list = Gtk.ListStore(str, str, str, str)
-            self.channels_by_category[category] = channel_list
-
-            # TreeView con filtrado
-            treeview = Gtk.TreeView(model=channel_list)
-            self.treeviews[category] = treeview
-
-            # Renderer para el nombre del canal
-            renderer_text = Gtk.CellRendererText()
-            column_title = Gtk.TreeViewColumn("Canal", renderer_text, text=0)
-            treeview.append_column(column_title)
-
-            # Buscador rápido
-            search_entry = Gtk.Entry()
-            search_entry.set_placeholder_text("Buscar canal...")
-            search_entry.connect(
-                "changed", self._on_search_changed, treeview, channel_list
-            )
-
-            # Layout vertical para la categoría
-            category_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=5)
-            category_box.pack_start(search_entry, False, False, 0)
-            category_box.pack_start(treeview, True, True, 0)
-
-            scrolled_window.add(category_box)
-            notebook.append_page(scrolled_window, Gtk.Label(label=category))
+        notebook.connect("switch-page", self._on_switch_page)
+        self.notebook = notebook
+
+        # Pestaña de resultados, oculta mientras no haya búsqueda
+        self.results_store = Gtk.ListStore(str, str, str, str)
+        self.results_treeview = Gtk.TreeView(model=self.results_store)
+        results_renderer = Gtk.CellRendererText()
+        results_column = Gtk.TreeViewColumn("Canal", results_renderer, text=0)
+        results_column.set_cell_data_func(results_renderer, self._render_channel_title)
+        self.results_treeview.append_column(results_column)
+        self.results_treeview.connect(
+            "cursor-changed", self._on_treeview_cursor_changed
+        )
+        self.results_page = Gtk.ScrolledWindow()
+        self.results_page.set_policy(Gtk.PolicyType.AUTOMATIC, Gtk.PolicyType.AUTOMATIC)
+        self.results_page.add(self.results_treeview)
+        self.results_page.show_all()
+        self.results_page.set_no_show_all(True)
+        self.results_page.hide()
+        notebook.append_page(self.results_page, Gtk.Label(label="Resultados"))
 
         # Botón de reproducción
         self.play_button = Gtk.Button(label="▶ Reproducir")
         self.play_button.set_sensitive(False)
         self.play_button.connect("clicked", self._on_play_button_clicked)
-        print(
-            f"[UI] Botón 'Reproducir' creado, estado inicial: {self.play_button.get_sensitive()}"
-        )
+
+        # Opción para ocultar los canales que no responden
+        self.hide_dead_check = Gtk.CheckButton(label="Ocultar canales caídos")
+        self.hide_dead_check.connect("toggled", self._on_hide_dead_toggled)
 
         # Layout principal
         main_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=10)
+        main_box.pack_start(self.search_entry, False, False, 0)
         main_box.pack_start(notebook, True, True, 0)
+        main_box.pack_start(self.hide_dead_check, False, False, 0)
         main_box.pack_start(self.play_button, False, False, 0)
 
         self.add(main_box)
 
-        # Conectar selección en TreeView
-        for category, channel_list in self.channels_by_category.items():
-            treeview = self._get_treeview_for_category(category)
-            if treeview:
-                treeview.connect("cursor-changed", self._on_treeview_cursor_changed)
+        # Una pestaña por categoría de la base de datos
+        for category in categories:
+            self.add_category(category)
 
         # Actualizar estado inicial del botón
         self._update_play_button_state()
-        print(
-            f"[UI] UI configurada. Treeviews disponibles: {list(self.treeviews.keys())}"
+        log.debug("UI configurada. Categorías: %s", list(self.placeholders))
+
+    def add_category(self, category: str) -> None:
+        """
+        Crea la pestaña de una categoría si no existe
+
+        La pestaña empieza como un contenedor vacío; su lista se construye la
+        primera vez que se muestra (ver _materialize).
+        """
+        if category in self.placeholders:
+            return
+
+        placeholder = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+        placeholder.show()
+        self.placeholders[category] = placeholder
+        self.page_categories[placeholder] = category
+        # Las categorías van antes de la pestaña de resultados
+        self.notebook.insert_page(
+            placeholder,
+            Gtk.Label(label=category),
+            self.notebook.page_num(self.results_page),
+        )
+
+    def _materialize(self, category: str, length: Optional[int] = None) -> Gtk.TreeView:
+        """
+        Construye la lista de una categoría y carga su modelo
+
+        Args:
+            category: Categoría de la pestaña
+            length: Número de filas ya contado fuera del hilo de GTK (si es
+                None se cuenta al construir la lista)
+        """
+        treeview = self.treeviews.get(category)
+        if treeview is not None:
+            return treeview
+
+        scrolled_window = Gtk.ScrolledWindow()
+        scrolled_window.set_policy(Gtk.PolicyType.AUTOMATIC, Gtk.PolicyType.AUTOMATIC)
+        scrolled_window.set_min_content_height(300)
+
+        # Modelo perezoso: solo se leen de la base de datos las filas visibles.
+        # Con TaskRunner la lista empieza vacía hasta que llega su recuento
+        if self.task_runner is None or length is not None:
+            model = self._new_model(category, length)
+        else:
+            model = self._new_model(category, length=0)
+            self._count_rows(category)
+        treeview = Gtk.TreeView(model=model)
+        # Sin altura fija el TreeView mediría todas las filas al cargar
+        treeview.set_fixed_height_mode(True)
+        self.treeviews[category] = treeview
+
+        column_title = Gtk.TreeViewColumn("Canal")
+        column_title.set_sizing(Gtk.TreeViewColumnSizing.FIXED)
+
+        # Logo: GTK solo llama a la función de dibujo para las filas visibles
+        if self.logo_loader is not None:
+            renderer_logo = Gtk.CellRendererPixbuf()
+            renderer_logo.set_fixed_size(self.logo_loader.size, self.logo_loader.size)
+            column_title.pack_start(renderer_logo, False)
+            column_title.set_cell_data_func(renderer_logo, self._render_logo)
+
+        # Renderer para el nombre del canal
+        renderer_text = Gtk.CellRendererText()
+        column_title.pack_start(renderer_text, True)
+        column_title.add_attribute(renderer_text, "text", 0)
+        column_title.set_cell_data_func(renderer_text, self._render_channel_title)
+        treeview.append_column(column_title)
+        treeview.connect("cursor-changed", self._on_treeview_cursor_changed)
+
+        scrolled_window.add(treeview)
+        self.placeholders[category].pack_start(scrolled_window, True, True, 0)
+        scrolled_window.show_all()
+        return treeview
+
+    def _on_switch_page(self, notebook: Gtk.Notebook, page, page_num: int) -> None:
+        """Construye la pestaña al mostrarla por primera vez"""
+        category = self.page_categories.get(page)
+        if category is None:
+            return
+        self._materialize(category)
+        if self.PREFETCH_ADJACENT:
+            GLib.idle_add(self._prefetch_adjacent, page_num)
+
+    def _prefetch_adjacent(self, page_num: int) -> bool:
+        """Construye en tiempo ocioso las pestañas vecinas de la actual"""
+        for neighbour in (page_num + 1, page_num - 1):
+            category = self.page_categories.get(self.notebook.get_nth_page(neighbour))
+            if category is not None and category not in self.treeviews:
+                self._materialize(category)
+                # Una pestaña por iteración para no bloquear el bucle
+                return True
+        return False
+
+    def _new_model(
+        self, category: str, length: Optional[int] = None
+    ) -> ChannelListModel:
+        """Crea el modelo perezoso de una categoría (sin caídos si se pidió)"""
+        model = ChannelListModel(
+            self.channel_source,
+            category,
+            self.hide_dead,
+            length=length,
+            task_runner=self.task_runner,
+            on_rows_loaded=self._on_rows_loaded,
+        )
+        self.models_by_category[category] = model
+        return model
+
+    def _count_rows(self, category: str) -> None:
+        """Cuenta en segundo plano las filas de la pestaña y cambia su modelo"""
+        self.task_runner.submit(
+            self.channel_source.count_channels,
+            category,
+            self.hide_dead,
+            key="count:" + category,
+            on_done=lambda length: self._on_rows_counted(category, length),
         )
 
+    def _on_rows_counted(self, category: str, length: int) -> None:
+        """Sustituye el modelo de la pestaña por uno con su número de filas"""
+        treeview = self.treeviews.get(category)
+        if treeview is not None:
+            treeview.set_model(self._new_model(category, length))
+
+    def _reload_models(self) -> None:
+        """Sustituye los modelos para reflejar el filtro de canales caídos"""
+        for category, treeview in self.treeviews.items():
+            if self.task_runner is None:
+                treeview.set_model(self._new_model(category))
+            else:
+                # El modelo actual sigue visible hasta que llega el recuento
+                self._count_rows(category)
+
+    def _render_logo(self, column, renderer, model, tree_iter, data) -> None:
+        """Muestra el logo si ya está cargado; si no, pide su carga"""
+        logo_url = model[tree_iter][ChannelListModel.COLUMN_LOGO]
+        renderer.set_property("pixbuf", self.logo_loader.get(logo_url))
+
+    def _on_logo_loaded(self, url: str) -> None:
+        """Agrupa en un solo redibujado los logos que llegan seguidos"""
+        if not self._logo_redraw_pending:
+            self._logo_redraw_pending = True
+            GLib.idle_add(self._redraw_logos)
+
+    def _redraw_logos(self) -> bool:
+        self._logo_redraw_pending = False
+        self.queue_draw()
+        return False
+
+    def _render_channel_title(self, column, renderer, model, tree_iter, data) -> None:
+        """Añade el programa en emisión y tacha en gris los canales caídos"""
+        row = model[tree_iter]
+        programme = self.now_playing.get(row[1])
+        if programme:
+            renderer.set_property("text", f"{row[0]} — {programme}")
+        dead = row[1] in self.dead_instances
+        renderer.set_property("strikethrough", dead)
+        renderer.set_property("foreground", "gray" if dead else None)
+
+    def _on_hide_dead_toggled(self, check: Gtk.CheckButton) -> None:
+        """Muestra u oculta los canales caídos"""
+        self.hide_dead = check.get_active()
+        self._reload_models()
+
+    def set_dead_channels(self, instances) -> None:
+        """Actualiza el conjunto de canales caídos y redibuja las listas"""
+        self.dead_instances = set(instances)
+        if self.hide_dead:
+            self._reload_models()
+        self.queue_draw()
+
+    def _on_rows_loaded(self, rows) -> None:
+        """Avisa de las instancias de un bloque recién leído"""
+        if self.on_rows_loaded:
+            self.on_rows_loaded([row[ChannelListModel.COLUMN_INSTANCE] for row in rows])
+
+    def loaded_instances(self) -> Set[str]:
+        """Instancias de las filas ya leídas: listas construidas y resultados"""
+        instances = {
+            row[ChannelListModel.COLUMN_INSTANCE]
+            for model in self.models_by_category.values()
+            for row in model.rows.resident_rows()
+        }
+        instances.update(row[1] for row in self.results_store)
+        return instances
+
+    def set_now_playing(self, guide, instances=None) -> None:
+        """
+        Actualiza el programa en emisión de los canales y redibuja las listas
+
+        Args:
+            guide: instance -> (actual, siguiente), como ChannelDatabase.get_now_next
+            instances: Canales consultados; si es None la guía sustituye a la
+                anterior, si no solo se actualizan esos canales
+        """
+        now_playing = {
+            instance: current[2]
+            for instance, (current, _) in guide.items()
+            if current is not None
+        }
+        if instances is None:
+            self.now_playing = now_playing
+        else:
+            for instance in instances:
+                self.now_playing.pop(instance, None)
+            self.now_playing.update(now_playing)
+        self.queue_draw()
+
     def _get_treeview_for_category(self, category: str):
         """Obtiene el TreeView de una categoría"""
         return self.treeviews.get(category)
 
-    def _on_search_changed(
-        self, entry: Gtk.Entry, treeview: Gtk.TreeView, store: Gtk.ListStore
-    ) -> None:
-        """Filtro de búsqueda"""
-        text = entry.get_text().lower()
-        if text:
-            store.set_visible_func(
-                lambda model, iter, data: text in model[iter][0].lower()
-            )
+    def _on_search_changed(self, entry: Gtk.SearchEntry) -> None:
+        """
+        Busca en todas las categorías y muestra los resultados
+
+        Gtk.SearchEntry ya emite search-changed tras una pausa en la
+        escritura, así que la búsqueda se lanza sin esperar más.
+        """
+        text = entry.get_text().strip()
+
+        if self._search_task is not None:
+            self._search_task.cancel()
+            self._search_task = None
+        if not text or self.search_func is None:
+            self.results_store.clear()
+            self.results_page.hide()
+            self.notebook.set_current_page(0)
+            return
+
+        if self.task_runner is None:
+            self._show_results(self.search_func(text))
         else:
-            store.set_visible_func(None)
-        treeview.expand_all()
+            self._search_task = self.task_runner.submit(
+                self.search_func, text, key="search", on_done=self._show_results
+            )
+
+    def _show_results(self, results) -> None:
+        """Muestra los resultados de la búsqueda en su pestaña"""
+        self._search_task = None
+        self.results_store.clear()
+        for title, instance, page_url, stream_url, _category in results:
+            self.results_store.append([title, instance, page_url, stream_url])
+        if self.on_rows_loaded and results:
+            self.on_rows_loaded([row[1] for row in results])
+
+        self.results_page.show()
+        self.notebook.set_current_page(self.notebook.page_num(self.results_page))
 
     def _on_treeview_cursor_changed(self, treeview: Gtk.TreeView) -> None:
         """Maneja la selección en TreeView"""
@@ -144,29 +388,69 @@ class ChannelWindow(Gtk.Window):
         if selection:
             model, tree_iter = selection.get_selected()
             if tree_iter:
-                title, instance, page_url, stream_url = model[tree_iter][:]
-                self.selected_channel = (title, instance, page_url, stream_url)
-                self._update_play_button_state()
+                self._select_channel(self._channel_from_row(model, tree_iter))
             else:
                 self.selected_channel = None
                 self._update_play_button_state()
 
+    def _channel_from_row(self, model, tree_iter) -> Tuple:
+        """
+        Canal (title, instance, page_url, stream_url) de una fila
+
+        Las listas perezosas solo tienen título e instancia; sus URLs quedan
+        en None hasta que _select_channel las consulta.
+        """
+        row = model[tree_iter]
+        if model.get_n_columns() >= 4:
+            return row[0], row[1], row[2], row[3]
+        return row[0], row[1], None, None
+
+    def _select_channel(self, channel: Tuple) -> None:
+        """Registra el canal seleccionado y consulta sus URLs si faltan"""
+        self.selected_channel = channel
+        self._update_play_button_state()
+        title, instance, page_url, stream_url = channel
+        if stream_url is not None or self.channel_source is None:
+            # Pre-resolver el stream mientras el usuario decide
+            if self.on_channel_highlighted:
+                self.on_channel_highlighted(instance, stream_url)
+            return
+
+        lookup = self.channel_source.get_channel_by_instance
+        if self.task_runner is None:
+            self._on_channel_details(instance, lookup(instance))
+        else:
+            self.task_runner.submit(
+                lookup,
+                instance,
+                key="details",
+                on_done=lambda row: self._on_channel_details(instance, row),
+            )
+
+    def _on_channel_details(self, instance: str, row: Optional[Tuple]) -> None:
+        """Completa las URLs del canal si sigue seleccionado"""
+        if row is None or not self.selected_channel:
+            return
+        title, selected_instance = self.selected_channel[:2]
+        if selected_instance != instance:
+            return
+        self.selected_channel = (title, instance, row[1], row[2])
+        if self.on_channel_highlighted:
+            self.on_channel_highlighted(instance, row[2])
+
     def _update_play_button_state(self) -> None:
         """Actualiza el estado del botón reproducir"""
         self.play_button.set_sensitive(self.selected_channel is not None)
 
     def _on_play_button_clicked(self, button: Gtk.Button) -> None:
         """Maneja el clic en el botón reproducir"""
-        print(
-            f"[UI] _on_play_button_clicked - Canal seleccionado: {self.selected_channel}"
-        )
         if self.selected_channel:
             title, instance, page_url, stream_url = self.selected_channel
-            print(f"[UI] Llamando callback con: title={title}, instance={instance}")
+            log.debug("Reproducir: title=%s, instance=%s", title, instance)
             if self.on_channel_selected:
                 self.on_channel_selected(title, instance, page_url, stream_url)
         else:
-            print("[UI] WARNING: No hay canal seleccionado")
+            log.warning("No hay canal seleccionado")
             dialog = Gtk.MessageDialog(
                 parent=self,
                 flags=0,
@@ -176,74 +460,78 @@ class ChannelWindow(Gtk.Window):
                 secondary_text="Por favor selecciona un canal de la lista.",
             )
             dialog.set_title("Advertencia")
-            dialog.run()
-            dialog.destroy()
-
-    def add_channel(
-        self, title: str, instance: str, page_url: str, stream_url: str
-    ) -> None:
-        """Agrega un canal a su categoría"""
-        # Determinar categoría basada en el título
-        category = self._get_category_for_channel(title)
-        if category and category in self.channels_by_category:
-            self.channels_by_category[category].append(
-                [title, instance, page_url, stream_url]
-            )
-
-    def _get_category_for_channel(self, title: str) -> Optional[str]:
-        """Determina la categoría para un canal"""
-        for category, channels in self.CATEGORIES.items():
-            if title in channels:
-                return category
-        return "Otros"
-
-    def select_default_channel(self):
-        """Selecciona el primer canal disponible"""
-        for category, channel_list in self.channels_by_category.items():
-            if len(channel_list) > 0:
-                treeview = self.treeviews.get(category)
-                if treeview:
-                    self.selected_treeview = treeview
-                    selection = treeview.get_selection()
-                    if selection:
-                        iterator = channel_list.get_iter_first()
-                        if iterator:
-                            selection.select_iter(iterator)
-                            # Obtener datos seleccionados
-                            model, tree_iter = selection.get_selected()
-                            if tree_iter:
-                                title, instance, page_url, stream_url = model[
-                                    tree_iter
-                                ][:]
-                                self.selected_channel = (
-                                    title,
-                                    instance,
-                                    page_url,
-                                    stream_url,
-                                )
+            dialog.connect("response", lambda d, _response: d.destroy())
+            dialog.show()
+
+    def select_default_channel(self, counts: Optional[Dict[str, int]] = None):
+        """
+        Selecciona el primer canal de la primera pestaña con canales
+
+        Args:
+            counts: Filas de cada categoría contadas fuera del hilo de GTK
+                (ChannelDatabase.count_channels_by_category). Con ellas solo
+                se construye la pestaña elegida; sin ellas se cuentan aquí,
+                lo que con TaskRunner deja todas las listas vacías.
+        """
+        for category in self.placeholders:
+            if counts is not None:
+                if not counts.get(category):
+                    continue
+                treeview = self._materialize(category, counts[category])
+            else:
+                treeview = self._materialize(category)
+            model = treeview.get_model()
+            if model.length > 0:
+                self.notebook.set_current_page(
+                    self.notebook.page_num(self.placeholders[category])
+                )
+                self.selected_treeview = treeview
+                self._select_first_row(treeview, model)
                 break
 
         # Actualizar estado del botón después de seleccionar
         self._update_play_button_state()
 
+    def _select_first_row(self, treeview: Gtk.TreeView, model) -> None:
+        """Selecciona la primera fila, esperando a que se lea si hace falta"""
+        iterator = model.get_iter_first()
+        if iterator is None:
+            return
+        # Leer la fila pide su bloque en segundo plano si no está cargado
+        if model[iterator][ChannelListModel.COLUMN_INSTANCE]:
+            self._select_row(treeview, model, iterator)
+        else:
+            model.connect("row-changed", self._on_first_row_loaded, treeview)
+
+    def _on_first_row_loaded(self, model, path, tree_iter, treeview) -> None:
+        """Selecciona la primera fila cuando llega su bloque"""
+        if path.get_indices()[0] != 0:
+            return
+        model.disconnect_by_func(self._on_first_row_loaded)
+        # El usuario pudo elegir otro canal o cambiar el filtro mientras tanto
+        if self.selected_channel is None and treeview.get_model() is model:
+            self._select_row(treeview, model, tree_iter)
+
+    def _select_row(self, treeview: Gtk.TreeView, model, tree_iter) -> None:
+        """Marca una fila en la lista y la registra como canal seleccionado"""
+        selection = treeview.get_selection()
+        if selection:
+            selection.select_iter(tree_iter)
+        self._select_channel(self._channel_from_row(model, tree_iter))
+
 
 if __name__ == "__main__":
 
     def dummy_callback(title, instance, page_url, stream_url):
         print(f"Canal: {title}, Instance: {instance}")
 
-    win = ChannelWindow(dummy_callback)
-
-    # Agregar canales de prueba
-    test_channels = [
-        ("Canal 13", "canal13", "https://www.canal13.cl/", "stream1"),
-        ("TVN", "tvn", "https://www.tvn.cl/", "stream2"),
-        ("Películas+", "peliculasmas", "https://peliculasmas.lat/", "stream3"),
-        ("SeriesLatino", "serieslatino", "https://serieslatino.net/", "stream4"),
-    ]
+    from database import ChannelDatabase
 
-    for channel in test_channels:
-        win.add_channel(*channel)
+    db = ChannelDatabase(":memory:")
+    win = ChannelWindow(
+        dummy_callback, db.search, categories=db.get_categories(), channel_source=db
+    )
+    win.select_default_channel()
 
     win.connect("destroy", Gtk.main_quit)
     win.show_all()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Cambio de canal - Camino de "Reproducir" sin dependencias de GTK
+
+VerTeleApp lo ejecuta en el pool de tareas y el benchmark de zapping lo
+llama directamente, de modo que ambos miden y ejecutan el mismo codigo:
+busqueda en la base de datos -> eleccion de espejo -> StreamPlayer.
+"""
+
+from typing import Optional
+
+from database import ChannelDatabase
+from instrument import span
+from mirrors import MirrorSelector
+from player import ChannelNotFoundException, StreamPlayer
+
+
+def zap_channel(
+    db: ChannelDatabase,
+    mirrors: MirrorSelector,
+    player: StreamPlayer,
+    title: str,
+    instance: str,
+    stream_url: Optional[str] = None,
+) -> str:
+    """
+    Busca el canal y lo reproduce (bloqueante: fuera del hilo de GTK)
+
+    Args:
+        stream_url: URL conocida por la lista; las listas perezosas no la
+            guardan y se usa la de la base de datos
+
+    Returns:
+        La URL que se entrego al reproductor
+
+    Raises:
+        ChannelNotFoundException: si el canal no existe
+        RuntimeError: si el reproductor no pudo arrancar
+    """
+    with span("zap.lookup", instance=instance):
+        channel = db.get_channel_by_instance(instance)
+
+    if channel is None:
+        raise ChannelNotFoundException(f"No se encontró el canal: {instance}")
+
+    # Si el canal tiene espejos, reproduce el primero que responda
+    with span("zap.mirrors", instance=instance):
+        stream_url = mirrors.select(instance, stream_url or channel[2])
+
+    with span("zap.play", instance=instance):
+        success = player.play_channel(title, stream_url)
+
+    if not success:
+        raise RuntimeError("No se pudo iniciar la reproducción")
+    return stream_url